@@ -0,0 +1,162 @@
+"""
+aggregates.py - Materialized totals for EquiLearn
+Keeps the ImpactStats row in step with donations, school verification and need
+approval so /api/impact is a single-row read instead of a scan of the donations
+table, and keeps DonorTotals in step with each donor's donations and pool joins.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, literal, select, union_all, update
+
+from database import upsert_insert
+from extensions import db
+from models import (ImpactStats, Donation, School, Need, DonorTotals, FeaturedSchoolDonation,
+                    MicroDonationPoolJoin)
+
+IMPACT_ROW_ID = 1
+
+def compute_impact_stats():
+    """Recompute the platform totals from the source tables."""
+    return {
+        'total_donations': db.session.query(db.func.coalesce(db.func.sum(Donation.amount), 0)).scalar(),
+        'schools_helped': School.query.filter_by(verified=True).count(),
+        'needs_funded': Need.query.filter_by(status='approved').count(),
+    }
+
+def bump_impact_stats(**deltas):
+    """Add deltas to the running totals inside the caller's transaction."""
+    values = {getattr(ImpactStats, field): getattr(ImpactStats, field) + delta for field, delta in deltas.items()}
+    updated = ImpactStats.query.filter_by(id=IMPACT_ROW_ID).update(values, synchronize_session=False)
+    if not updated:
+        # No row yet: seed it from the source tables, which already include this change
+        db.session.flush()
+        rebuild_impact_stats()
+
+def load_impact_stats():
+    """Return the ImpactStats row, building it on first use."""
+    stats = db.session.get(ImpactStats, IMPACT_ROW_ID)
+    if stats is None:
+        rebuild_impact_stats()
+        db.session.commit()
+        stats = db.session.get(ImpactStats, IMPACT_ROW_ID)
+    return stats
+
+def rebuild_impact_stats():
+    """Recompute the totals from scratch and store them.
+
+    Returns a dict of ``field -> (stored, actual)`` for every total that had
+    drifted. The caller decides whether to commit.
+    """
+    actual = compute_impact_stats()
+    stats = db.session.get(ImpactStats, IMPACT_ROW_ID, populate_existing=True)
+    if stats is None:
+        stats = ImpactStats(id=IMPACT_ROW_ID)
+        db.session.add(stats)
+    drift = {}
+    for field, value in actual.items():
+        stored = getattr(stats, field) or 0
+        if abs(stored - value) > 1e-6:
+            drift[field] = (stored, value)
+        setattr(stats, field, value)
+    return drift
+
+
+DONOR_TOTAL_FIELDS = ('donations_total', 'donations_count', 'featured_total', 'featured_count',
+                      'pools_total', 'pools_count')
+
+
+def donor_totals_dict(totals):
+    """Serialize a DonorTotals row (or None for a donor with no history)."""
+    return {field: getattr(totals, field) if totals is not None else 0 for field in DONOR_TOTAL_FIELDS}
+
+
+def bump_donor_totals(user_id, **deltas):
+    """Add deltas to one donor's running totals inside the caller's transaction.
+
+    Returns the donor's totals after the change.
+    """
+    return bump_donor_totals_many({user_id: deltas}, returning=True)
+
+
+def bump_donor_totals_many(deltas_by_user, returning=False):
+    """Apply ``{user_id: {field: delta}}`` as one upsert per donor, batched."""
+    table = DonorTotals.__table__
+    now = datetime.utcnow()
+    rows = [dict({field: deltas.get(field, 0) for field in DONOR_TOTAL_FIELDS}, user_id=user_id, updated_at=now)
+            for user_id, deltas in deltas_by_user.items()]
+    stmt = upsert_insert(table)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_=dict({field: table.c[field] + stmt.excluded[field] for field in DONOR_TOTAL_FIELDS},
+                      updated_at=stmt.excluded.updated_at))
+        if returning:
+            return db.session.execute(stmt.returning(*table.c), rows[0]).first()
+        db.session.execute(stmt, rows)
+        return None
+    # No ON CONFLICT support: update, then insert the donors that had no row yet
+    for row in rows:
+        updated = db.session.execute(
+            update(table).where(table.c.user_id == row['user_id'])
+            .values({field: table.c[field] + row[field] for field in DONOR_TOTAL_FIELDS}, updated_at=now))
+        if not updated.rowcount:
+            db.session.execute(table.insert(), row)
+    if returning:
+        return db.session.execute(select(table).where(table.c.user_id == rows[0]['user_id'])).first()
+    return None
+
+
+def compute_donor_totals():
+    """Yield ``(user_id, totals)`` recomputed from the raw donation tables, ordered by user_id."""
+    zero = literal(0)
+    sources = union_all(
+        select(Donation.donor_id.label('user_id'), Donation.amount.label('donations_total'), literal(1).label('donations_count'),
+               zero.label('featured_total'), zero.label('featured_count'), zero.label('pools_total'), zero.label('pools_count'))
+        .where(Donation.donor_id.isnot(None)),
+        select(FeaturedSchoolDonation.user_id, zero, zero, FeaturedSchoolDonation.amount, literal(1), zero, zero),
+        select(MicroDonationPoolJoin.user_id, zero, zero, zero, zero,
+               func.coalesce(MicroDonationPoolJoin.amount, 0), literal(1)),
+    ).subquery()
+    query = (select(sources.c.user_id, *[func.sum(sources.c[field]).label(field) for field in DONOR_TOTAL_FIELDS])
+             .group_by(sources.c.user_id)
+             .order_by(sources.c.user_id))
+    for row in db.session.execute(query.execution_options(yield_per=1000)):
+        yield row.user_id, {field: row._mapping[field] or 0 for field in DONOR_TOTAL_FIELDS}
+
+
+def reconcile_donor_totals(fix=True, batch_size=1000):
+    """Recompute every donor's totals and report (and optionally fix) drift.
+
+    Returns a list of ``(user_id, {field: (stored, actual)})`` for drifted donors.
+    """
+    table = DonorTotals.__table__
+    stored = {row.user_id: row for row in db.session.execute(select(table))}
+    drifted = []
+    fixes = []
+    for user_id, actual in compute_donor_totals():
+        row = stored.pop(user_id, None)
+        diff = {field: (getattr(row, field) if row is not None else None, value)
+                for field, value in actual.items()
+                if row is None or abs((getattr(row, field) or 0) - value) > 1e-6}
+        if diff:
+            drifted.append((user_id, diff))
+            fixes.append(dict(actual, user_id=user_id))
+    # Rows for donors with no donations left at all
+    for user_id, row in stored.items():
+        diff = {field: (getattr(row, field), 0) for field in DONOR_TOTAL_FIELDS if getattr(row, field)}
+        if diff:
+            drifted.append((user_id, diff))
+            fixes.append(dict({field: 0 for field in DONOR_TOTAL_FIELDS}, user_id=user_id))
+    if fix:
+        now = datetime.utcnow()
+        for start in range(0, len(fixes), batch_size):
+            batch = [dict(values, updated_at=now) for values in fixes[start:start + batch_size]]
+            existing = {user_id for (user_id,) in db.session.execute(
+                select(table.c.user_id).where(table.c.user_id.in_([values['user_id'] for values in batch])))}
+            for values in batch:
+                if values['user_id'] in existing:
+                    db.session.execute(update(table).where(table.c.user_id == values['user_id']).values(values))
+                else:
+                    db.session.execute(table.insert(), values)
+            db.session.commit()
+    return drifted
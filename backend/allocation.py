@@ -0,0 +1,328 @@
+"""
+allocation.py - Allocation of donations made without a need for EquiLearn
+General and pooled donations carry no need_id. The allocator splits each one
+across open needs: approved, unfinished needs at verified schools. Each
+worker keeps the open needs as NumPy column arrays and scores them all in one
+vectorized pass:
+
+    score = urgency weight x location weight x sqrt(remaining gap in dollars)
+
+A donation goes to the ALLOCATION_FANOUT highest scoring needs in proportion
+to their scores, and no need gets more than its remaining gap. The square
+root keeps the largest needs from taking everything. Shares buy whole items;
+cents too few for another item are kept on the best need as credit toward its
+next one, so every dollar ends up counted as progress.
+
+Before each allocation the arrays catch up incrementally. They re-read the
+needs named in the live_update change log since the last sync, plus any
+needs created since then, and look again for log rows that committed out of
+id order, as the live streams do. They are rebuilt from scratch only when the
+log has been pruned past that point.
+
+NumPy is imported on first use. Without it, donations stay queued for
+`flask allocate-donations`.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, insert, or_, select, update
+
+from extensions import db
+from live import LogPosition, live_hub, need_updates
+from models import Donation, DonationAllocation, LiveUpdate, Need, School
+
+URGENCY_WEIGHTS = {'high': 3.0, 'medium': 2.0, 'low': 1.0}
+# Rural schools usually have the fewest other sources of funding
+LOCATION_WEIGHTS = {'rural': 1.5, 'suburban': 1.2, 'urban': 1.0}
+DEFAULT_FANOUT = 5
+DEFAULT_CHUNK_SIZE = 1000
+
+_numpy = None
+
+
+def _load_numpy():
+    global _numpy
+    if _numpy is None:
+        import numpy
+        _numpy = numpy
+    return _numpy
+
+
+class NeedSnapshot:
+    """The open needs as parallel arrays, one position per need."""
+
+    def __init__(self, np):
+        self.np = np
+        self.ids = np.empty(0, np.int64)
+        self.weight = np.empty(0)  # urgency x location
+        self.cost = np.empty(0)
+        self.gap = np.empty(0, np.int64)  # Items still needed; 0 once a need is closed
+        self.credit = np.empty(0)  # Dollars held toward each need's next item
+        self.score = np.empty(0)
+        self.positions = {}
+        self.max_need_id = 0
+        self.log = LogPosition(live_hub.gap_seconds)
+        self.synced_at = time.monotonic()
+        self.dirty = set()  # Needs planned against but not re-read since
+
+    @staticmethod
+    def _query(*criteria):
+        return (select(Need.id, Need.urgency, Need.status, Need.total_needed,
+                       func.coalesce(Need.current_donations, 0).label('current'), Need.cost_per_item,
+                       func.coalesce(Need.allocation_credit, 0).label('credit'),
+                       School.location, School.verified)
+                .join(School, School.id == Need.school_id)
+                .where(*criteria))
+
+    def load(self):
+        """Read every open need. The log position is taken first, so nothing is missed."""
+        self.synced_at = time.monotonic()
+        self.log.start(db.session.execute)
+        self.max_need_id = db.session.execute(select(func.max(Need.id))).scalar() or 0
+        self._apply(db.session.execute(self._query(Need.status == 'approved', School.verified == True,
+                                                   Need.id <= self.max_need_id)))
+
+    def sync(self):
+        """Catch up with the change log. Returns False when the snapshot must be rebuilt."""
+        now = time.monotonic()
+        first = db.session.execute(select(func.min(LiveUpdate.id))).scalar()
+        # Missing ids below the oldest row are uncommitted unless this snapshot
+        # sat idle long enough for the log to be pruned past them
+        if first is not None and first > self.log.last_id + 1 and now - self.synced_at > live_hub.retention / 2:
+            return False
+        self.synced_at = now
+        # Also re-asks for log ids skipped because they had not committed yet
+        changes = db.session.execute(select(LiveUpdate.id, LiveUpdate.kind, LiveUpdate.item_id)
+                                     .where(self.log.unread()).order_by(LiveUpdate.id)).all()
+        self.log.advance([change.id for change in changes])
+        need_ids = {change.item_id for change in changes if change.kind == 'need'} | self.dirty
+        self.dirty = set()
+        criteria = Need.id > self.max_need_id
+        if need_ids:
+            criteria = or_(criteria, Need.id.in_(need_ids))
+        self._apply(db.session.execute(self._query(criteria)))
+        return True
+
+    def _apply(self, rows):
+        np = self.np
+        changed, added = [], []
+        for row in rows:
+            self.max_need_id = max(self.max_need_id, row.id)
+            is_open = row.status == 'approved' and row.verified and row.cost_per_item > 0
+            gap = max(row.total_needed - row.current, 0) if is_open else 0
+            weight = URGENCY_WEIGHTS.get(row.urgency, 1.0) * LOCATION_WEIGHTS.get(row.location, 1.0)
+            position = self.positions.get(row.id)
+            if position is not None:
+                self.weight[position], self.cost[position], self.gap[position] = weight, row.cost_per_item, gap
+                self.credit[position] = row.credit
+                changed.append(position)
+            elif gap:
+                added.append((row.id, weight, row.cost_per_item, gap, row.credit))
+        if added:
+            start = len(self.ids)
+            ids, weight, cost, gap, credit = zip(*added)
+            self.ids = np.concatenate((self.ids, np.array(ids, np.int64)))
+            self.weight = np.concatenate((self.weight, np.array(weight)))
+            self.cost = np.concatenate((self.cost, np.array(cost)))
+            self.gap = np.concatenate((self.gap, np.array(gap, np.int64)))
+            self.credit = np.concatenate((self.credit, np.array(credit, dtype=float)))
+            self.score = np.concatenate((self.score, np.zeros(len(added))))
+            self.positions.update((need_id, start + i) for i, need_id in enumerate(ids))
+            changed.extend(range(start, start + len(added)))
+        if changed:
+            self._rescore(np.array(changed, np.int64))
+
+    def _rescore(self, positions):
+        remaining = self.gap[positions] * self.cost[positions] - self.credit[positions]
+        self.score[positions] = self.weight[positions] * self.np.sqrt(self.np.maximum(remaining, 0))
+
+    def split(self, amount, fanout):
+        """Plan one donation as [(need_id, amount, items)] and deduct it from the arrays.
+
+        Each need's share is the price of whole items, less any credit it
+        already holds. Cents too few for another item in the plan go to the
+        best need with room as credit, so the shares add up to ``amount``.
+        Money beyond every chosen need's gap is left unallocated.
+        """
+        np = self.np
+        open_needs = int(np.count_nonzero(self.gap))
+        budget = int(round(amount * 100))
+        if budget <= 0 or not open_needs:
+            return []
+        k = min(fanout, open_needs)
+        # argpartition finds the k best in linear time; only those k get sorted
+        top = np.argpartition(self.score, len(self.score) - k)[-k:]
+        top = top[np.argsort(-self.score[top], kind='stable')]
+        # Plan in cents so the shares add up to the donation exactly
+        cost = np.maximum(np.rint(self.cost[top] * 100).astype(np.int64), 1)
+        credit = np.rint(self.credit[top] * 100).astype(np.int64)
+        gap = self.gap[top]
+        room = np.maximum(gap * cost - credit, 0)
+        weights = self.score[top]
+        targets = np.zeros(k)
+        free = room > 0
+        # Water-filling: needs that hit their gap drop out and the rest share what's left
+        for _ in range(k):
+            remaining = budget - targets.sum()
+            active = weights * free
+            if remaining < 1 or not active.any():
+                break
+            targets = np.minimum(targets + remaining * active / active.sum(), room)
+            free = targets < room
+        items = np.minimum((credit + targets.astype(np.int64)) // cost, gap)
+        shares = np.where(items > 0, items * cost - credit, 0)
+        left = budget - int(shares.sum())
+        # Flooring to whole items leaves up to an item's price per need; buy more items with it, best need first
+        bought = True
+        while bought:
+            bought = False
+            for i in range(k):
+                price = cost[i] - (credit[i] if items[i] == 0 else 0)
+                if items[i] < gap[i] and price <= left:
+                    items[i] += 1
+                    shares[i] += price
+                    left -= price
+                    bought = True
+        # What's left can't buy an item anywhere in the plan; it waits on the best need with room
+        for i in range(k):
+            if left and items[i] < gap[i]:
+                shares[i] += left
+                left = 0
+        self.gap[top] -= items
+        self.credit[top] = (credit + shares - items * cost) / 100
+        self._rescore(top)
+        self.dirty.update(int(need_id) for need_id in self.ids[top])
+        return [(int(need_id), int(share) / 100, int(count))
+                for need_id, share, count in zip(self.ids[top], shares, items) if share > 0]
+
+
+class AllocationReport:
+    """Donations allocated by one batch run."""
+
+    def __init__(self):
+        self.donations = 0
+        self.amount = 0.0
+        self.unallocated = 0
+        self.allocations = 0
+        self.started = time.perf_counter()
+
+    def to_dict(self):
+        return {'donations': self.donations, 'amount': round(self.amount, 2), 'unallocated': self.unallocated,
+                'allocations': self.allocations, 'seconds': round(time.perf_counter() - self.started, 3)}
+
+
+class AllocationEngine:
+    """Splits donations without a need across open needs, per donation or in batches.
+
+    Config: ``ALLOCATION_FANOUT`` (needs per donation, default 5) and
+    ``ALLOCATE_ON_DONATION`` (allocate inside the donation request; when
+    false, donations wait for the batch command). Both are also read from
+    the environment.
+    """
+
+    def __init__(self):
+        self.fanout = DEFAULT_FANOUT
+        self.immediate = True
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.fanout = app.config.setdefault('ALLOCATION_FANOUT', int(os.getenv('ALLOCATION_FANOUT', DEFAULT_FANOUT)))
+        self.immediate = app.config.setdefault('ALLOCATE_ON_DONATION',
+                                               os.getenv('ALLOCATE_ON_DONATION', 'true').lower() != 'false')
+        app.extensions['allocation'] = self
+
+    @property
+    def available(self):
+        try:
+            _load_numpy()
+        except ImportError:
+            return False
+        return True
+
+    def _current_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.sync():
+            snapshot = NeedSnapshot(_load_numpy())
+            snapshot.load()
+            self._snapshot = snapshot
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._snapshot = None
+
+    def allocate(self, donation_id, amount):
+        """Allocate one donation inside the caller's transaction and return its split."""
+        with self._lock:
+            split = self._current_snapshot().split(amount, self.fanout)
+        if split:
+            _write([(donation_id, split)])
+        return split
+
+    def allocate_queued(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Allocate every queued donation without a need, committing once per chunk."""
+        report = AllocationReport()
+        last_id = 0
+        while True:
+            queued = db.session.execute(
+                select(Donation.id, Donation.amount)
+                .where(Donation.need_id.is_(None), Donation.allocated_at.is_(None), Donation.id > last_id)
+                .order_by(Donation.id)
+                .limit(chunk_size)
+            ).all()
+            if not queued:
+                break
+            last_id = queued[-1].id
+            with self._lock:
+                snapshot = self._current_snapshot()
+                plans = [(row.id, snapshot.split(row.amount, self.fanout)) for row in queued]
+            plans = [(donation_id, split) for donation_id, split in plans if split]
+            try:
+                _write(plans)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            report.donations += len(plans)
+            report.unallocated += len(queued) - len(plans)
+            report.allocations += sum(len(split) for _, split in plans)
+            report.amount += sum(share for _, split in plans for _, share, _ in split)
+        return report
+
+
+def _write(plans):
+    """Store allocations, move need progress and mark the donations allocated."""
+    now = datetime.utcnow()
+    rows = [{'donation_id': donation_id, 'need_id': need_id, 'amount': share, 'items': items, 'created_at': now}
+            for donation_id, split in plans for need_id, share, items in split]
+    if not rows:
+        return
+    db.session.execute(insert(DonationAllocation.__table__), rows)
+
+    totals = {}
+    for row in rows:
+        total = totals.setdefault(row['need_id'], [0, 0.0])
+        total[0] += row['items']
+        total[1] += row['amount']
+    need = Need.__table__
+    progress = func.coalesce(need.c.current_donations, 0) + bindparam('items')
+    # Whatever a share paid beyond its whole items stays on the need as credit toward the next one
+    credit = func.coalesce(need.c.allocation_credit, 0) + bindparam('paid') - bindparam('items') * need.c.cost_per_item
+    db.session.execute(
+        update(need)
+        .where(need.c.id == bindparam('need_pk'))
+        .values(current_donations=case((progress > need.c.total_needed, need.c.total_needed), else_=progress),
+                allocation_credit=func.round(credit, 2)),
+        [{'need_pk': need_id, 'items': items, 'paid': paid} for need_id, (items, paid) in totals.items()]
+    )
+    live_hub.record(*need_updates(Need.id.in_(totals)))
+
+    donation = Donation.__table__
+    db.session.execute(update(donation).where(donation.c.id == bindparam('donation_pk')).values(allocated_at=now),
+                       [{'donation_pk': donation_id} for donation_id, _ in plans])
+
+
+allocator = AllocationEngine()
@@ -1,8 +1,9 @@
 """
 app.py - Main Flask backend for EquiLearn
 Handles API routes for user registration, authentication, school and donation management, and admin features.
+create_app() builds the application; nothing is set up at import time.
 """
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for, flash, send_from_directory
+from flask import Blueprint, Flask, current_app, request, jsonify, render_template, session, redirect, url_for, flash, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
@@ -11,14 +12,29 @@ from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 load_dotenv()
-import openai
 import re
-import json
-from models import User, School, Need, Donation, FeaturedSchool, FeaturedSchoolDonation, MicroDonationPool
-from extensions import db, login_manager
-from flask_migrate import Migrate
+from models import (User, School, Need, Donation, FeaturedSchool, FeaturedSchoolDonation, MicroDonationPool,
+                    MicroDonationPoolJoin, DonorTotals, CacheGeneration)
+from extensions import db, login_manager, cache_sync, response_cache, user_cache, metrics
+from users import load_session_user
+from database import configure_database, init_engines, is_lock_timeout, use_read_pool
+from featured import featured_payload, search_featured_schools, invalidate_featured_city, clear_featured_city
+from history import donation_history, SOURCE_RANKS as HISTORY_TYPES
+from bulk import iter_records, import_donations, import_schools, DEFAULT_CHUNK_SIZE
+import seed
+import settlement
+from aggregates import (bump_impact_stats, load_impact_stats, rebuild_impact_stats, bump_donor_totals,
+                        donor_totals_dict, reconcile_donor_totals)
+from integrations import init_integrations
+from allocation import allocator, DEFAULT_CHUNK_SIZE as ALLOCATION_CHUNK_SIZE
+from search import search, search_available, rebuild_search_index, SEARCH_TYPES
+from live import (live_hub, snapshot as live_snapshot, featured_school_update, pool_update, need_update, need_updates,
+                  TOPIC_KINDS)
 import random
-openai.api_key = os.getenv('OPENAI_API_KEY')
+import click
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload
 
 # Get the absolute paths to frontend directories
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -26,49 +42,139 @@ frontend_dir = os.path.join(os.path.dirname(current_dir), 'frontend')
 template_dir = os.path.join(frontend_dir, 'templates')
 static_dir = os.path.join(frontend_dir, 'static')
 
-app = Flask(__name__, 
-            template_folder=template_dir,
-            static_folder=static_dir)
+api = Blueprint('api', __name__, cli_group=None)
 
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///equilearn.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def create_app(config=None):
+    """Build the Flask app. ``config`` overrides the defaults and the environment."""
+    app = Flask(__name__, 
+                template_folder=template_dir,
+                static_folder=static_dir)
+    
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+    app.config.update(config or {})
+    
+    configure_database(app)
+    db.init_app(app)
+    init_engines(app, db)
+    metrics.init_app(app, db)
+    # Alembic is slow to import and only the `flask db` commands need it
+    if app.config.setdefault('MIGRATIONS_ENABLED', os.getenv('FLASK_RUN_FROM_CLI') == 'true'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    CORS(app)
+    login_manager.init_app(app)
+    response_cache.init_app(app)
+    user_cache.init_app(app)
+    cache_sync.init_app(app, db, CacheGeneration)
+    live_hub.init_app(app)
+    allocator.init_app(app)
+    init_integrations(app)
+    app.register_blueprint(api)
+    return app
 
-db.init_app(app)
-migrate = Migrate(app, db)
-CORS(app)
-login_manager.init_app(app)
+# Page sizes for paginated list routes
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Most ids accepted by one bulk admin action
+MAX_BULK_IDS = 1000
 
 # Database Models
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_session_user(int(user_id))
+
+def page_limit():
+    """Read the ``limit`` query parameter, clamped to the allowed page size."""
+    return max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+def set_need_status(need_ids, status):
+    """Move needs to ``status`` in one transaction, keeping the approved-needs total in step.
+
+    Returns the number of needs whose status changed. The caller commits.
+    """
+    in_ids = Need.id.in_(need_ids)
+    if status == 'approved':
+        # Only count a need once, even if it is approved twice
+        changed = Need.query.filter(in_ids, Need.status != 'approved').update(
+            {'status': 'approved'}, synchronize_session=False)
+        delta = changed
+    else:
+        was_approved = Need.query.filter(in_ids, Need.status == 'approved').update(
+            {'status': status}, synchronize_session=False)
+        changed = was_approved + Need.query.filter(in_ids, Need.status != status).update(
+            {'status': status}, synchronize_session=False)
+        delta = -was_approved
+    if delta:
+        bump_impact_stats(needs_funded=delta)
+    if changed:
+        # Streams and allocation snapshots learn about approvals from the change log
+        live_hub.record(*need_updates(in_ids))
+    return changed
+
+@api.app_errorhandler(OperationalError)
+def database_busy(error):
+    """Answer a write that timed out waiting for a database lock with 503, so clients retry."""
+    if not is_lock_timeout(error):
+        raise error
+    db.session.rollback()
+    response = jsonify({'error': 'The database is busy, please retry'})
+    response.headers['Retry-After'] = str(current_app.config['DB_RETRY_AFTER'])
+    return response, 503
 
 # Routes
-@app.route('/')
+@api.route('/')
 def index():
     return "EquiLearn Flask backend is running."
 
-@app.route('/api/schools', methods=['GET'])
+@api.route('/api/schools', methods=['GET'])
+@response_cache.cached('schools')
+@use_read_pool
 def get_schools():
-    """Get all schools with their needs"""
-    schools = School.query.filter_by(verified=True).all()
+    """Get a page of verified schools with their approved needs.
+
+    Schools and their needs are fetched with one query each regardless of
+    catalog size. Optional filters: city, state, category, urgency. Pass the
+    ``X-Next-Cursor`` header of a response back as ``cursor`` to get the next page.
+    """
+    limit = page_limit()
+    cursor = request.args.get('cursor', type=int)
+
+    need_filters = [Need.status == 'approved']
+    if request.args.get('category'):
+        need_filters.append(Need.category == request.args['category'])
+    if request.args.get('urgency'):
+        need_filters.append(Need.urgency == request.args['urgency'])
+
+    # Only include schools with approved needs
+    query = School.query.filter(School.verified == True, School.needs.any(db.and_(*need_filters)))
+    if request.args.get('city'):
+        query = query.filter(School.city == request.args['city'])
+    if request.args.get('state'):
+        query = query.filter(School.state == request.args['state'])
+    if cursor is not None:
+        query = query.filter(School.id > cursor)
+
+    schools = (query
+               .options(selectinload(School.needs.and_(*need_filters)))
+               .order_by(School.id)
+               .limit(limit + 1)
+               .all())
+    has_more = len(schools) > limit
+    schools = schools[:limit]
+
     result = []
-    
     for school in schools:
-        school_data = {
+        result.append({
             'id': school.id,
             'name': school.name,
             'location': school.location,
             'city': school.city,
             'state': school.state,
-            'needs': []
-        }
-        
-        for need in school.needs:
-            if need.status == 'approved':
-                need_data = {
+            'needs': [
+                {
                     'id': need.id,
                     'title': need.title,
                     'description': need.description,
@@ -78,15 +184,42 @@ def get_schools():
                     'currentDonations': need.current_donations,
                     'costPerItem': need.cost_per_item,
                     'totalCost': need.total_needed * need.cost_per_item
-                }
-                school_data['needs'].append(need_data)
-        
-        if school_data['needs']:  # Only include schools with approved needs
-            result.append(school_data)
-    
-    return jsonify(result)
+                } for need in sorted(school.needs, key=lambda n: n.id)
+            ]
+        })
+
+    response = jsonify(result)
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(schools[-1].id)
+    return response
+
+@api.route('/api/search', methods=['GET'])
+@use_read_pool
+def search_catalog():
+    """Full-text search over verified schools and their approved needs, best match first.
+
+    Query parameters: q (the last word matches as a prefix), type (all,
+    schools, needs), page (from 1) and limit. Pass the ``X-Next-Page``
+    header of a response back as ``page`` to get the next page.
+    """
+    words = request.args.get('q', '').strip()
+    if not words:
+        return jsonify({'error': 'q is required'}), 400
+    kind = request.args.get('type', 'all')
+    if kind not in SEARCH_TYPES:
+        return jsonify({'error': 'type must be one of: %s' % ', '.join(SEARCH_TYPES)}), 400
+    if not search_available():
+        return jsonify({'error': 'Search is not available on this database'}), 501
+
+    limit = page_limit()
+    page = max(1, request.args.get('page', 1, type=int))
+    results, has_more = search(words, kind, limit, (page - 1) * limit)
+    response = jsonify(results)
+    if has_more:
+        response.headers['X-Next-Page'] = str(page + 1)
+    return response
 
-@app.route('/api/schools', methods=['POST'])
+@api.route('/api/schools', methods=['POST'])
 def create_school():
     """Register a new school"""
     data = request.get_json()
@@ -107,7 +240,26 @@ def create_school():
     
     return jsonify({'message': 'School registered successfully', 'id': school.id}), 201
 
-@app.route('/api/needs', methods=['POST'])
+@api.route('/api/admin/schools/bulk', methods=['POST'])
+@login_required
+def bulk_import_schools():
+    """Import schools with their needs streamed as NDJSON (default) or CSV"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    
+    report = import_schools(iter_records(request.stream, fmt), chunk_size=max(1, chunk_size), dry_run=dry_run)
+    if report.inserted and not dry_run:
+        response_cache.invalidate('impact', 'schools')
+    
+    return jsonify(report.to_dict())
+
+@api.route('/api/needs', methods=['POST'])
 def create_need():
     """Create a new need for a school"""
     data = request.get_json()
@@ -130,7 +282,7 @@ def create_need():
     
     return jsonify({'message': 'Need created successfully', 'id': need.id}), 201
 
-@app.route('/api/donations', methods=['POST'])
+@api.route('/api/donations', methods=['POST'])
 def create_donation():
     """Process a donation"""
     data = request.get_json()
@@ -138,24 +290,12 @@ def create_donation():
     if not data or not all(k in data for k in ['amount', 'donation_type']):
         return jsonify({'error': 'Missing required fields'}), 400
     
-    # Create anonymous donor if not logged in
-    donor_id = None
-    if current_user.is_authenticated:
-        donor_id = current_user.id
-    else:
-        # Create anonymous user for tracking
-        anonymous_user = User(
-            email=f"anonymous_{datetime.utcnow().timestamp()}@equilearn.org",
-            password_hash=generate_password_hash('anonymous'),
-            name=data.get('donor_name', 'Anonymous Donor'),
-            role='donor'
-        )
-        db.session.add(anonymous_user)
-        db.session.commit()
-        donor_id = anonymous_user.id
+    # Guests donate without an account; only their display name is kept
+    donor_id = current_user.id if current_user.is_authenticated else None
     
     donation = Donation(
         donor_id=donor_id,
+        donor_name=None if donor_id else data.get('donor_name', 'Anonymous Donor'),
         need_id=data.get('need_id'),
         amount=data['amount'],
         donation_type=data['donation_type'],
@@ -163,36 +303,127 @@ def create_donation():
     )
     
     db.session.add(donation)
+    bump_impact_stats(total_donations=data['amount'])
+    if donor_id:
+        bump_donor_totals(donor_id, donations_total=data['amount'], donations_count=1)
     
-    # Update need progress if it's a direct donation
+    # Update need progress if it's a direct donation. The increment and the
+    # clamp to total_needed run in one UPDATE so concurrent donations can't be lost.
     if data['donation_type'] == 'direct' and data.get('need_id'):
-        need = Need.query.get(data['need_id'])
+        progress = db.func.coalesce(Need.current_donations, 0) + db.cast(data['amount'] / Need.cost_per_item, db.Integer)
+        need = db.session.execute(
+            update(Need)
+            .where(Need.id == data['need_id'])
+            .values(current_donations=db.case((progress > Need.total_needed, Need.total_needed), else_=progress))
+            .returning(Need.id, Need.school_id, Need.current_donations, Need.total_needed)
+            .execution_options(synchronize_session=False)
+        ).first()
         if need:
-            items_funded = int(data['amount'] / need.cost_per_item)
-            need.current_donations = min(need.current_donations + items_funded, need.total_needed)
+            live_hub.record(need_update(need))
+    
+    # Money given without a need is split across open needs now, or by the
+    # nightly allocate-donations run when allocation is deferred
+    split = []
+    if not data.get('need_id') and allocator.immediate and allocator.available:
+        db.session.flush()
+        split = allocator.allocate(donation.id, data['amount'])
     
     db.session.commit()
+    response_cache.invalidate('impact', 'schools')
     
-    return jsonify({'message': 'Donation processed successfully', 'id': donation.id}), 201
+    result = {'message': 'Donation processed successfully', 'id': donation.id}
+    if split:
+        result['allocations'] = [{'needId': need_id, 'amount': share, 'items': items}
+                                 for need_id, share, items in split]
+    return jsonify(result), 201
 
-@app.route('/api/donations', methods=['GET'])
+@api.route('/api/donations', methods=['GET'])
+@login_required
+@use_read_pool
 def get_donations():
-    return jsonify([])
+    """Get a page of the current user's donations, pool joins included, newest first.
+
+    Optional filters: type (comma-separated need, featured, pool) and an ISO
+    date range with start (inclusive) and end (exclusive). Pass the
+    ``X-Next-Cursor`` header of a response back as ``cursor`` to get the next page.
+    """
+    types = set(filter(None, request.args.get('type', '').split(','))) or None
+    if types and not types <= set(HISTORY_TYPES):
+        return jsonify({'error': 'type must be one of ' + ', '.join(HISTORY_TYPES)}), 400
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        items, next_cursor = donation_history(current_user.id, page_limit(), request.args.get('cursor'),
+                                              types, start, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@api.route('/api/admin/donations/bulk', methods=['POST'])
+@login_required
+def bulk_import_donations():
+    """Import donations streamed as NDJSON (default) or CSV in the request body"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    
+    report = import_donations(iter_records(request.stream, fmt), chunk_size=max(1, chunk_size))
+    if report.inserted:
+        response_cache.invalidate('impact', 'schools')
+    
+    return jsonify(report.to_dict())
 
-@app.route('/api/admin/needs/pending', methods=['GET'])
+@api.route('/api/donors/me/totals', methods=['GET'])
 @login_required
+@use_read_pool
+def get_my_totals():
+    """Get the current user's running donation totals"""
+    return jsonify(donor_totals_dict(db.session.get(DonorTotals, current_user.id)))
+
+@api.route('/api/admin/needs/pending', methods=['GET'])
+@login_required
+@use_read_pool
 def get_pending_needs():
-    """Get pending needs for admin approval"""
+    """Get a page of pending needs for admin approval, oldest first.
+
+    Optional filters: category, urgency, school_id. Pass the ``X-Next-Cursor``
+    header of a response back as ``cursor`` to get the next page.
+    """
     if current_user.role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
     
-    needs = Need.query.filter_by(status='pending').all()
-    result = []
+    limit = page_limit()
+    cursor = request.args.get('cursor', type=int)
+    query = (db.session.query(Need.id, Need.title, Need.description, Need.category, Need.urgency,
+                              Need.total_needed, Need.cost_per_item, Need.created_at,
+                              School.name.label('school_name'))
+             .join(School, Need.school_id == School.id)
+             .filter(Need.status == 'pending'))
+    if request.args.get('category'):
+        query = query.filter(Need.category == request.args['category'])
+    if request.args.get('urgency'):
+        query = query.filter(Need.urgency == request.args['urgency'])
+    if request.args.get('school_id', type=int):
+        query = query.filter(Need.school_id == request.args.get('school_id', type=int))
+    if cursor is not None:
+        query = query.filter(Need.id > cursor)
+    needs = query.order_by(Need.id).limit(limit + 1).all()
+    has_more = len(needs) > limit
+    needs = needs[:limit]
     
+    result = []
     for need in needs:
         need_data = {
             'id': need.id,
-            'school_name': need.school.name,
+            'school_name': need.school_name,
             'title': need.title,
             'description': need.description,
             'category': need.category,
@@ -202,45 +433,114 @@ def get_pending_needs():
         }
         result.append(need_data)
     
-    return jsonify(result)
+    response = jsonify(result)
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(needs[-1].id)
+    return response
 
-@app.route('/api/admin/needs/<int:need_id>/approve', methods=['POST'])
+@api.route('/api/admin/needs/<int:need_id>/approve', methods=['POST'])
 @login_required
 def approve_need(need_id):
     """Approve a pending need"""
     if current_user.role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
     
-    need = Need.query.get_or_404(need_id)
-    need.status = 'approved'
+    Need.query.get_or_404(need_id)
+    set_need_status([need_id], 'approved')
     db.session.commit()
+    response_cache.invalidate('impact', 'schools')
     
     return jsonify({'message': 'Need approved successfully'})
 
-@app.route('/api/admin/needs/<int:need_id>/reject', methods=['POST'])
+@api.route('/api/admin/needs/<int:need_id>/reject', methods=['POST'])
 @login_required
 def reject_need(need_id):
     """Reject a pending need"""
     if current_user.role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
     
-    need = Need.query.get_or_404(need_id)
-    need.status = 'rejected'
+    Need.query.get_or_404(need_id)
+    set_need_status([need_id], 'rejected')
     db.session.commit()
+    response_cache.invalidate('impact', 'schools')
     
     return jsonify({'message': 'Need rejected successfully'})
 
-@app.route('/api/admin/schools', methods=['GET'])
+@api.route('/api/admin/needs/bulk', methods=['POST'])
 @login_required
+def bulk_review_needs():
+    """Approve or reject a list of needs in one transaction"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json()
+    actions = {'approve': 'approved', 'reject': 'rejected'}
+    if not data or data.get('action') not in actions or not isinstance(data.get('ids'), list):
+        return jsonify({'error': 'Expected {"action": "approve"|"reject", "ids": [...]}'}), 400
+    try:
+        need_ids = sorted({int(need_id) for need_id in data['ids']})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ids must be integers'}), 400
+    if len(need_ids) > MAX_BULK_IDS:
+        return jsonify({'error': f'At most {MAX_BULK_IDS} ids per request'}), 400
+    
+    updated = set_need_status(need_ids, actions[data['action']]) if need_ids else 0
+    db.session.commit()
+    if updated:
+        response_cache.invalidate('impact', 'schools')
+    
+    return jsonify({'message': f'{updated} need(s) updated', 'requested': len(need_ids), 'updated': updated})
+
+@api.route('/api/admin/schools', methods=['GET'])
+@login_required
+@use_read_pool
 def get_all_schools():
-    """Get all schools for admin management"""
+    """Get a page of schools for admin management with their need counts.
+
+    Query parameters: page (from 1), limit, sort (id, name, city, created_at,
+    needs_count), order (asc, desc) and verified (true, false).
+    """
     if current_user.role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
     
-    schools = School.query.all()
-    result = []
+    limit = page_limit()
+    page = max(1, request.args.get('page', 1, type=int))
     
-    for school in schools:
+    # Count needs per school in SQL instead of loading them
+    need_counts = (db.session.query(
+                       Need.school_id,
+                       db.func.count(Need.id).label('total'),
+                       db.func.sum(db.case((Need.status == 'pending', 1), else_=0)).label('pending'),
+                       db.func.sum(db.case((Need.status == 'approved', 1), else_=0)).label('approved'),
+                       db.func.sum(db.case((Need.status == 'rejected', 1), else_=0)).label('rejected'))
+                   .group_by(Need.school_id)
+                   .subquery())
+    needs_count = db.func.coalesce(need_counts.c.total, 0)
+    query = (db.session.query(School.id, School.name, School.location, School.city, School.state, School.verified,
+                              needs_count.label('needs_count'),
+                              db.func.coalesce(need_counts.c.pending, 0).label('pending'),
+                              db.func.coalesce(need_counts.c.approved, 0).label('approved'),
+                              db.func.coalesce(need_counts.c.rejected, 0).label('rejected'))
+             .outerjoin(need_counts, need_counts.c.school_id == School.id))
+    
+    verified = request.args.get('verified', '').lower()
+    if verified in ('true', '1'):
+        query = query.filter(School.verified == True)
+    elif verified in ('false', '0'):
+        query = query.filter(db.or_(School.verified == False, School.verified.is_(None)))
+    
+    sort_columns = {'id': School.id, 'name': School.name, 'city': School.city,
+                    'created_at': School.created_at, 'needs_count': needs_count}
+    sort_column = sort_columns.get(request.args.get('sort'), School.id)
+    if request.args.get('order') == 'desc':
+        query = query.order_by(sort_column.desc(), School.id.desc())
+    else:
+        query = query.order_by(sort_column, School.id)
+    schools = query.offset((page - 1) * limit).limit(limit + 1).all()
+    has_more = len(schools) > limit
+    
+    result = []
+    for school in schools[:limit]:
         school_data = {
             'id': school.id,
             'name': school.name,
@@ -248,179 +548,300 @@ def get_all_schools():
             'city': school.city,
             'state': school.state,
             'verified': school.verified,
-            'needs_count': len(school.needs)
+            'needs_count': school.needs_count,
+            'needs_by_status': {
+                'pending': school.pending,
+                'approved': school.approved,
+                'rejected': school.rejected
+            }
         }
         result.append(school_data)
     
-    return jsonify(result)
+    response = jsonify(result)
+    if has_more:
+        response.headers['X-Next-Page'] = str(page + 1)
+    return response
+
+def verify_schools(school_ids):
+    """Mark schools verified, keeping the verified-schools total in step.
 
-@app.route('/api/admin/schools/<int:school_id>/verify', methods=['POST'])
+    Returns the number of schools that were not verified before. The caller commits.
+    """
+    newly_verified = School.query.filter(
+        School.id.in_(school_ids), db.or_(School.verified == False, School.verified.is_(None))
+    ).update({'verified': True}, synchronize_session=False)
+    if newly_verified:
+        bump_impact_stats(schools_helped=newly_verified)
+        live_hub.record(*need_updates(Need.school_id.in_(school_ids), Need.status == 'approved'))
+    return newly_verified
+
+@api.route('/api/admin/schools/<int:school_id>/verify', methods=['POST'])
 @login_required
 def verify_school(school_id):
     """Verify a school"""
     if current_user.role != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
     
-    school = School.query.get_or_404(school_id)
-    school.verified = True
+    School.query.get_or_404(school_id)
+    verify_schools([school_id])
     db.session.commit()
+    response_cache.invalidate('impact', 'schools')
     
     return jsonify({'message': 'School verified successfully'})
 
-@app.route('/api/impact', methods=['GET'])
+@api.route('/api/admin/schools/verify', methods=['POST'])
+@login_required
+def bulk_verify_schools():
+    """Verify a list of schools in one transaction"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json()
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({'error': 'Expected {"ids": [...]}'}), 400
+    try:
+        school_ids = sorted({int(school_id) for school_id in data['ids']})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ids must be integers'}), 400
+    if len(school_ids) > MAX_BULK_IDS:
+        return jsonify({'error': f'At most {MAX_BULK_IDS} ids per request'}), 400
+    
+    updated = verify_schools(school_ids) if school_ids else 0
+    db.session.commit()
+    if updated:
+        response_cache.invalidate('impact', 'schools')
+    
+    return jsonify({'message': f'{updated} school(s) verified', 'requested': len(school_ids), 'updated': updated})
+
+@api.route('/api/impact', methods=['GET'])
+@response_cache.cached('impact')
+@use_read_pool
 def get_impact_stats():
-    """Get overall impact statistics"""
-    total_donations = db.session.query(db.func.sum(Donation.amount)).scalar() or 0
-    total_schools = School.query.filter_by(verified=True).count()
-    total_needs = Need.query.filter_by(status='approved').count()
+    """Get overall impact statistics from the materialized totals"""
+    stats = load_impact_stats()
     
     return jsonify({
-        'total_donations': total_donations,
-        'schools_helped': total_schools,
-        'needs_funded': total_needs,
-        'students_impacted': int(total_donations / 100)  # Rough estimate
+        'total_donations': stats.total_donations,
+        'schools_helped': stats.schools_helped,
+        'needs_funded': stats.needs_funded,
+        'students_impacted': int(stats.total_donations / 100)  # Rough estimate
     })
 
-@app.route('/api/featured-schools')
+@api.route('/api/admin/cache/stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Get hit/miss counters for the response and user caches"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify({
+        'responses': response_cache.stats(),
+        'users': user_cache.stats(),
+        'live': live_hub.stats()
+    })
+
+@api.cli.command('import-donations')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Rows per transaction.')
+def import_donations_command(path, fmt, chunk_size):
+    """Bulk-load donations from an NDJSON or CSV file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, 'rb') as f:
+        report = import_donations(iter_records(f, fmt), chunk_size=chunk_size).to_dict()
+    for error in report['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {report['inserted']} of {report['rows']} rows "
+               f"({report['failed']} failed) in {report['seconds']}s, {report['rows_per_second']} rows/s.")
+
+@api.cli.command('import-schools')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Schools per transaction.')
+@click.option('--dry-run', is_flag=True, help='Validate and roll back instead of committing.')
+def import_schools_command(path, fmt, chunk_size, dry_run):
+    """Bulk-load schools and their needs from an NDJSON or CSV file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, 'rb') as f:
+        report = import_schools(iter_records(f, fmt), chunk_size=chunk_size, dry_run=dry_run).to_dict()
+    for error in report['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"{'Dry run: would import' if dry_run else 'Imported'} {report['schools_inserted']} schools "
+               f"({report['schools_existing']} already existed) and {report['needs_inserted']} needs from "
+               f"{report['rows']} rows ({report['failed']} failed) in {report['seconds']}s, "
+               f"{report['rows_per_second']} rows/s.")
+
+@api.cli.command('clear-featured')
+@click.argument('city')
+def clear_featured_command(city):
+    """Delete a city's featured schools so they are generated afresh.
+
+    Running workers drop their cached copy within CACHE_SYNC_MS.
+    """
+    deleted = clear_featured_city(city)
+    db.session.commit()
+    response_cache.invalidate('featured_schools:%s' % city)
+    click.echo(f'Cleared {deleted} featured school(s) for {city}.')
+
+@api.cli.command('reconcile-donor-totals')
+@click.option('--check', is_flag=True, help='Only report drift, do not fix it.')
+def reconcile_donor_totals_command(check):
+    """Recompute per-donor totals from the raw donation tables and fix drift."""
+    drifted = reconcile_donor_totals(fix=not check)
+    for user_id, diff in drifted:
+        fields = ', '.join(f'{field} stored {stored}, actual {actual}' for field, (stored, actual) in diff.items())
+        click.echo(f'user {user_id}: {fields}')
+    if not drifted:
+        click.echo('Donor totals are consistent.')
+    else:
+        click.echo(f"{len(drifted)} donor(s) {'drifted' if check else 'fixed'}.")
+
+@api.cli.command('rebuild-impact')
+@click.option('--check', is_flag=True, help='Only report drift, do not store the recomputed totals.')
+def rebuild_impact_command(check):
+    """Recompute the /api/impact totals from scratch and report any drift."""
+    drift = rebuild_impact_stats()
+    for field, (stored, actual) in drift.items():
+        click.echo(f'{field}: stored {stored}, actual {actual}')
+    if check:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    click.echo(f'{len(drift)} total(s) drifted.' if drift else 'Impact totals are consistent.')
+
+@api.cli.command('settle-pools')
+@click.option('--chunk-size', default=settlement.DEFAULT_CHUNK_SIZE, show_default=True,
+              help='Joins read per query while totalling a pool.')
+@click.option('--batch-size', default=settlement.DEFAULT_BATCH_SIZE, show_default=True,
+              help='Pools settled per transaction.')
+@click.option('--fix', is_flag=True, help="Overwrite drifted pools' amount and participants with their joins' totals.")
+def settle_pools_command(chunk_size, batch_size, fix):
+    """Close expired micro-pools and record their final totals.
+
+    Safe to run from cron: each run closes the pools that expired since the
+    last one and settles every closed pool, including any an interrupted run left.
+    Pools whose counters drifted from their joins are listed and left as they are unless --fix is given.
+    """
+    report = settlement.settle_pools(chunk_size=max(1, chunk_size), batch_size=max(1, batch_size), fix=fix)
+    for pool_id, recorded, settled in report.drifted:
+        click.echo(f'pool {pool_id}: recorded {recorded}, settled from joins {settled}' + (' (fixed)' if fix else ''))
+    click.echo(f'Closed {report.closed} pool(s); settled {report.settled} pool(s) over {report.joins} join(s).')
+
+@api.cli.command('allocate-donations')
+@click.option('--chunk-size', default=ALLOCATION_CHUNK_SIZE, show_default=True, help='Donations per transaction.')
+def allocate_donations_command(chunk_size):
+    """Split every queued donation that has no need across open needs.
+
+    Meant to run nightly; it also picks up donations made while per-donation
+    allocation was off or found no open needs.
+    """
+    if not allocator.available:
+        raise click.ClickException('Allocation needs NumPy; install it with `pip install numpy`.')
+    report = allocator.allocate_queued(chunk_size=max(1, chunk_size)).to_dict()
+    click.echo(f"Allocated {report['donations']} donation(s) totalling {report['amount']} across "
+               f"{report['allocations']} need share(s) in {report['seconds']}s; "
+               f"{report['unallocated']} left queued with no open needs.")
+
+@api.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search indexes from the school and need tables.
+
+    The indexes follow every write on their own; rebuild after restoring a
+    database without them, after a migration rebuilt the school or need
+    table, or if search results look out of date.
+    """
+    if not search_available():
+        raise click.ClickException('Full-text search needs SQLite with FTS5.')
+    counts = rebuild_search_index()
+    db.session.commit()
+    click.echo(', '.join(f'{index}: {rows} row(s)' for index, rows in counts.items()))
+
+@api.cli.command('seed')
+@click.option('--schools', default=seed.DEFAULT_SCALE['schools'], show_default=True)
+@click.option('--needs', default=seed.DEFAULT_SCALE['needs'], show_default=True)
+@click.option('--users', default=seed.DEFAULT_SCALE['users'], show_default=True, help='Donor accounts.')
+@click.option('--donations', default=seed.DEFAULT_SCALE['donations'], show_default=True)
+@click.option('--pools', default=seed.DEFAULT_SCALE['pools'], show_default=True)
+@click.option('--pool-joins', default=seed.DEFAULT_SCALE['pool_joins'], show_default=True)
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Same seed, same rows.')
+@click.option('--chunk-size', default=seed.DEFAULT_CHUNK_SIZE, show_default=True, help='Rows per INSERT batch.')
+@click.option('--transaction-rows', default=seed.DEFAULT_TRANSACTION_ROWS, show_default=True,
+              help='Rows per transaction.')
+@click.option('--password', default=seed.DEFAULT_PASSWORD, show_default=True, help='Password of every seeded donor.')
+def seed_command(schools, needs, users, donations, pools, pool_joins, seed_value, chunk_size, transaction_rows,
+                 password):
+    """Generate a large deterministic dataset for load testing and debugging."""
+    db.create_all()
+    scale = {'schools': schools, 'needs': needs, 'users': users, 'donations': donations,
+             'pools': pools, 'pool_joins': pool_joins}
+    report = seed.seed_database(scale, seed=seed_value, chunk_size=chunk_size,
+                                transaction_rows=transaction_rows, password=password).to_dict()
+    for name, table in report['tables'].items():
+        click.echo(f"{name}: {table['rows']} rows in {table['seconds']}s ({table['rows_per_second']} rows/s)")
+    click.echo(f"Seeded {report['rows']} rows in {report['seconds']}s, {report['rows_per_second']} rows/s.")
+
+@api.route('/api/featured-schools')
+@response_cache.cached('featured_schools', tags=lambda: ['featured_schools:%s' % request.args.get('city')])
+@use_read_pool
 def featured_schools():
     city = request.args.get('city')
-    user_id = request.args.get('user_id')
+    user_id = request.args.get('user_id', type=int)
     if not city:
         return jsonify({'error': 'City is required'}), 400
-    # Check DB first for this city only
-    query = FeaturedSchool.query.filter_by(city=city)
-    if user_id:
-        query = query.filter_by(user_id=user_id)
-    schools = query.all()
-    if schools:
-        return jsonify([
-            {
-                'id': s.id,
-                'name': s.name,
-                'location': s.location,
-                'description': s.description,
-                'needs': json.loads(s.needs) if s.needs else [],
-                'fundingGoal': s.funding_goal,
-                'currentFunding': s.current_funding
-            } for s in schools
-        ])
-    # Instead of OpenAI, generate 6 mock schools with reasonable values
-    if city and city.lower() == 'mississauga':
-        mock_schools = [
-            {
-                'name': 'John Fraser Secondary School',
-                'location': '2665 Erin Centre Blvd, Mississauga, ON L5M 5H6',
-                'description': 'John Fraser Secondary School is a public high school in Mississauga with a focus on academic excellence and extracurricular activities.',
-                'needs': ['new textbooks', 'upgraded technology', 'sports equipment'],
-                'fundingGoal': 10000,
-                'currentFunding': 300
-            },
-            {
-                'name': 'St. Marcellinus Secondary School',
-                'location': '730 Courtneypark Dr W, Mississauga, ON L5W 1L9',
-                'description': 'St. Marcellinus Secondary School is a Catholic high school known for its strong arts and sports programs.',
-                'needs': ['musical instruments', 'art supplies', 'sports uniforms'],
-                'fundingGoal': 8000,
-                'currentFunding': 210
-            },
-            {
-                'name': 'Barondale Public School',
-                'location': '200 Barondale Dr, Mississauga, ON L4Z 3N7',
-                'description': 'Barondale Public School is an elementary school in Mississauga that prides itself on fostering a supportive and inclusive learning environment.',
-                'needs': ['educational games', 'classroom supplies', 'updated library books'],
-                'fundingGoal': 5000,
-                'currentFunding': 0
-            },
-        ]
-        return jsonify(mock_schools)
-    mock_schools = [
-        {
-            'name': f'{city} Central School',
-            'location': f'{city}, Main St',
-            'description': f'A leading K-12 school in {city}.',
-            'needs': ['new computers', 'library books', 'sports equipment'],
-            'fundingGoal': 10000,
-            'currentFunding': 3000
-        },
-        {
-            'name': f'{city} North Academy',
-            'location': f'{city}, North Ave',
-            'description': f'An innovative school in the north of {city}.',
-            'needs': ['science lab', 'musical instruments', 'art supplies'],
-            'fundingGoal': 5000,
-            'currentFunding': 2100
-        },
-        {
-            'name': f'{city} South Elementary',
-            'location': f'{city}, South Rd',
-            'description': f'A vibrant elementary school in {city}.',
-            'needs': ['playground upgrade', 'STEM kits', 'tablets'],
-            'fundingGoal': 6400,
-            'currentFunding': 1200
-        },
-        {
-            'name': f'{city} West High',
-            'location': f'{city}, West Blvd',
-            'description': f'A high school with a focus on sports and arts.',
-            'needs': ['gym renovation', 'band uniforms', 'projectors'],
-            'fundingGoal': 15000,
-            'currentFunding': 8000
-        },
-        {
-            'name': f'{city} East Prep',
-            'location': f'{city}, East Pkwy',
-            'description': f'A preparatory school in the east of {city}.',
-            'needs': ['robotics club', 'language lab', 'smart boards'],
-            'fundingGoal': 12000,
-            'currentFunding': 4000
-        },
-        {
-            'name': f'{city} Lakeside School',
-            'location': f'{city}, Lakeside Dr',
-            'description': f'A school near the lake in {city}.',
-            'needs': ['canoes', 'environmental science kits', 'garden tools'],
-            'fundingGoal': 9000,
-            'currentFunding': 6000
-        },
-    ]
-    # Save to DB for this city
-    for s in mock_schools:
-        db.session.add(FeaturedSchool(
-            user_id=user_id,
-            city=city,
-            name=s['name'],
-            location=s['location'],
-            description=s['description'],
-            needs=json.dumps(s['needs']),
-            funding_goal=s['fundingGoal'],
-            current_funding=s['currentFunding']
-        ))
+    return current_app.response_class(featured_payload(city, user_id), mimetype='application/json')
+
+@api.route('/api/featured-schools/search')
+@use_read_pool
+def search_featured():
+    """Find featured schools with a need starting with the ``need`` keyword"""
+    keyword = request.args.get('need', '').strip()
+    if not keyword:
+        return jsonify({'error': 'need is required'}), 400
+    return jsonify(search_featured_schools(keyword, request.args.get('city'), page_limit()))
+
+@api.route('/api/admin/featured-schools', methods=['DELETE'])
+@login_required
+def clear_featured_schools():
+    """Delete a city's featured schools so they are generated again on the next visit"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    city = request.args.get('city')
+    if not city:
+        return jsonify({'error': 'City is required'}), 400
+    deleted = clear_featured_city(city)
     db.session.commit()
-    return jsonify(mock_schools)
+    response_cache.invalidate('featured_schools:%s' % city)
+    
+    return jsonify({'message': f'Cleared {deleted} featured school(s) for {city}'})
 
-@app.route('/api/featured-schools/donate', methods=['POST'])
+@api.route('/api/featured-schools/donate', methods=['POST'])
 def donate_to_featured_school():
     data = request.get_json()
     school_id = data.get('school_id')
     amount = data.get('amount')
     if not school_id or not amount or amount <= 0:
         return jsonify({'error': 'Invalid school_id or amount'}), 400
-    school = FeaturedSchool.query.get(school_id)
+    # Increment in SQL so concurrent donations can't overwrite each other
+    school = db.session.execute(
+        update(FeaturedSchool)
+        .where(FeaturedSchool.id == school_id)
+        .values(current_funding=db.func.coalesce(FeaturedSchool.current_funding, 0) + amount)
+        .returning(FeaturedSchool.id, FeaturedSchool.city, FeaturedSchool.current_funding, FeaturedSchool.funding_goal)
+        .execution_options(synchronize_session=False)
+    ).first()
     if not school:
+        db.session.rollback()
         return jsonify({'error': 'School not found'}), 404
-    if school.current_funding is None:
-        school.current_funding = 0
-    school.current_funding += amount
-    # Record the donation if user is logged in
-    user_id = None
+    # Record the donation if user is logged in; their running total comes back with it
+    total_donated = 0
     if current_user.is_authenticated:
-        user_id = current_user.id
-        db.session.add(FeaturedSchoolDonation(user_id=user_id, school_id=school_id, amount=amount))
+        db.session.add(FeaturedSchoolDonation(user_id=current_user.id, school_id=school_id, amount=amount))
+        total_donated = bump_donor_totals(current_user.id, featured_total=amount, featured_count=1).featured_total
+    live_hub.record(featured_school_update(school))
     db.session.commit()
-    # Calculate user's total donated to featured schools
-    total_donated = 0
-    if user_id:
-        total_donated = db.session.query(db.func.sum(FeaturedSchoolDonation.amount)).filter_by(user_id=user_id).scalar() or 0
+    response_cache.invalidate('featured_schools:%s' % school.city)
+    invalidate_featured_city(school.city)
     return jsonify({
         'school_id': school.id,
         'currentFunding': school.current_funding,
@@ -428,9 +849,15 @@ def donate_to_featured_school():
         'userTotalDonated': total_donated
     })
 
-@app.route('/api/micro-pools', methods=['GET'])
+@api.route('/api/micro-pools', methods=['GET'])
+@response_cache.cached('micro_pools')
+@use_read_pool
 def get_micro_pools():
-    pools = MicroDonationPool.query.all()
+    """List the pools still taking joins, soonest ending first."""
+    pools = (MicroDonationPool.query
+             .filter(MicroDonationPool.status == 'active', MicroDonationPool.end_date > datetime.utcnow())
+             .order_by(MicroDonationPool.end_date)
+             .all())
     return jsonify([
         {
             'id': p.id,
@@ -443,25 +870,66 @@ def get_micro_pools():
         } for p in pools
     ])
 
-@app.route('/api/micro-pools/join', methods=['POST'])
+@api.route('/api/micro-pools/join', methods=['POST'])
 @login_required
 def join_micro_pool():
     data = request.get_json()
     pool_id = data.get('pool_id')
     amount = data.get('amount', 0)
-    pool = MicroDonationPool.query.get(pool_id)
+    # Increment in SQL so concurrent joins can't overwrite each other. Only a
+    # user's first join adds a participant; the pool/user index answers that.
+    joined_before = db.exists().where(MicroDonationPoolJoin.pool_id == pool_id,
+                                      MicroDonationPoolJoin.user_id == current_user.id)
+    pool = db.session.execute(
+        update(MicroDonationPool)
+        .where(MicroDonationPool.id == pool_id, MicroDonationPool.status == 'active',
+               MicroDonationPool.end_date > datetime.utcnow())
+        .values(current_amount=MicroDonationPool.current_amount + amount,
+                participants=MicroDonationPool.participants + db.case((joined_before, 0), else_=1))
+        .returning(MicroDonationPool.id, MicroDonationPool.current_amount, MicroDonationPool.participants)
+        .execution_options(synchronize_session=False)
+    ).first()
     if not pool:
-        return jsonify({'error': 'Pool not found'}), 404
-    pool.current_amount += amount
-    pool.participants += 1
-    from models import MicroDonationPoolJoin
+        db.session.rollback()
+        if pool_id is None or db.session.get(MicroDonationPool, pool_id) is None:
+            return jsonify({'error': 'Pool not found'}), 404
+        return jsonify({'error': 'Pool has closed'}), 409
     join = MicroDonationPoolJoin(user_id=current_user.id, pool_id=pool_id, amount=amount)
     db.session.add(join)
+    bump_donor_totals(current_user.id, pools_total=amount or 0, pools_count=1)
+    live_hub.record(pool_update(pool))
     db.session.commit()
+    response_cache.invalidate('micro_pools')
     return jsonify({'message': 'Donated to pool successfully', 'currentAmount': pool.current_amount, 'participants': pool.participants})
 
+@api.route('/api/live', methods=['GET'])
+def live_progress():
+    """Stream funding progress for one city, pool or school as Server-Sent Events.
+
+    Pass exactly one of ``city`` (featured schools), ``pool`` or ``school``
+    (its approved needs). The first ``snapshot`` event holds the current
+    values; each ``progress`` event then lists the items that changed since
+    the last tick, with their new totals.
+    """
+    topics = [(kind, request.args[kind]) for kind in TOPIC_KINDS if request.args.get(kind)]
+    if len(topics) != 1:
+        return jsonify({'error': 'Pass exactly one of city, pool or school'}), 400
+    kind, key = topics[0]
+    if kind != 'city' and not key.isdigit():
+        return jsonify({'error': f'{kind} must be an id'}), 400
+    
+    subscription = live_hub.subscribe(f'{kind}:{key}')
+    try:
+        initial = live_snapshot(subscription.topic)
+    except Exception:
+        live_hub.unsubscribe(subscription)
+        raise
+    # Proxies must pass events through as they are written
+    return current_app.response_class(live_hub.stream(subscription, initial), mimetype='text/event-stream',
+                                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Authentication routes
-@app.route('/register/donor', methods=['GET', 'POST'])
+@api.route('/register/donor', methods=['GET', 'POST'])
 def register_donor():
     """Register a new donor user via POST request."""
     if request.method == 'POST':
@@ -479,7 +947,7 @@ def register_donor():
         return jsonify({'message': 'Registration successful'}), 201
     return render_template('register_donor.html')
 
-@app.route('/register/admin', methods=['GET', 'POST'])
+@api.route('/register/admin', methods=['GET', 'POST'])
 def register_admin():
     if request.method == 'POST':
         data = request.get_json()
@@ -496,7 +964,7 @@ def register_admin():
         return jsonify({'message': 'Registration successful'}), 201
     return render_template('register_admin.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@api.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         data = request.get_json()
@@ -504,7 +972,6 @@ def login():
         if user and check_password_hash(user.password_hash, data['password']):
             login_user(user)
             session.permanent = True
-            app.permanent_session_lifetime = timedelta(days=30)
             return jsonify({
                 'message': 'Login successful',
                 'user': {
@@ -517,107 +984,106 @@ def login():
         return jsonify({'error': 'Invalid credentials'}), 401
     # If already logged in, redirect to main page
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('api.index'))
     return render_template('login.html')
 
-@app.route('/logout')
+@api.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('api.login'))
 
 # Initialize database
 def init_db():
-    with app.app_context():
-        db.create_all()
+    """Create the tables and add sample data to an empty database."""
+    db.create_all()
+    
+    # Create admin user if it doesn't exist
+    admin = User.query.filter_by(email='admin@equilearn.org').first()
+    if not admin:
+        admin = User(
+            email='admin@equilearn.org',
+            password_hash=generate_password_hash('admin123'),
+            name='Admin User',
+            role='admin'
+        )
+        db.session.add(admin)
+    
+    # Add sample data if database is empty
+    if School.query.count() == 0:
+        sample_schools = [
+            School(name="Oakwood Middle School", location="urban", city="Springfield", state="IL", verified=True),
+            School(name="Riverside Elementary", location="rural", city="Farmville", state="NC", verified=True),
+            School(name="Lincoln High School", location="suburban", city="Fairview", state="CA", verified=True)
+        ]
         
-        # Create admin user if it doesn't exist
-        admin = User.query.filter_by(email='admin@equilearn.org').first()
-        if not admin:
-            admin = User(
-                email='admin@equilearn.org',
-                password_hash=generate_password_hash('admin123'),
-                name='Admin User',
-                role='admin'
-            )
-            db.session.add(admin)
+        for school in sample_schools:
+            db.session.add(school)
         
-        # Add sample data if database is empty
-        if School.query.count() == 0:
-            sample_schools = [
-                School(name="Oakwood Middle School", location="urban", city="Springfield", state="IL", verified=True),
-                School(name="Riverside Elementary", location="rural", city="Farmville", state="NC", verified=True),
-                School(name="Lincoln High School", location="suburban", city="Fairview", state="CA", verified=True)
-            ]
-            
-            for school in sample_schools:
-                db.session.add(school)
-            
-            db.session.commit()
-            
-            # Add sample needs
-            sample_needs = [
-                Need(school_id=1, title="Chromebooks for Grade 6", description="Need 5 Chromebooks for our 6th grade computer lab", 
-                     category="Technology", urgency="high", total_needed=5, current_donations=2, cost_per_item=300, status="approved"),
-                Need(school_id=1, title="Science Lab Equipment", description="Microscopes and lab supplies for biology class", 
-                     category="STEM", urgency="medium", total_needed=10, current_donations=3, cost_per_item=150, status="approved"),
-                Need(school_id=2, title="Art Supplies", description="Paint, brushes, and canvas for art class", 
-                     category="Art", urgency="low", total_needed=50, current_donations=15, cost_per_item=5, status="approved"),
-                Need(school_id=3, title="Sports Equipment", description="Basketballs, soccer balls, and gym equipment", 
-                     category="Sports", urgency="medium", total_needed=20, current_donations=8, cost_per_item=25, status="approved"),
-                Need(school_id=3, title="Library Books", description="New fiction and non-fiction books for library", 
-                     category="Books", urgency="low", total_needed=100, current_donations=30, cost_per_item=15, status="approved")
-            ]
-            
-            for need in sample_needs:
-                db.session.add(need)
-            
-            db.session.commit()
+        db.session.commit()
         
-        # Add sample micro donation pools if none exist
-        if MicroDonationPool.query.count() == 0:
-            from datetime import datetime
-            pools = [
-                MicroDonationPool(
-                    name='Back to School Supplies',
-                    description='Help provide essential school supplies for students in need across multiple schools.',
-                    target_amount=10000,
-                    current_amount=6500,
-                    participants=127,
-                    end_date=datetime(2024, 2, 14)
-                ),
-                MicroDonationPool(
-                    name='Technology for All',
-                    description='Fund computers and tablets for schools that lack basic technology infrastructure.',
-                    target_amount=25000,
-                    current_amount=18200,
-                    participants=89,
-                    end_date=datetime(2024, 2, 29)
-                ),
-                MicroDonationPool(
-                    name='Sports Equipment Drive',
-                    description='Provide sports equipment and uniforms for schools to promote physical education.',
-                    target_amount=8000,
-                    current_amount=4200,
-                    participants=156,
-                    end_date=datetime(2024, 2, 27)
-                ),
-            ]
-            for pool in pools:
-                db.session.add(pool)
-            db.session.commit()
+        # Add sample needs
+        sample_needs = [
+            Need(school_id=1, title="Chromebooks for Grade 6", description="Need 5 Chromebooks for our 6th grade computer lab", 
+                 category="Technology", urgency="high", total_needed=5, current_donations=2, cost_per_item=300, status="approved"),
+            Need(school_id=1, title="Science Lab Equipment", description="Microscopes and lab supplies for biology class", 
+                 category="STEM", urgency="medium", total_needed=10, current_donations=3, cost_per_item=150, status="approved"),
+            Need(school_id=2, title="Art Supplies", description="Paint, brushes, and canvas for art class", 
+                 category="Art", urgency="low", total_needed=50, current_donations=15, cost_per_item=5, status="approved"),
+            Need(school_id=3, title="Sports Equipment", description="Basketballs, soccer balls, and gym equipment", 
+                 category="Sports", urgency="medium", total_needed=20, current_donations=8, cost_per_item=25, status="approved"),
+            Need(school_id=3, title="Library Books", description="New fiction and non-fiction books for library", 
+                 category="Books", urgency="low", total_needed=100, current_donations=30, cost_per_item=15, status="approved")
+        ]
         
-        print("Database initialized successfully!")
-
-class OpenAIKeyLoader:
-    @staticmethod
-    def ensure_key():
-        import openai, os
-        if not openai.api_key or openai.api_key == '':
-            openai.api_key = "sk-...yourkey..."  # <-- REPLACE with your real key
+        for need in sample_needs:
+            db.session.add(need)
+        
+        db.session.commit()
+    
+    # Add sample micro donation pools if none exist
+    if MicroDonationPool.query.count() == 0:
+        from datetime import datetime
+        pools = [
+            MicroDonationPool(
+                name='Back to School Supplies',
+                description='Help provide essential school supplies for students in need across multiple schools.',
+                target_amount=10000,
+                current_amount=6500,
+                participants=127,
+                end_date=datetime.utcnow() + timedelta(days=30)
+            ),
+            MicroDonationPool(
+                name='Technology for All',
+                description='Fund computers and tablets for schools that lack basic technology infrastructure.',
+                target_amount=25000,
+                current_amount=18200,
+                participants=89,
+                end_date=datetime.utcnow() + timedelta(days=45)
+            ),
+            MicroDonationPool(
+                name='Sports Equipment Drive',
+                description='Provide sports equipment and uniforms for schools to promote physical education.',
+                target_amount=8000,
+                current_amount=4200,
+                participants=156,
+                end_date=datetime.utcnow() + timedelta(days=60)
+            ),
+        ]
+        for pool in pools:
+            db.session.add(pool)
+        db.session.commit()
+    
+    # Seed data is added directly, so recompute the impact totals from it
+    rebuild_impact_stats()
+    db.session.commit()
+    
+    print("Database initialized successfully!")
 
-OpenAIKeyLoader.ensure_key()
+@api.cli.command('init-db')
+def init_db_command():
+    """Create the tables and add the sample schools, needs and pools."""
+    init_db()
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, port=5000) 
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
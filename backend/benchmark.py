@@ -0,0 +1,446 @@
+"""
+benchmark.py - In-process route benchmark for EquiLearn
+Seeds a throwaway SQLite database at a chosen scale with seed.py, drives the API routes
+through the Flask test client from a pool of threads, and reports throughput,
+p50/p95/p99 latency and SQL statements per request for each route.
+
+    python benchmark.py --schools 2000 --donations 50000 --concurrency 8 --output results.json
+    python benchmark.py --baseline results.json --max-regression 20
+
+With --url the same requests go over HTTP to a running server instead (seed
+it first with `flask init-db` and `flask seed` at the same scale, and pass
+--password if the donors were seeded with another one); SQL statement counts
+are then not available.
+
+The live_* routes time opening an /api/live stream up to its first event.
+Over --url a gthread server holds a thread for each stream the benchmark hung
+up on until that stream's next heartbeat, so run them against gevent workers
+or a server with a short LIVE_HEARTBEAT_SECONDS.
+
+Results are written as JSON; with --baseline the run is compared against an
+earlier result file and exits non-zero when any route's p95 latency regressed
+by more than --max-regression percent.
+"""
+import http.client
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import click
+
+import seed
+
+STATES = tuple(seed.STATES)
+CATEGORIES = tuple(seed.CATEGORIES)
+URGENCIES = tuple(seed.URGENCIES)
+CITIES = seed.CITY_NAMES[:6]
+SEARCH_TERMS = ('stem', 'sci', 'art', 'lib', 'new')
+POOLS = 20
+
+ADMIN_ID = 1
+ADMIN_EMAIL = 'admin@equilearn.org'
+DONOR_PASSWORD = 'benchmark'
+
+# ``path`` and ``body`` take (rng, scale) and build one request; role is None, 'donor' or 'admin'.
+# A ``stream`` route is an event stream: each request reads the first event and hangs up.
+Route = namedtuple('Route', 'name method path body role stream', defaults=(False,))
+
+
+def _ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+_emails = itertools.count()
+
+ROUTES = [
+    Route('index', 'GET', lambda rng, s: '/', None, None),
+    Route('schools', 'GET', lambda rng, s: '/api/schools', None, None),
+    Route('schools_filtered', 'GET',
+          lambda rng, s: f'/api/schools?state={rng.choice(STATES)}&category={rng.choice(CATEGORIES)}', None, None),
+    Route('create_school', 'POST', lambda rng, s: '/api/schools',
+          lambda rng, s: {'name': f'Bench School {rng.random()}', 'location': 'urban',
+                          'city': rng.choice(CITIES), 'state': rng.choice(STATES)}, None),
+    Route('create_need', 'POST', lambda rng, s: '/api/needs',
+          lambda rng, s: {'school_id': rng.randint(1, s['schools']), 'title': 'Pencils', 'description': 'Pencils',
+                          'category': rng.choice(CATEGORIES), 'urgency': rng.choice(URGENCIES),
+                          'total_needed': 100, 'cost_per_item': 1.5}, None),
+    Route('donate', 'POST', lambda rng, s: '/api/donations',
+          lambda rng, s: {'amount': rng.randint(5, 100), 'donation_type': 'direct',
+                          'need_id': rng.randint(1, s['needs'])}, 'donor'),
+    Route('donate_guest', 'POST', lambda rng, s: '/api/donations',
+          lambda rng, s: {'amount': rng.randint(5, 100), 'donation_type': 'general', 'donor_name': 'Guest'}, None),
+    Route('donation_history', 'GET', lambda rng, s: '/api/donations', None, 'donor'),
+    Route('donor_totals', 'GET', lambda rng, s: '/api/donors/me/totals', None, 'donor'),
+    Route('impact', 'GET', lambda rng, s: '/api/impact', None, None),
+    Route('featured', 'GET', lambda rng, s: f'/api/featured-schools?city={rng.choice(CITIES)}', None, None),
+    Route('featured_search', 'GET', lambda rng, s: f'/api/featured-schools/search?need={rng.choice(SEARCH_TERMS)}',
+          None, None),
+    Route('search', 'GET', lambda rng, s: f'/api/search?q={rng.choice(SEARCH_TERMS)}', None, None),
+    Route('search_needs', 'GET',
+          lambda rng, s: f'/api/search?q={rng.choice(SEARCH_TERMS)}&type=needs&page=2&limit=20', None, None),
+    Route('featured_donate', 'POST', lambda rng, s: '/api/featured-schools/donate',
+          lambda rng, s: {'school_id': rng.choice(s['featured_ids']), 'amount': rng.randint(5, 100)}, 'donor'),
+    Route('micro_pools', 'GET', lambda rng, s: '/api/micro-pools', None, None),
+    Route('micro_pool_join', 'POST', lambda rng, s: '/api/micro-pools/join',
+          lambda rng, s: {'pool_id': rng.choice(s['pool_ids']), 'amount': rng.randint(1, 10)}, 'donor'),
+    Route('admin_pending_needs', 'GET', lambda rng, s: '/api/admin/needs/pending', None, 'admin'),
+    Route('admin_schools', 'GET', lambda rng, s: '/api/admin/schools?sort=needs_count&order=desc', None, 'admin'),
+    Route('admin_approve_need', 'POST', lambda rng, s: f"/api/admin/needs/{rng.randint(1, s['needs'])}/approve",
+          None, 'admin'),
+    Route('admin_reject_need', 'POST', lambda rng, s: f"/api/admin/needs/{rng.randint(1, s['needs'])}/reject",
+          None, 'admin'),
+    Route('admin_bulk_needs', 'POST', lambda rng, s: '/api/admin/needs/bulk',
+          lambda rng, s: {'action': 'approve', 'ids': rng.sample(range(1, s['needs'] + 1), min(50, s['needs']))},
+          'admin'),
+    Route('admin_verify_school', 'POST', lambda rng, s: f"/api/admin/schools/{rng.randint(1, s['schools'])}/verify",
+          None, 'admin'),
+    Route('admin_bulk_verify', 'POST', lambda rng, s: '/api/admin/schools/verify',
+          lambda rng, s: {'ids': rng.sample(range(1, s['schools'] + 1), min(50, s['schools']))}, 'admin'),
+    Route('admin_import_donations', 'POST', lambda rng, s: '/api/admin/donations/bulk',
+          lambda rng, s: _ndjson({'amount': rng.randint(5, 100), 'donation_type': 'direct',
+                                  'need_id': rng.randint(1, s['needs'])} for _ in range(100)), 'admin'),
+    Route('admin_import_schools', 'POST', lambda rng, s: '/api/admin/schools/bulk?dry_run=1',
+          lambda rng, s: _ndjson({'name': f'Import School {rng.random()}', 'location': 'urban',
+                                  'city': rng.choice(CITIES), 'state': rng.choice(STATES)} for _ in range(20)),
+          'admin'),
+    Route('admin_cache_stats', 'GET', lambda rng, s: '/api/admin/cache/stats', None, 'admin'),
+    Route('register', 'POST', lambda rng, s: '/register/donor',
+          lambda rng, s: {'email': f'bench{next(_emails)}@equilearn.org', 'password': s['donor_password'],
+                          'name': 'Bench Donor'}, None),
+    Route('login', 'POST', lambda rng, s: '/login',
+          lambda rng, s: {'email': f"donor{ADMIN_ID + rng.randint(1, s['users'])}@seed.equilearn.org",
+                          'password': s['donor_password']}, None),
+    # Last: over --url, a gthread server keeps each hung-up stream's thread until its next heartbeat
+    Route('live_city', 'GET', lambda rng, s: f'/api/live?city={rng.choice(CITIES)}', None, None, True),
+    Route('live_pool', 'GET', lambda rng, s: f"/api/live?pool={rng.choice(s['pool_ids'])}", None, None, True),
+    Route('live_school', 'GET', lambda rng, s: f"/api/live?school={rng.randint(1, s['schools'])}", None, None, True),
+]
+
+
+def seed_admin(db):
+    """Create the admin account the admin routes log in as."""
+    from werkzeug.security import generate_password_hash
+    from models import User
+    db.session.add(User(id=ADMIN_ID, email=ADMIN_EMAIL, password_hash=generate_password_hash(DONOR_PASSWORD),
+                        name='Admin', role='admin'))
+    db.session.commit()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+class StatementCounter:
+    """Counts the SQL statements each thread sends, via engine events."""
+
+    def __init__(self, engines):
+        self._local = threading.local()
+        from sqlalchemy import event
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def take(self):
+        count = getattr(self._local, 'count', 0)
+        self._local.count = 0
+        return count
+
+
+class HttpClient:
+    """Keep-alive HTTP client with a cookie jar, shaped like the Flask test client."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port, self.prefix = parts.hostname, parts.port or 80, parts.path.rstrip('/')
+        self.cookies = {}
+        self._conn = None
+
+    def open(self, path, method='GET', json=None, data=None, content_type=None):
+        headers = {}
+        if json is not None:
+            data, content_type = _dumps(json), 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        for attempt in range(3):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self._conn.request(method, self.prefix + path, body=data, headers=headers)
+                response = self._conn.getresponse()
+                response.data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server dropped the connection: an idle keep-alive timed
+                # out, or a worker was recycled with connections still queued
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+        for cookie in response.headers.get_all('Set-Cookie') or ():
+            name, _, rest = cookie.partition('=')
+            self.cookies[name.strip()] = rest.split(';', 1)[0]
+        response.status_code = response.status
+        return response
+
+    def first_event(self, path):
+        """GET an event stream on a fresh connection, read up to its first event and hang up."""
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items())}
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request('GET', self.prefix + path, headers=headers if self.cookies else {})
+            response = conn.getresponse()
+            if response.status == 200:
+                data = False
+                # An event ends with a blank line; the retry line before it stands alone
+                while (line := response.readline()).strip() or not data:
+                    if not line:
+                        break
+                    data = data or line.startswith(b'data:')
+            return response.status
+        finally:
+            conn.close()
+
+
+def _dumps(value):
+    return json.dumps(value)
+
+
+class Target:
+    """Where requests go: the in-process app, or a server at ``url``."""
+
+    def __init__(self, app=None, url=None, admin_password=None, donor_password=DONOR_PASSWORD):
+        self.app = app
+        self.url = url
+        self.admin_password = admin_password
+        self.donor_password = donor_password
+
+    def client(self, user_id=None):
+        if self.url is None:
+            client = self.app.test_client()
+            if user_id is not None:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+            return client
+        client = HttpClient(self.url)
+        if user_id is not None:
+            email = ADMIN_EMAIL if user_id == ADMIN_ID else f'donor{user_id}@seed.equilearn.org'
+            password = self.admin_password if user_id == ADMIN_ID else self.donor_password
+            response = client.open('/login', 'POST', json={'email': email, 'password': password})
+            if response.status_code != 200:
+                raise click.ClickException(f'Could not log in as {email}')
+        return client
+
+    def get_json(self, client, path):
+        response = client.open(path)
+        return response.get_json() if self.url is None else json.loads(response.data)
+
+    def first_event(self, client, path):
+        """Open the event stream at ``path``, read its first event, hang up and return the status."""
+        if self.url is not None:
+            return client.first_event(path)
+        response = client.get(path, buffered=False)
+        try:
+            if response.status_code == 200:
+                received = b''
+                for chunk in response.response:
+                    received += chunk if isinstance(chunk, bytes) else chunk.encode()
+                    if b'data:' in received and received.endswith(b'\n\n'):
+                        break
+            return response.status_code
+        finally:
+            response.close()
+
+    def featured_ids(self):
+        """Ids of the featured schools in CITIES, generating them on first visit."""
+        client = self.client()
+        ids = []
+        for city in CITIES:
+            ids += [school['id'] for school in self.get_json(client, f'/api/featured-schools?city={city}')
+                    if school.get('id')]
+        return ids
+
+    def pool_ids(self):
+        """Ids of the pools still taking joins."""
+        return [pool['id'] for pool in self.get_json(self.client(), '/api/micro-pools')]
+
+
+def run_route(target, route, scale, requests, concurrency, counter, seed_value):
+    """Fire ``requests`` calls at one route and summarize them."""
+    def worker(args):
+        index, count = args
+        rng = random.Random(f'{seed_value}:{route.name}:{index}')
+        user_id = None
+        if route.role == 'admin':
+            user_id = ADMIN_ID
+        elif route.role == 'donor':
+            user_id = ADMIN_ID + rng.randint(1, scale['users'])
+        client = target.client(user_id)
+        samples = []
+        loop_started = time.perf_counter()
+        for _ in range(count):
+            path = route.path(rng, scale)
+            body = route.body(rng, scale) if route.body else None
+            kwargs = {'data': body, 'content_type': 'application/x-ndjson'} if isinstance(body, str) else {'json': body}
+            if counter:
+                counter.take()
+            started = time.perf_counter()
+            if route.stream:
+                status = target.first_event(client, path)
+            else:
+                status = client.open(path, method=route.method, **kwargs).status_code
+            elapsed = time.perf_counter() - started
+            samples.append((elapsed, counter.take() if counter else None, status))
+        return samples, loop_started, time.perf_counter()
+
+    shares = [(i, requests // concurrency + (1 if i < requests % concurrency else 0)) for i in range(concurrency)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        batches = list(pool.map(worker, shares))
+    samples = [sample for batch, _, _ in batches for sample in batch]
+    # Logins happen before each worker's loop, so they stay out of the throughput
+    wall = max(end for _, _, end in batches) - min(start for _, start, _ in batches)
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    statuses = Counter(sample[2] for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(count for status, count in statuses.items() if status >= 500),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'sql_per_request': round(sum(sample[1] for sample in samples) / len(samples), 2) if counter else None,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Print per-route changes against a baseline; return the routes over the threshold."""
+    regressed = []
+    click.echo(f"\n{'route':<24}{'p95 ms':>12}{'baseline':>12}{'change':>10}{'rps change':>12}{'sql change':>12}")
+    for name, current in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            click.echo(f'{name:<24}{current["p95_ms"]:>12}{"-":>12}')
+            continue
+        change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        rps = ((current['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100
+               if before['throughput_rps'] else 0.0)
+        if current['sql_per_request'] is None or before['sql_per_request'] is None:
+            sql = '-'
+        else:
+            sql = f"{current['sql_per_request'] - before['sql_per_request']:+.2f}"
+        click.echo(f'{name:<24}{current["p95_ms"]:>12}{before["p95_ms"]:>12}{change:>+9.1f}%{rps:>+11.1f}%{sql:>12}')
+        if max_regression is not None and change > max_regression:
+            regressed.append(name)
+    return regressed
+
+
+@click.command()
+@click.option('--schools', default=1000, show_default=True)
+@click.option('--needs', default=5000, show_default=True)
+@click.option('--users', default=500, show_default=True, help='Donor accounts.')
+@click.option('--donations', default=20000, show_default=True)
+@click.option('--requests', 'request_count', default=200, show_default=True, help='Requests per route.')
+@click.option('--concurrency', default=4, show_default=True, help='Client threads per route.')
+@click.option('--route', 'route_names', multiple=True, help='Only run these routes (repeatable).')
+@click.option('--response-cache/--no-response-cache', default=False, show_default=True,
+              help='Serve cacheable GETs from the response cache.')
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Random seed for data and requests.')
+@click.option('--output', default='benchmark-results.json', show_default=True, type=click.Path(dir_okay=False))
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Earlier results to compare with.')
+@click.option('--max-regression', type=float, help='Fail when a route p95 is this many percent over the baseline.')
+@click.option('--url', help='Benchmark a running server (e.g. http://127.0.0.1:8000) instead of the in-process app.')
+@click.option('--admin-password', default='admin123', show_default=True, help='Admin password for --url runs.')
+@click.option('--password', default='equilearn', show_default=True, help='Seeded donor password for --url runs.')
+def main(schools, needs, users, donations, request_count, concurrency, route_names, response_cache,
+         seed_value, output, baseline, max_regression, url, admin_password, password):
+    """Benchmark the API routes against a freshly seeded database or a running server."""
+    unknown = set(route_names) - {route.name for route in ROUTES}
+    if unknown:
+        raise click.BadParameter(', '.join(sorted(unknown)), param_hint='--route')
+    routes = [route for route in ROUTES if not route_names or route.name in route_names]
+
+    scale = {'schools': schools, 'needs': needs, 'users': users, 'donations': donations}
+    meta_scale = dict(scale)
+    counter = None
+    if url:
+        target = Target(url=url, admin_password=admin_password, donor_password=password)
+    else:
+        workdir = tempfile.mkdtemp(prefix='equilearn-bench-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        from app import create_app
+        from extensions import db, response_cache as cache
+
+        app = create_app()
+        cache.enabled = response_cache
+        with app.app_context():
+            db.create_all()
+            seed_admin(db)
+            report = seed.seed_database(dict(scale, pools=POOLS, pool_joins=donations // 10), seed=seed_value,
+                                        password=DONOR_PASSWORD).to_dict()
+            click.echo(f"Seeded {report['rows']} rows in {report['seconds']}s")
+            counter = StatementCounter(db.engines.values())
+        target = Target(app=app)
+    scale['donor_password'] = target.donor_password
+    # Featured schools are generated on first visit; create them before timing anything
+    scale['featured_ids'] = target.featured_ids()
+    scale['pool_ids'] = target.pool_ids()
+
+    results = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'scale': meta_scale,
+            'requests_per_route': request_count,
+            'concurrency': concurrency,
+            'response_cache': response_cache if not url else None,
+            'url': url,
+            'seed': seed_value,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'routes': {},
+    }
+    click.echo(f"{'route':<24}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>10}{'5xx':>6}")
+    for route in routes:
+        stats = run_route(target, route, scale, request_count, concurrency, counter, seed_value)
+        results['routes'][route.name] = stats
+        click.echo(f"{route.name:<24}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+                   f"{stats['p99_ms']:>10}{stats['sql_per_request'] if counter else '-':>10}{stats['errors']:>6}")
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    click.echo(f'Wrote {output}')
+
+    if baseline:
+        with open(baseline) as f:
+            regressed = compare(results, json.load(f), max_regression)
+        if regressed:
+            click.echo(f"p95 regressed more than {max_regression}% on: {', '.join(regressed)}", err=True)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
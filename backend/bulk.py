@@ -0,0 +1,376 @@
+"""
+bulk.py - Streaming bulk imports for EquiLearn
+Reads NDJSON or CSV a line at a time, validates each row, and writes in
+chunked transactions with executemany-style statements, so large files are
+never held in memory. A chunk the database rejects is rolled back and its
+lines reported as failed; the chunks before and after it still import.
+"""
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, insert, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from models import Donation, Need, School, User
+from aggregates import bump_impact_stats, bump_donor_totals_many
+from live import live_hub, need_updates
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    """A single input row failed validation."""
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line_number, record)`` from a binary or text stream.
+
+    ``record`` is a dict, or a RowError when the line can't be parsed.
+    """
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, {k: (v if v != '' else None) for k, v in record.items()}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'Invalid JSON: {e}')
+            continue
+        if not isinstance(record, dict):
+            yield line_number, RowError('Expected a JSON object')
+            continue
+        yield line_number, record
+
+
+def _optional_int(record, field):
+    value = record.get(field)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be an integer')
+
+
+def parse_donation(record):
+    """Validate one donation record and return the column values to insert."""
+    try:
+        amount = float(record.get('amount'))
+    except (TypeError, ValueError):
+        raise RowError('amount must be a number')
+    if not math.isfinite(amount) or amount <= 0:
+        raise RowError('amount must be a positive number')
+    donation_type = record.get('donation_type')
+    if not donation_type or len(str(donation_type)) > 20:
+        raise RowError('donation_type is required (max 20 characters)')
+    created_at = record.get('created_at')
+    if created_at is not None:
+        try:
+            created_at = datetime.fromisoformat(str(created_at))
+        except ValueError:
+            raise RowError('created_at must be an ISO 8601 timestamp')
+    donor_id = _optional_int(record, 'donor_id')
+    return {
+        'donor_id': donor_id,
+        'donor_name': None if donor_id else (record.get('donor_name') or 'Anonymous Donor'),
+        'need_id': _optional_int(record, 'need_id'),
+        'amount': amount,
+        'donation_type': str(donation_type),
+        'message': record.get('message') or '',
+        'created_at': created_at or datetime.utcnow(),
+    }
+
+
+class ImportReport:
+    """Running totals and per-row errors for one import."""
+
+    def __init__(self, dry_run=False, **counts):
+        self.dry_run = dry_run
+        self.counts = counts
+        self.rows = 0
+        self.inserted = 0
+        self.chunks = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = datetime.utcnow()
+
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': str(message)})
+
+    def to_dict(self):
+        elapsed = (datetime.utcnow() - self.started).total_seconds()
+        return dict(self.counts, **{
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': self.error_count,
+            'chunks': self.chunks,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed else None,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors),
+        })
+
+
+def import_donations(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Insert donations from ``iter_records`` output, one transaction per chunk."""
+    report = ImportReport()
+    chunk = []
+    for line_number, record in records:
+        report.rows += 1
+        try:
+            if isinstance(record, RowError):
+                raise record
+            chunk.append((line_number, parse_donation(record)))
+        except RowError as e:
+            report.error(line_number, e)
+            continue
+        if len(chunk) >= chunk_size:
+            _write_donation_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        _write_donation_chunk(chunk, report)
+    return report
+
+
+def _write_donation_chunk(chunk, report):
+    rejected = []
+    try:
+        written = _insert_donation_chunk(chunk, rejected)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        error = getattr(e, 'orig', None) or e
+        skipped = {line_number for line_number, _ in rejected}
+        rejected += [(line_number, f'not imported, the database rejected its chunk: {error}')
+                     for line_number, _ in chunk if line_number not in skipped]
+        written = 0
+    for line_number, message in sorted(rejected):
+        report.error(line_number, message)
+    if written:
+        report.inserted += written
+        report.chunks += 1
+
+
+def _insert_donation_chunk(chunk, rejected):
+    """Write a chunk's donations and totals and return how many were written; the caller commits.
+
+    Rows that reference a missing need or donor are added to ``rejected`` as (line, message).
+    """
+    need_ids = {values['need_id'] for _, values in chunk if values['need_id'] is not None}
+    donor_ids = {values['donor_id'] for _, values in chunk if values['donor_id'] is not None}
+    costs = dict(db.session.query(Need.id, Need.cost_per_item).filter(Need.id.in_(need_ids))) if need_ids else {}
+    known_donors = {row.id for row in db.session.query(User.id).filter(User.id.in_(donor_ids))} if donor_ids else set()
+
+    rows = []
+    items_by_need = {}
+    donor_deltas = {}
+    for line_number, values in chunk:
+        if values['need_id'] is not None and values['need_id'] not in costs:
+            rejected.append((line_number, f"need {values['need_id']} does not exist"))
+            continue
+        if values['donor_id'] is not None and values['donor_id'] not in known_donors:
+            rejected.append((line_number, f"donor {values['donor_id']} does not exist"))
+            continue
+        rows.append(values)
+        if values['donor_id'] is not None:
+            deltas = donor_deltas.setdefault(values['donor_id'], {'donations_total': 0, 'donations_count': 0})
+            deltas['donations_total'] += values['amount']
+            deltas['donations_count'] += 1
+        # Same rule as create_donation: only direct donations move a need's progress
+        if values['donation_type'] == 'direct' and values['need_id'] is not None:
+            items = int(values['amount'] / costs[values['need_id']])
+            items_by_need[values['need_id']] = items_by_need.get(values['need_id'], 0) + items
+    if not rows:
+        return 0
+
+    need = Need.__table__
+    progress = func.coalesce(need.c.current_donations, 0) + bindparam('items')
+    db.session.execute(insert(Donation.__table__), rows)
+    if items_by_need:
+        db.session.execute(
+            update(need)
+            .where(need.c.id == bindparam('need_pk'))
+            .values(current_donations=case((progress > need.c.total_needed, need.c.total_needed), else_=progress)),
+            [{'need_pk': need_id, 'items': items} for need_id, items in items_by_need.items()]
+        )
+        live_hub.record(*need_updates(Need.id.in_(items_by_need)))
+    bump_impact_stats(total_donations=sum(values['amount'] for values in rows))
+    if donor_deltas:
+        bump_donor_totals_many(donor_deltas)
+    return len(rows)
+
+
+SCHOOL_FIELDS = ('name', 'location', 'city', 'state')
+NEED_FIELDS = ('title', 'description', 'category', 'urgency', 'total_needed', 'cost_per_item')
+
+
+def _parse_bool(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_need(record):
+    """Validate one need record and return its column values (minus school_id)."""
+    missing = [field for field in NEED_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise RowError('need is missing ' + ', '.join(missing))
+    try:
+        total_needed = int(record['total_needed'])
+        cost_per_item = float(record['cost_per_item'])
+    except (TypeError, ValueError):
+        raise RowError('need total_needed and cost_per_item must be numbers')
+    if total_needed <= 0 or not math.isfinite(cost_per_item) or cost_per_item <= 0:
+        raise RowError('need total_needed and cost_per_item must be positive')
+    status = record.get('status') or 'pending'
+    if status not in ('pending', 'approved'):
+        raise RowError('need status must be pending or approved')
+    return {
+        'title': str(record['title']),
+        'description': str(record['description']),
+        'category': str(record['category']),
+        'urgency': str(record['urgency']),
+        'total_needed': total_needed,
+        'current_donations': 0,
+        'cost_per_item': cost_per_item,
+        'status': status,
+        'created_at': datetime.utcnow(),
+    }
+
+
+def parse_school(record):
+    """Validate a school record with its nested needs.
+
+    NDJSON rows carry a ``needs`` list; CSV rows describe at most one need in
+    ``need_*`` columns and repeat the school columns for each of its needs.
+    """
+    missing = [field for field in SCHOOL_FIELDS if not record.get(field)]
+    if missing:
+        raise RowError('missing ' + ', '.join(missing))
+    needs = record.get('needs')
+    if needs is None:
+        need = {field[5:]: value for field, value in record.items() if field.startswith('need_') and value is not None}
+        needs = [need] if need else []
+    if not isinstance(needs, list):
+        raise RowError('needs must be a list')
+    school = {
+        'name': str(record['name']),
+        'location': str(record['location']),
+        'city': str(record['city']),
+        'state': str(record['state']),
+        'description': record.get('description') or '',
+        'verified': _parse_bool(record.get('verified')),
+        'created_at': datetime.utcnow(),
+    }
+    return school, [parse_need(need) for need in needs]
+
+
+def import_schools(records, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Insert schools and their needs, skipping schools that already exist.
+
+    Schools are de-duplicated on (name, city, state) against the database and
+    the rest of the input. With ``dry_run`` every chunk is rolled back.
+    """
+    report = ImportReport(dry_run=dry_run, schools_inserted=0, schools_existing=0, needs_inserted=0)
+    school_ids = {}
+    chunk = []
+    for line_number, record in records:
+        report.rows += 1
+        try:
+            if isinstance(record, RowError):
+                raise record
+            chunk.append((line_number, parse_school(record)))
+        except RowError as e:
+            report.error(line_number, e)
+            continue
+        if len(chunk) >= chunk_size:
+            _write_school_chunk(chunk, school_ids, report)
+            chunk = []
+    if chunk:
+        _write_school_chunk(chunk, school_ids, report)
+    return report
+
+
+def _school_key(school):
+    return school['name'], school['city'], school['state']
+
+
+def _write_school_chunk(chunk, school_ids, report):
+    found = {}
+    try:
+        existing, new_schools, need_rows = _insert_school_chunk(chunk, school_ids, found)
+        if report.dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        error = getattr(e, 'orig', None) or e
+        for line_number, _ in chunk:
+            report.error(line_number, f'not imported, the database rejected its chunk: {error}')
+        return
+    # A failed chunk's ids point at rows that were rolled back
+    school_ids.update(found)
+    counts = report.counts
+    counts['schools_existing'] += existing
+    counts['schools_inserted'] += new_schools
+    counts['needs_inserted'] += need_rows
+    report.inserted += new_schools + need_rows
+    report.chunks += 1
+
+
+def _insert_school_chunk(chunk, school_ids, found):
+    """Write a chunk's new schools, their needs and the stats; the caller commits.
+
+    Ids of the schools looked up or inserted are added to ``found``. Returns
+    the number of existing schools, new schools and new needs.
+    """
+    table = School.__table__
+    unseen = {_school_key(school) for _, (school, _) in chunk} - school_ids.keys()
+    if unseen:
+        existing = db.session.query(School.id, School.name, School.city, School.state).filter(
+            tuple_(School.name, School.city, School.state).in_(list(unseen)))
+        for row in existing:
+            found[(row.name, row.city, row.state)] = row.id
+    existing_count = len(found)
+
+    # Repeated rows for the same school only add needs to it
+    new_schools = {}
+    for _, (school, _) in chunk:
+        key = _school_key(school)
+        if key not in school_ids and key not in found:
+            new_schools.setdefault(key, school)
+    if new_schools:
+        # RETURNING hands back the new ids, so needs need no follow-up lookup. Rows are
+        # matched by key, so the ids may come back in any order and the insert stays batched.
+        inserted = db.session.execute(insert(table).returning(table.c.id, table.c.name, table.c.city, table.c.state),
+                                      list(new_schools.values()))
+        for row in inserted:
+            found[(row.name, row.city, row.state)] = row.id
+
+    need_rows = [dict(need, school_id=found.get(_school_key(school)) or school_ids[_school_key(school)])
+                 for _, (school, needs) in chunk for need in needs]
+    if need_rows:
+        db.session.execute(insert(Need.__table__), need_rows)
+
+    verified = sum(1 for school in new_schools.values() if school['verified'])
+    approved = sum(1 for need in need_rows if need['status'] == 'approved')
+    if verified or approved:
+        bump_impact_stats(schools_helped=verified, needs_funded=approved)
+    return existing_count, len(new_schools), len(need_rows)
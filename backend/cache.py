@@ -0,0 +1,381 @@
+"""
+cache.py - In-process caches for EquiLearn
+ResponseCache stores the rendered JSON bodies of public read routes in a size-bounded LRU with per-entry TTLs, answers
+conditional GETs with 304, and is invalidated by tag from the write handlers.
+
+TTLCache is a plain LRU with expiry, used for Flask-Login user records and
+featured schools. SingleFlight collapses concurrent cache misses for one key.
+
+Both caches live in each worker process. SharedInvalidation carries each
+invalidation to the other workers through a row per tag in the database: the
+writer stamps the tag with a new generation, and every worker reads the tags
+stamped since it last looked, at most once per CACHE_SYNC_MS. A write is therefore seen
+by every worker within about CACHE_SYNC_MS, and the TTLs only matter for
+writes made outside the app.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import upsert_insert
+
+log = logging.getLogger('equilearn.cache')
+
+# SharedInvalidation's clock: the row every publish bumps
+CLOCK_TAG = '*'
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU mapping whose entries expire after a TTL.
+
+    Limits come from ``<prefix>_MAX_ENTRIES`` and ``<prefix>_TTL`` in the app config.
+    """
+
+    def __init__(self, config_prefix, max_entries=1024, ttl=300):
+        self.config_prefix = config_prefix
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def init_app(self, app):
+        self.max_entries = app.config.setdefault(self.config_prefix + '_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.setdefault(self.config_prefix + '_TTL', self.ttl)
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return item[0]
+            if item is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key satisfies ``predicate``."""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['calls'] += 1
+            else:
+                self._stats['shared'] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+class SharedInvalidation:
+    """Invalidations shared between worker processes through the database.
+
+    ``publish`` bumps a clock row and stamps each tag with the new clock
+    value. ``poll`` (run before each request, at most once per
+    ``CACHE_SYNC_MS``) reads the clock by primary key, and when it moved,
+    hands the tags stamped since to every ``subscribe``d callback.
+    ``CACHE_SYNC_MS=0`` keeps invalidation inside the process, for a single worker.
+
+    The write a publish follows has already committed, so a publish that
+    fails (e.g. on a lock timeout) must not fail the request. Its tags are
+    kept and sent with the next publish or poll instead.
+    """
+
+    def __init__(self):
+        self.interval = 1.0
+        self._db = None
+        self._table = None
+        self._seen = None  # Clock value this worker has caught up to; None until the first poll
+        self._next_poll = 0.0
+        self._callbacks = []
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, model):
+        self.interval = app.config.setdefault('CACHE_SYNC_MS', int(os.getenv('CACHE_SYNC_MS', 1000))) / 1000
+        self._db = db
+        self._table = model.__table__
+        if self.interval > 0:
+            app.before_request(self.poll)
+
+    def subscribe(self, callback):
+        """Call ``callback(tags)`` with the set of tags other workers invalidated."""
+        self._callbacks.append(callback)
+
+    def publish(self, *tags):
+        """Stamp ``tags`` with a new clock value so the other workers drop them. Call after the write commits."""
+        if self.interval <= 0 or self._table is None:
+            return
+        with self._lock:
+            tags = self._pending.union(tags)
+            self._pending.clear()
+        if not tags:
+            return
+        try:
+            self._stamp(tags)
+        except SQLAlchemyError:
+            log.warning('could not publish cache invalidation of %s; will retry', ', '.join(sorted(tags)),
+                        exc_info=True)
+            with self._lock:
+                self._pending.update(tags)
+
+    def _stamp(self, tags):
+        table = self._table
+        bump = {'generation': table.c.generation + 1}
+        clock = upsert_insert(table)
+        stamp = upsert_insert(table)
+        with self._db.engine.begin() as conn:
+            # The clock row is locked until commit, so publishers commit their stamps in clock order
+            if clock is not None:
+                generation = conn.execute(
+                    clock.values(tag=CLOCK_TAG, generation=1)
+                    .on_conflict_do_update(index_elements=[table.c.tag], set_=bump)
+                    .returning(table.c.generation)).scalar()
+                conn.execute(stamp.on_conflict_do_update(index_elements=[table.c.tag],
+                                                         set_={'generation': stamp.excluded.generation}),
+                             [{'tag': tag, 'generation': generation} for tag in tags])
+                return
+            # No ON CONFLICT support: update, then insert the rows that did not exist yet
+            if not conn.execute(update(table).where(table.c.tag == CLOCK_TAG).values(bump)).rowcount:
+                conn.execute(table.insert(), {'tag': CLOCK_TAG, 'generation': 1})
+            generation = conn.execute(select(table.c.generation).where(table.c.tag == CLOCK_TAG)).scalar()
+            for tag in tags:
+                if not conn.execute(update(table).where(table.c.tag == tag).values(generation=generation)).rowcount:
+                    conn.execute(table.insert(), {'tag': tag, 'generation': generation})
+
+    def poll(self):
+        """Hand the tags other workers stamped since the last poll to the subscribers."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        if self._pending:
+            self.publish()
+        table = self._table
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.interval
+            changed = set()
+            with self._db.engine.connect() as conn:
+                clock = conn.execute(select(table.c.generation).where(table.c.tag == CLOCK_TAG)).scalar() or 0
+                if self._seen is not None and clock != self._seen:
+                    changed.update(conn.execute(select(table.c.tag).where(
+                        table.c.generation > self._seen, table.c.tag != CLOCK_TAG)).scalars())
+            self._seen = clock
+        if changed:
+            for callback in self._callbacks:
+                callback(changed)
+
+
+class _Entry:
+    __slots__ = ('body', 'mimetype', 'headers', 'etag', 'expires_at', 'tags')
+
+    def __init__(self, body, mimetype, headers, etag, expires_at, tags):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        self.etag = etag
+        self.expires_at = expires_at
+        self.tags = tags
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of GET responses, keyed by path and query string.
+
+    With a ``shared`` SharedInvalidation, invalidations also reach the other workers.
+    """
+
+    def __init__(self, app=None, shared=None):
+        self.shared = shared
+        if shared is not None:
+            shared.subscribe(self._drop)
+        self.max_entries = 512
+        self.default_ttl = 60
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0, 'invalidations': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 512)
+        self.default_ttl = app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        self.enabled = app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.extensions['response_cache'] = self
+
+    def cached(self, tag, ttl=None, tags=None):
+        """Cache a GET view under ``tag``.
+
+        ``tags`` may be a callable returning extra tags for the current
+        request, so writes can invalidate a narrower slice (e.g. one city).
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                key = request.full_path
+                entry = self._get(key)
+                if entry is None:
+                    entry_tags = (tag,) + tuple(tags() if tags else ())
+                    generations = self._snapshot(entry_tags)
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    headers = [(name, value) for name, value in response.headers
+                               if name not in ('Content-Type', 'Content-Length')]
+                    entry = _Entry(body, response.mimetype, headers, hashlib.sha1(body).hexdigest(),
+                                   time.monotonic() + (ttl or self.default_ttl), entry_tags)
+                    self._put(key, entry, generations)
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of ``tags``, in every worker. Call after the write commits."""
+        if self.shared is not None:
+            self.shared.publish(*tags)
+        self._drop(tags)
+
+    def _drop(self, tags):
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, entry in self._entries.items() if tags.intersection(entry.tags)]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return None
+
+    def _snapshot(self, tags):
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def _put(self, key, entry, generations):
+        with self._lock:
+            # A write invalidated one of our tags while the view ran: the body may be stale
+            if generations != [self._generations.get(tag, 0) for tag in entry.tags]:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _respond(self, entry):
+        response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+        response.headers.extend(entry.headers)
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self._stats['not_modified'] += 1
+        return response
@@ -0,0 +1,38 @@
+"""
+conftest.py - Shared pytest fixtures for the EquiLearn backend
+Builds one app against a throwaway SQLite database and gives each test empty tables.
+"""
+import os
+import tempfile
+
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix='equilearn-test-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_db_dir, 'test.db'))
+
+
+@pytest.fixture(scope='session')
+def flask_app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def app(flask_app):
+    from extensions import db, response_cache, user_cache, featured_cache
+    with flask_app.app_context():
+        db.create_all()
+    response_cache.clear()
+    user_cache.clear()
+    featured_cache.clear()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def login_as(client, user_id):
+    """Mark a test client's session as logged in without a password check."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
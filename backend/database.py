@@ -0,0 +1,158 @@
+"""
+database.py - Database engine setup and dialect-aware SQL helpers for EquiLearn
+Builds the SQLAlchemy engine configuration from the environment, applies
+SQLite pragmas on every new connection, and routes the reads of opted-in GET
+routes to a separate read-only connection pool.
+
+Environment variables (all optional):
+
+    DATABASE_URL          Primary database (default sqlite:///equilearn.db in the instance folder)
+    DATABASE_READ_URL     Read pool target; defaults to DATABASE_URL for SQLite files
+    DB_POOL_SIZE          Connections kept per pool (default 10)
+    DB_MAX_OVERFLOW       Extra connections allowed under load (default 20)
+    DB_POOL_RECYCLE       Seconds before a pooled connection is replaced (default 1800)
+    DB_POOL_TIMEOUT       Seconds to wait for a free connection (default 30)
+    SQLITE_JOURNAL_MODE   default WAL
+    SQLITE_SYNCHRONOUS    default NORMAL
+    SQLITE_CACHE_SIZE     default -64000 (64 MB)
+    SQLITE_MMAP_SIZE      default 268435456 (256 MB)
+    SQLITE_BUSY_TIMEOUT   milliseconds, default 5000
+    DB_RETRY_AFTER        seconds a client is told to wait after a lock timeout (default 1)
+"""
+import os
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+READ_BIND = 'read'
+
+
+def _sqlite_file(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def configure_database(app):
+    """Fill in the database config from the environment. Call before ``db.init_app``.
+
+    Values already in ``app.config`` (e.g. passed to ``create_app``) win.
+    """
+    url = app.config.setdefault('SQLALCHEMY_DATABASE_URI', os.getenv('DATABASE_URL', 'sqlite:///equilearn.db'))
+
+    options = {'pool_pre_ping': True}
+    backend = make_url(url).get_backend_name()
+    # In-memory SQLite gets a StaticPool, which takes no sizing options
+    if backend != 'sqlite' or _sqlite_file(url):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        )
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', options)
+    app.config.setdefault('DB_RETRY_AFTER', int(os.getenv('DB_RETRY_AFTER', 1)))
+
+    read_url = os.getenv('DATABASE_READ_URL') or (url if _sqlite_file(url) else None)
+    if read_url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {READ_BIND: dict(options, url=read_url)})
+
+    app.config.setdefault('SQLITE_PRAGMAS', {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    })
+
+
+def init_engines(app, db):
+    """Install connection hooks on the engines ``db.init_app`` created."""
+    pragmas = app.config.get('SQLITE_PRAGMAS', {})
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _pragma_hook(pragmas, read_only=key == READ_BIND))
+
+
+def _pragma_hook(pragmas, read_only):
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            # The journal mode is a property of the database file; only writers set it
+            if name == 'journal_mode' and read_only:
+                continue
+            cursor.execute(f'PRAGMA {name}={value}')
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+    return apply_pragmas
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the read pool inside ``use_read_pool`` views.
+
+    Flushes and INSERT/UPDATE/DELETE statements always use the primary engine,
+    so a read-mostly route that occasionally writes still works.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_app_context() and g.get('use_read_pool')):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_read_pool(view):
+    """Let a view's queries run on the read-only connection pool."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_read_pool = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def upsert_insert(table):
+    """Return an INSERT for ``table`` supporting ON CONFLICT, or None.
+
+    SQLite and PostgreSQL both accept ``on_conflict_do_nothing`` and
+    ``on_conflict_do_update`` on the returned statement.
+    """
+    dialect = current_app.extensions['sqlalchemy'].session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(table)
+
+
+def insert_ignore(table):
+    """INSERT that skips rows violating a unique constraint where the database supports it."""
+    stmt = upsert_insert(table)
+    return stmt.on_conflict_do_nothing() if stmt is not None else insert(table)
+
+
+# Lock timeouts by dialect: PostgreSQL lock_not_available, MySQL ER_LOCK_WAIT_TIMEOUT
+_LOCK_TIMEOUT_CODES = {'55P03', 1205}
+
+
+def is_lock_timeout(error):
+    """True when ``error`` (a DBAPI error wrapped by SQLAlchemy) is a lock wait that timed out.
+
+    The write was rolled back whole, so the request can simply be sent again.
+    """
+    orig = getattr(error, 'orig', error)
+    if getattr(orig, 'pgcode', None) in _LOCK_TIMEOUT_CODES:
+        return True
+    args = getattr(orig, 'args', ())
+    if args and args[0] in _LOCK_TIMEOUT_CODES:
+        return True
+    # sqlite3 only reports SQLITE_BUSY / SQLITE_LOCKED through the message
+    return 'database is locked' in str(orig) or 'database table is locked' in str(orig)
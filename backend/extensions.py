@@ -1,7 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_cors import CORS
+from cache import ResponseCache, SharedInvalidation, SingleFlight, TTLCache
+from database import RoutingSession
+from metrics import Metrics
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-cors = CORS() 
\ No newline at end of file
+cors = CORS()
+cache_sync = SharedInvalidation()
+response_cache = ResponseCache(shared=cache_sync)
+user_cache = TTLCache('USER_CACHE', max_entries=4096, ttl=60)
+featured_cache = TTLCache('FEATURED_CACHE', max_entries=1024, ttl=300)
+featured_flight = SingleFlight()
+metrics = Metrics()
@@ -0,0 +1,230 @@
+"""
+featured.py - Featured schools for EquiLearn
+Generates the mock featured schools for a city once, even under concurrent
+first requests, and keeps a bounded per-city cache of pre-serialized JSON
+payloads in front of the database. A city's cached payloads are dropped in
+every worker along with its ``featured_schools:<city>`` response cache tag.
+"""
+import re
+
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import insert_ignore
+from extensions import db, cache_sync, featured_cache, featured_flight
+from models import FeaturedSchool, FeaturedSchoolKeyword, FeaturedSchoolNeed
+
+_WORD = re.compile(r'\w+')
+
+# Mississauga has hand-written schools that are shown but never stored
+MISSISSAUGA_SCHOOLS = [
+    {
+        'name': 'John Fraser Secondary School',
+        'location': '2665 Erin Centre Blvd, Mississauga, ON L5M 5H6',
+        'description': 'John Fraser Secondary School is a public high school in Mississauga with a focus on academic excellence and extracurricular activities.',
+        'needs': ['new textbooks', 'upgraded technology', 'sports equipment'],
+        'fundingGoal': 10000,
+        'currentFunding': 300
+    },
+    {
+        'name': 'St. Marcellinus Secondary School',
+        'location': '730 Courtneypark Dr W, Mississauga, ON L5W 1L9',
+        'description': 'St. Marcellinus Secondary School is a Catholic high school known for its strong arts and sports programs.',
+        'needs': ['musical instruments', 'art supplies', 'sports uniforms'],
+        'fundingGoal': 8000,
+        'currentFunding': 210
+    },
+    {
+        'name': 'Barondale Public School',
+        'location': '200 Barondale Dr, Mississauga, ON L4Z 3N7',
+        'description': 'Barondale Public School is an elementary school in Mississauga that prides itself on fostering a supportive and inclusive learning environment.',
+        'needs': ['educational games', 'classroom supplies', 'updated library books'],
+        'fundingGoal': 5000,
+        'currentFunding': 0
+    },
+]
+
+
+def generated_schools(city):
+    """Mock featured schools for a city without hand-written ones."""
+    return [
+        {
+            'name': f'{city} Central School',
+            'location': f'{city}, Main St',
+            'description': f'A leading K-12 school in {city}.',
+            'needs': ['new computers', 'library books', 'sports equipment'],
+            'fundingGoal': 10000,
+            'currentFunding': 3000
+        },
+        {
+            'name': f'{city} North Academy',
+            'location': f'{city}, North Ave',
+            'description': f'An innovative school in the north of {city}.',
+            'needs': ['science lab', 'musical instruments', 'art supplies'],
+            'fundingGoal': 5000,
+            'currentFunding': 2100
+        },
+        {
+            'name': f'{city} South Elementary',
+            'location': f'{city}, South Rd',
+            'description': f'A vibrant elementary school in {city}.',
+            'needs': ['playground upgrade', 'STEM kits', 'tablets'],
+            'fundingGoal': 6400,
+            'currentFunding': 1200
+        },
+        {
+            'name': f'{city} West High',
+            'location': f'{city}, West Blvd',
+            'description': f'A high school with a focus on sports and arts.',
+            'needs': ['gym renovation', 'band uniforms', 'projectors'],
+            'fundingGoal': 15000,
+            'currentFunding': 8000
+        },
+        {
+            'name': f'{city} East Prep',
+            'location': f'{city}, East Pkwy',
+            'description': f'A preparatory school in the east of {city}.',
+            'needs': ['robotics club', 'language lab', 'smart boards'],
+            'fundingGoal': 12000,
+            'currentFunding': 4000
+        },
+        {
+            'name': f'{city} Lakeside School',
+            'location': f'{city}, Lakeside Dr',
+            'description': f'A school near the lake in {city}.',
+            'needs': ['canoes', 'environmental science kits', 'garden tools'],
+            'fundingGoal': 9000,
+            'currentFunding': 6000
+        },
+    ]
+
+
+def serialize_featured_school(school):
+    return {
+        'id': school.id,
+        'name': school.name,
+        'location': school.location,
+        'description': school.description,
+        'needs': [need.name for need in school.needs],
+        'fundingGoal': school.funding_goal,
+        'currentFunding': school.current_funding
+    }
+
+
+def featured_payload(city, user_id=None):
+    """Return the featured schools for a city as ready-to-send JSON bytes.
+
+    Schools are generated on first use. Concurrent misses for the same
+    (city, user_id) share one database read and at most one generation.
+    """
+    key = (city, user_id)
+    payload = featured_cache.get(key)
+    if payload is None:
+        payload = featured_flight.do(key, lambda: _load_or_generate(city, user_id))
+    return payload
+
+
+def need_keywords(name):
+    """The lowercased ``name`` from the start of each of its words: 'STEM kits' -> ['stem kits', 'kits']."""
+    lowered = name.lower()
+    return [lowered[word.start():] for word in _WORD.finditer(lowered)]
+
+
+def search_featured_schools(keyword, city=None, limit=50):
+    """Featured schools with a need containing a word, or run of words, starting with ``keyword``.
+
+    Case-insensitive: 'kits', 'stem k' and 'books' find 'STEM kits' and
+    'Library books', but 'oks' finds nothing. Each need name is stored once
+    per word start, so the match is a range on the indexed ``keyword`` column.
+    """
+    prefix = keyword.strip().lower()
+    matching = select(FeaturedSchoolKeyword.school_id).where(
+        FeaturedSchoolKeyword.keyword >= prefix, FeaturedSchoolKeyword.keyword < prefix + '\U0010ffff')
+    query = FeaturedSchool.query.filter(FeaturedSchool.id.in_(matching))
+    if city:
+        query = query.filter_by(city=city)
+    return [serialize_featured_school(s) for s in query.order_by(FeaturedSchool.id).limit(limit)]
+
+
+def invalidate_featured_city(city):
+    """Drop the cached featured schools of one city (every user_id)."""
+    featured_cache.invalidate_where(lambda key: key[0] == city)
+
+
+def _drop_invalidated_cities(tags):
+    cities = {tag.split(':', 1)[1] for tag in tags if tag.startswith('featured_schools:')}
+    if cities:
+        featured_cache.invalidate_where(lambda key: key[0] in cities)
+
+
+cache_sync.subscribe(_drop_invalidated_cities)
+
+
+def clear_featured_city(city):
+    """Delete a city's stored featured schools so they are generated afresh. The caller commits."""
+    school_ids = select(FeaturedSchool.id).where(FeaturedSchool.city == city)
+    for model in (FeaturedSchoolNeed, FeaturedSchoolKeyword):
+        model.query.filter(model.school_id.in_(school_ids)).delete(synchronize_session=False)
+    deleted = FeaturedSchool.query.filter_by(city=city).delete(synchronize_session=False)
+    invalidate_featured_city(city)
+    return deleted
+
+
+def _query(city, user_id):
+    query = FeaturedSchool.query.filter_by(city=city)
+    if user_id:
+        query = query.filter_by(user_id=user_id)
+    return query.order_by(FeaturedSchool.id)
+
+
+def _load_or_generate(city, user_id):
+    schools = [serialize_featured_school(s) for s in _query(city, user_id)]
+    if not schools and city.lower() == 'mississauga':
+        schools = MISSISSAUGA_SCHOOLS
+    elif not schools:
+        _insert_generated(city, user_id)
+        schools = [serialize_featured_school(s) for s in _query(city, user_id)]
+    payload = current_app.json.dumps(schools).encode('utf-8')
+    featured_cache.set((city, user_id), payload)
+    return payload
+
+
+def _need_rows(school_id, needs):
+    return [{'school_id': school_id, 'position': position, 'name': name} for position, name in enumerate(needs)]
+
+
+def _keyword_rows(school_id, needs):
+    keywords = {keyword for name in needs for keyword in need_keywords(name)}
+    return [{'school_id': school_id, 'keyword': keyword} for keyword in sorted(keywords)]
+
+
+def _insert_generated(city, user_id):
+    generated = {s['name']: s for s in generated_schools(city)}
+    rows = [
+        {
+            'user_id': user_id,
+            'city': city,
+            'name': s['name'],
+            'location': s['location'],
+            'description': s['description'],
+            'funding_goal': s['fundingGoal'],
+            'current_funding': s['currentFunding']
+        } for s in generated.values()
+    ]
+    # Another worker may be generating the same city: the unique index on
+    # (city, user_id, name) turns its copy into a no-op instead of a duplicate,
+    # and only the rows RETURNING reports as ours get needs attached
+    table = FeaturedSchool.__table__
+    stmt = insert_ignore(table)
+    try:
+        inserted = db.session.execute(stmt.returning(table.c.id, table.c.name), rows).all()
+        need_rows = [row for school in inserted for row in _need_rows(school.id, generated[school.name]['needs'])]
+        if need_rows:
+            db.session.execute(insert(FeaturedSchoolNeed.__table__), need_rows)
+            db.session.execute(insert(FeaturedSchoolKeyword.__table__),
+                               [row for school in inserted
+                                for row in _keyword_rows(school.id, generated[school.name]['needs'])])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
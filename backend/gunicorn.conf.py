@@ -0,0 +1,60 @@
+"""
+gunicorn.conf.py - Production server settings for EquiLearn
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is built once in the master and forked into the workers, so startup
+cost is paid once and the workers share its memory pages. Every worker
+starts with an empty connection pool (see ``post_fork``).
+
+Environment variables (all optional):
+
+    BIND                      default 0.0.0.0:8000
+    GUNICORN_WORKER_CLASS     default gthread; gevent (installed separately) suits many /api/live streams
+    WEB_CONCURRENCY           worker processes, default 2 x CPUs + 1
+    GUNICORN_THREADS          threads per worker, default 4
+    GUNICORN_MAX_REQUESTS     recycle a worker after this many requests, default 1000 (0 disables)
+    GUNICORN_TIMEOUT          seconds before a silent worker is killed, default 30
+    GUNICORN_GRACEFUL_TIMEOUT seconds a worker gets to finish its requests on restart, default 30
+    GUNICORN_ACCESS_LOG       access log path, default - (stdout); empty disables it
+    CACHE_SYNC_MS             how often each worker picks up cache invalidations made by the others, default 1000
+
+Each worker keeps its own response, user and featured school caches. A write
+invalidates them in its own worker at once and in the others within CACHE_SYNC_MS.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+preload_app = True
+
+# Requests mostly wait on SQLite and network I/O, so each worker also runs threads.
+# Every open /api/live stream holds a thread; for many dashboards use gevent.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Recycle workers to bound slow leaks; the jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max(max_requests // 10, 0)
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Give the worker its own connection pools.
+
+    SQLite connections must not cross a fork, so the pools inherited from the
+    master are dropped without closing the master's connections.
+    """
+    from extensions import db
+
+    # With preload_app the master already built the Flask app; this returns it
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
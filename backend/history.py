@@ -0,0 +1,109 @@
+"""
+history.py - Donor donation history for EquiLearn
+Merges a user's need donations, featured-school donations and pool joins into
+one timeline, paginated by keyset on (created_at, type, id) so every page is a
+bounded index range scan per source, however long the history is.
+"""
+import heapq
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from extensions import db
+from models import Donation, Need, FeaturedSchool, FeaturedSchoolDonation, MicroDonationPool, MicroDonationPoolJoin
+
+# Timeline order is (created_at, rank, id) descending; rank breaks timestamp ties between sources
+SOURCE_RANKS = {'need': 2, 'featured': 1, 'pool': 0}
+
+
+class CursorError(ValueError):
+    """The pagination cursor could not be parsed."""
+
+
+def encode_cursor(item):
+    return f"{item['created_at']}~{item['type']}~{item['source_id']}"
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, kind, source_id = cursor.split('~')
+        if kind not in SOURCE_RANKS:
+            raise ValueError
+        return datetime.fromisoformat(created_at), kind, int(source_id)
+    except ValueError:
+        raise CursorError('Invalid cursor')
+
+
+def _sources(user_id):
+    """Per source: (type, created_at column, id column, select of timeline columns)."""
+    return [
+        ('need', Donation.created_at, Donation.id,
+         select(Donation.id, Donation.amount, Donation.created_at, Donation.need_id.label('target_id'),
+                Need.title.label('target_name'), Donation.donation_type, Donation.message)
+         .outerjoin(Need, Need.id == Donation.need_id)
+         .where(Donation.donor_id == user_id)),
+        ('featured', FeaturedSchoolDonation.created_at, FeaturedSchoolDonation.id,
+         select(FeaturedSchoolDonation.id, FeaturedSchoolDonation.amount, FeaturedSchoolDonation.created_at,
+                FeaturedSchoolDonation.school_id.label('target_id'), FeaturedSchool.name.label('target_name'))
+         .outerjoin(FeaturedSchool, FeaturedSchool.id == FeaturedSchoolDonation.school_id)
+         .where(FeaturedSchoolDonation.user_id == user_id)),
+        ('pool', MicroDonationPoolJoin.joined_at, MicroDonationPoolJoin.id,
+         select(MicroDonationPoolJoin.id, MicroDonationPoolJoin.amount, MicroDonationPoolJoin.joined_at.label('created_at'),
+                MicroDonationPoolJoin.pool_id.label('target_id'), MicroDonationPool.name.label('target_name'))
+         .outerjoin(MicroDonationPool, MicroDonationPool.id == MicroDonationPoolJoin.pool_id)
+         .where(MicroDonationPoolJoin.user_id == user_id)),
+    ]
+
+
+def donation_history(user_id, limit, cursor=None, types=None, start=None, end=None):
+    """Return ``(items, next_cursor)`` for one page of a user's donation timeline."""
+    after = decode_cursor(cursor) if cursor else None
+    pages = []
+    for kind, created_at, row_id, query in _sources(user_id):
+        if types and kind not in types:
+            continue
+        if start is not None:
+            query = query.where(created_at >= start)
+        if end is not None:
+            query = query.where(created_at < end)
+        if after is not None:
+            after_ts, after_kind, after_id = after
+            rank, after_rank = SOURCE_RANKS[kind], SOURCE_RANKS[after_kind]
+            if rank < after_rank:
+                query = query.where(created_at <= after_ts)
+            elif rank == after_rank:
+                query = query.where(or_(created_at < after_ts, and_(created_at == after_ts, row_id < after_id)))
+            else:
+                query = query.where(created_at < after_ts)
+        rows = db.session.execute(query.order_by(created_at.desc(), row_id.desc()).limit(limit + 1))
+        pages.append([_item(kind, row) for row in rows])
+
+    merged = heapq.merge(*pages, key=lambda item: (item['_ts'], SOURCE_RANKS[item['type']], item['source_id']),
+                         reverse=True)
+    items = []
+    next_cursor = None
+    for item in merged:
+        if len(items) == limit:
+            next_cursor = encode_cursor(items[-1])
+            break
+        items.append(item)
+    for item in items:
+        del item['_ts']
+    return items, next_cursor
+
+
+def _item(kind, row):
+    item = {
+        'id': f'{kind}-{row.id}',
+        'source_id': row.id,
+        'type': kind,
+        'amount': row.amount or 0,
+        'created_at': row.created_at.isoformat(),
+        'target_id': row.target_id,
+        'name': row.target_name,
+        '_ts': row.created_at,
+    }
+    if kind == 'need':
+        item['donation_type'] = row.donation_type
+        item['message'] = row.message
+    return item
@@ -0,0 +1,58 @@
+"""
+integrations.py - Lazily loaded third-party SDKs for EquiLearn
+The OpenAI and Stripe packages are slow to import and most requests never use
+them, so each is imported and configured the first time it is asked for.
+"""
+import os
+import threading
+
+from flask import current_app
+
+_lock = threading.Lock()
+
+
+def init_integrations(app):
+    """Record the API keys; nothing is imported until first use."""
+    app.config.setdefault('OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
+    app.config.setdefault('STRIPE_SECRET_KEY', os.getenv('STRIPE_SECRET_KEY'))
+
+
+class OpenAIKeyLoader:
+    @staticmethod
+    def ensure_key(openai):
+        if not openai.api_key or openai.api_key == '':
+            openai.api_key = "sk-...yourkey..."  # <-- REPLACE with your real key
+
+
+def _load(name, configure):
+    client = current_app.extensions.get(name)
+    if client is None:
+        with _lock:
+            client = current_app.extensions.get(name)
+            if client is None:
+                client = configure(current_app.config)
+                current_app.extensions[name] = client
+    return client
+
+
+def _configure_openai(config):
+    import openai
+    openai.api_key = config.get('OPENAI_API_KEY')
+    OpenAIKeyLoader.ensure_key(openai)
+    return openai
+
+
+def _configure_stripe(config):
+    import stripe
+    stripe.api_key = config.get('STRIPE_SECRET_KEY')
+    return stripe
+
+
+def get_openai():
+    """The ``openai`` module, imported and given its API key on first call."""
+    return _load('openai', _configure_openai)
+
+
+def get_stripe():
+    """The ``stripe`` module, imported and given its secret key on first call."""
+    return _load('stripe', _configure_stripe)
@@ -0,0 +1,301 @@
+"""
+live.py - Live funding progress over Server-Sent Events for EquiLearn
+Write handlers append the new totals to the live_update change log in the
+same transaction as the write. Each worker runs one poller thread that reads
+the new log rows once per tick, keeps only the latest values per item, and
+hands every stream subscribed to a topic the same pre-encoded batch. A worker
+runs one query per tick however many dashboards it serves, and every worker
+sees every other worker's writes through the log.
+
+Topics are ``city:<name>`` (featured schools), ``pool:<id>`` (a micro-pool)
+and ``school:<id>`` (that school's approved needs).
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, or_, select
+
+from extensions import db
+from database import READ_BIND
+from models import FeaturedSchool, LiveUpdate, MicroDonationPool, Need
+
+log = logging.getLogger('equilearn.live')
+
+TOPIC_KINDS = ('city', 'pool', 'school')
+
+
+def featured_school_update(row):
+    """(topic, payload) for a featured school's funding, from any row with its columns."""
+    return 'city:%s' % row.city, {'kind': 'featured_school', 'id': row.id,
+                                  'currentFunding': row.current_funding, 'fundingGoal': row.funding_goal}
+
+
+def pool_update(row):
+    return 'pool:%d' % row.id, {'kind': 'pool', 'id': row.id, 'currentAmount': row.current_amount,
+                                'participants': row.participants}
+
+
+def need_update(row):
+    return 'school:%d' % row.school_id, {'kind': 'need', 'id': row.id, 'currentDonations': row.current_donations,
+                                         'totalNeeded': row.total_needed}
+
+
+def need_updates(*criteria):
+    """Updates for every need matching ``criteria``, read back after a write."""
+    rows = db.session.execute(
+        select(Need.id, Need.school_id, Need.current_donations, Need.total_needed).where(*criteria))
+    return [need_update(row) for row in rows]
+
+
+def snapshot(topic):
+    """Current values for every item under ``topic``, shaped like the progress events."""
+    kind, _, key = topic.partition(':')
+    if kind == 'city':
+        rows = db.session.execute(
+            select(FeaturedSchool.id, FeaturedSchool.city, FeaturedSchool.current_funding,
+                   FeaturedSchool.funding_goal).where(FeaturedSchool.city == key).order_by(FeaturedSchool.id))
+        return [featured_school_update(row)[1] for row in rows]
+    if kind == 'pool':
+        rows = db.session.execute(
+            select(MicroDonationPool.id, MicroDonationPool.current_amount, MicroDonationPool.participants)
+            .where(MicroDonationPool.id == int(key)))
+        return [pool_update(row)[1] for row in rows]
+    return [payload for _, payload in need_updates(Need.school_id == int(key), Need.status == 'approved')]
+
+
+def _event(name, data):
+    return 'event: %s\ndata: %s\n\n' % (name, json.dumps(data, separators=(',', ':')))
+
+
+class Subscription:
+    """One open stream: a bounded queue of encoded batches."""
+
+    __slots__ = ('topic', 'queue', 'closed')
+
+    def __init__(self, topic, max_pending):
+        self.topic = topic
+        self.queue = queue.Queue(max_pending)
+        self.closed = False
+
+
+class LogPosition:
+    """How far one reader has read the live_update log, and the ids it skipped.
+
+    Log ids are handed out when a row is inserted but become visible when its
+    transaction commits, so on Postgres or MySQL a reader can see id 7 before
+    id 6 commits. The ids skipped over are asked for again on later reads
+    until they show up or ``gap_seconds`` passes, which also covers ids that
+    were rolled back and will never appear.
+    """
+
+    max_gaps = 1000
+    start_window = 100
+
+    def __init__(self, gap_seconds):
+        self.gap_seconds = gap_seconds
+        self.last_id = 0
+        self.gaps = {}  # Skipped id -> monotonic time to stop looking for it
+
+    def start(self, execute):
+        """Begin at the end of the log; ids just below the newest may still be uncommitted."""
+        newest = execute(select(func.max(LiveUpdate.id))).scalar() or 0
+        self.last_id = max(newest - self.start_window, 0)
+        self.gaps.clear()
+        self.advance(execute(select(LiveUpdate.id).where(LiveUpdate.id > self.last_id)
+                             .order_by(LiveUpdate.id)).scalars(), newest)
+
+    def unread(self):
+        """Criteria for the log rows not read yet: new ones, and the skipped ones still looked for."""
+        now = time.monotonic()
+        self.gaps = {row_id: deadline for row_id, deadline in self.gaps.items() if deadline > now}
+        condition = LiveUpdate.id > self.last_id
+        if self.gaps:
+            condition = or_(condition, LiveUpdate.id.in_(list(self.gaps)))
+        return condition
+
+    def advance(self, ids, newest=None):
+        """Move past ``ids`` (ascending), remembering the ids skipped on the way."""
+        deadline = time.monotonic() + self.gap_seconds
+        for row_id in ids:
+            if row_id > self.last_id:
+                self.gaps.update(dict.fromkeys(range(self.last_id + 1, row_id), deadline))
+                self.last_id = row_id
+            else:
+                self.gaps.pop(row_id, None)
+        if newest is not None and newest > self.last_id:
+            self.gaps.update(dict.fromkeys(range(self.last_id + 1, newest + 1), deadline))
+            self.last_id = newest
+        if len(self.gaps) > self.max_gaps:
+            # A large rolled back write leaves a run of ids that never appear
+            for row_id in sorted(self.gaps)[:len(self.gaps) - self.max_gaps]:
+                del self.gaps[row_id]
+
+
+class LiveHub:
+    """In-process pub/sub for live progress, fed by polling the change log.
+
+    Config: ``LIVE_TICK_MS`` (poll interval, default 1000),
+    ``LIVE_HEARTBEAT_SECONDS`` (keep-alive comment on idle streams, default
+    15), ``LIVE_MAX_PENDING`` (batches buffered for a slow client before it
+    is disconnected, default 64), ``LIVE_RETENTION_SECONDS`` (age at which
+    log rows are pruned, default 600) and ``LIVE_GAP_SECONDS`` (how long a
+    skipped id is looked for again, default 30), each also read from the
+    environment. The poller tracks its place in the log with a LogPosition,
+    so rows that commit out of id order are still sent.
+    """
+
+    def __init__(self):
+        self.tick = 1.0
+        self.heartbeat = 15
+        self.max_pending = 64
+        self.retention = 600
+        self.prune_every = 1000
+        self.gap_seconds = 30
+        self._app = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._subscribers = {}
+        self._thread = None
+        self._position = LogPosition(self.gap_seconds)
+        self._records = itertools.count(1)
+        self._stats = {'ticks': 0, 'rows': 0, 'batches': 0, 'dropped': 0}
+
+    def init_app(self, app):
+        self.tick = app.config.setdefault('LIVE_TICK_MS', int(os.getenv('LIVE_TICK_MS', 1000))) / 1000
+        self.heartbeat = app.config.setdefault('LIVE_HEARTBEAT_SECONDS', int(os.getenv('LIVE_HEARTBEAT_SECONDS', 15)))
+        self.max_pending = app.config.setdefault('LIVE_MAX_PENDING', int(os.getenv('LIVE_MAX_PENDING', 64)))
+        self.retention = app.config.setdefault('LIVE_RETENTION_SECONDS', int(os.getenv('LIVE_RETENTION_SECONDS', 600)))
+        self.gap_seconds = app.config.setdefault('LIVE_GAP_SECONDS', int(os.getenv('LIVE_GAP_SECONDS', 30)))
+        self._position.gap_seconds = self.gap_seconds
+        self._app = app
+        app.extensions['live'] = self
+
+    def record(self, *updates):
+        """Append ``(topic, payload)`` updates to the log in the current transaction."""
+        if not updates:
+            return
+        now = datetime.utcnow()
+        db.session.execute(insert(LiveUpdate.__table__), [
+            {'topic': topic, 'kind': payload['kind'], 'item_id': payload['id'],
+             'payload': json.dumps(payload, separators=(',', ':')), 'created_at': now}
+            for topic, payload in updates])
+        # Rows are only needed until every poller has read them; trim now and then
+        if next(self._records) % self.prune_every == 0:
+            db.session.execute(delete(LiveUpdate).where(
+                LiveUpdate.created_at < now - timedelta(seconds=self.retention)))
+
+    def subscribe(self, topic):
+        """Register a stream for ``topic``, starting this worker's poller if needed.
+
+        Subscribe before reading the snapshot, so no update can fall between the two.
+        """
+        subscription = Subscription(topic, self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+            if self._thread is None:
+                # Only changes from here on matter to the new stream
+                with self._poll_lock:
+                    self._position.start(db.session.execute)
+                self._thread = threading.Thread(target=self._run, name='live-poller', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+    def stream(self, subscription, initial):
+        """Yield the SSE body: ``initial`` as a snapshot event, then progress batches."""
+        try:
+            yield 'retry: 3000\n' + _event('snapshot', initial)
+            while True:
+                try:
+                    chunk = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if chunk is None or subscription.closed:
+                    return
+                yield chunk
+        finally:
+            self.unsubscribe(subscription)
+
+    def poll(self):
+        """Read new log rows once and fan them out. Returns the number of rows read."""
+        with self._poll_lock:
+            engine = db.engines.get(READ_BIND) or db.engine
+            with engine.connect() as conn:
+                rows = conn.execute(select(LiveUpdate.id, LiveUpdate.topic, LiveUpdate.kind, LiveUpdate.item_id,
+                                           LiveUpdate.payload)
+                                    .where(self._position.unread()).order_by(LiveUpdate.id)).all()
+            # A late row never undoes a newer total: writes to one item hold its
+            # row lock until commit, so that item's log ids commit in order
+            self._position.advance([row.id for row in rows])
+        latest = {}
+        for row in rows:
+            # Payloads carry totals, not deltas, so only the newest per item matters
+            latest[(row.topic, row.kind, row.item_id)] = row.payload
+        batches = {}
+        for (topic, _, _), payload in latest.items():
+            batches.setdefault(topic, []).append(payload)
+        with self._lock:
+            targets = [(subscriber, 'event: progress\ndata: [%s]\n\n' % ','.join(payloads))
+                       for topic, payloads in batches.items()
+                       for subscriber in list(self._subscribers.get(topic, ()))]
+            self._stats['ticks'] += 1
+            self._stats['rows'] += len(rows)
+            self._stats['batches'] += len(targets)
+        for subscriber, chunk in targets:
+            try:
+                subscriber.queue.put_nowait(chunk)
+            except queue.Full:
+                self._drop(subscriber)
+        return len(rows)
+
+    def _drop(self, subscription):
+        # The client reconnects on its own and starts again from a fresh snapshot
+        self.unsubscribe(subscription)
+        with self._lock:
+            self._stats['dropped'] += 1
+        subscription.closed = True
+        while True:
+            try:
+                subscription.queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            subscription.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                time.sleep(self.tick)
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                try:
+                    self.poll()
+                except Exception:
+                    log.exception('live update poll failed')
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, topics=len(self._subscribers),
+                        subscribers=sum(len(subscribers) for subscribers in self._subscribers.values()),
+                        polling=self._thread is not None)
+
+
+live_hub = LiveHub()
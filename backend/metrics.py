@@ -0,0 +1,183 @@
+"""
+metrics.py - Per-request performance instrumentation for EquiLearn
+Times every request and the SQL it runs, counts statements per endpoint,
+logs slow queries with the route that issued them, and flags statements
+repeated within one request (the usual sign of an N+1 query). Everything is
+exported in Prometheus text format at /metrics.
+
+Counters live in each worker process; Prometheus sums them across workers.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+slow_query_log = logging.getLogger('equilearn.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram for one label set."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels.items())
+
+
+class Metrics:
+    """Request and SQL timing per endpoint, exported at ``/metrics``.
+
+    Config: ``SLOW_QUERY_MS`` (log statements slower than this, default 200),
+    ``N_PLUS_ONE_THRESHOLD`` (flag a statement run this many times in one
+    request, default 10) and ``METRICS_ENABLED``.
+    """
+
+    def __init__(self):
+        self.slow_query_ms = 200
+        self.repeat_threshold = 10
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._histograms = {}
+        self._totals = Counter()
+
+    def init_app(self, app, db):
+        self.slow_query_ms = app.config.setdefault('SLOW_QUERY_MS', float(os.getenv('SLOW_QUERY_MS', 200)))
+        self.repeat_threshold = app.config.setdefault('N_PLUS_ONE_THRESHOLD',
+                                                      int(os.getenv('N_PLUS_ONE_THRESHOLD', 10)))
+        if not app.config.setdefault('METRICS_ENABLED', True):
+            return
+        app.extensions['metrics'] = self
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._export)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_db_time = 0.0
+        g.metrics_statements = Counter()
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        endpoint = request.endpoint or 'unmatched'
+        if started is None or endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - started
+        statements = g.pop('metrics_statements')
+        count = sum(statements.values())
+        repeated = [(statement, times) for statement, times in statements.items() if times >= self.repeat_threshold]
+        for statement, times in repeated:
+            slow_query_log.warning('%s ran the same statement %d times in one request: %s',
+                                   endpoint, times, statement)
+        with self._lock:
+            self._requests[(endpoint, request.method, response.status_code)] += 1
+            self._observe('request_duration_seconds', endpoint, LATENCY_BUCKETS, elapsed)
+            self._observe('db_time_seconds', endpoint, LATENCY_BUCKETS, g.pop('metrics_db_time'))
+            self._observe('db_statements_per_request', endpoint, STATEMENT_BUCKETS, count)
+            self._totals[('db_statements_total', endpoint)] += count
+            if repeated:
+                self._totals[('repeated_statement_requests_total', endpoint)] += 1
+        return response
+
+    def _observe(self, name, endpoint, buckets, value):
+        histogram = self._histograms.get((name, endpoint))
+        if histogram is None:
+            histogram = self._histograms[(name, endpoint)] = Histogram(buckets)
+        histogram.observe(value)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's own context, so a statement that raises leaves nothing behind
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = '-'
+        if has_request_context():
+            endpoint = request.endpoint or 'unmatched'
+            if 'metrics_statements' in g:
+                g.metrics_db_time += elapsed
+                g.metrics_statements[statement] += 1
+        if elapsed * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self._totals[('slow_queries_total', endpoint)] += 1
+            # executemany batches can carry thousands of rows
+            shown = repr(parameters)
+            if len(shown) > 500:
+                shown = shown[:500] + '...'
+            slow_query_log.warning('slow query (%.1f ms) in %s: %s; parameters: %s',
+                                   elapsed * 1000, endpoint, statement, shown)
+
+    def render(self):
+        """The collected metrics in Prometheus text exposition format."""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count, h.buckets))
+                                for key, h in self._histograms.items())
+            totals = sorted(self._totals.items())
+
+        lines = ['# HELP equilearn_http_requests_total Requests handled, by endpoint, method and status.',
+                 '# TYPE equilearn_http_requests_total counter']
+        for (endpoint, method, status), value in requests:
+            lines.append('equilearn_http_requests_total{%s} %d'
+                         % (_labels(endpoint=endpoint, method=method, status=status), value))
+
+        helps = {
+            'request_duration_seconds': 'Wall time per request.',
+            'db_time_seconds': 'Time spent running SQL per request.',
+            'db_statements_per_request': 'SQL statements run per request.',
+        }
+        for name, help_text in helps.items():
+            lines += ['# HELP equilearn_%s %s' % (name, help_text), '# TYPE equilearn_%s histogram' % name]
+            for (metric, endpoint), (counts, total, count, buckets) in histograms:
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append('equilearn_%s_bucket{%s} %d' % (name, _labels(endpoint=endpoint, le=bound),
+                                                                 bucket_count))
+                lines.append('equilearn_%s_bucket{%s} %d' % (name, _labels(endpoint=endpoint, le='+Inf'), count))
+                lines.append('equilearn_%s_sum{%s} %r' % (name, _labels(endpoint=endpoint), total))
+                lines.append('equilearn_%s_count{%s} %d' % (name, _labels(endpoint=endpoint), count))
+
+        counters = {
+            'db_statements_total': 'SQL statements run by requests.',
+            'slow_queries_total': 'Statements slower than SLOW_QUERY_MS.',
+            'repeated_statement_requests_total': 'Requests that ran one statement N_PLUS_ONE_THRESHOLD times or more.',
+        }
+        for name, help_text in counters.items():
+            lines += ['# HELP equilearn_%s %s' % (name, help_text), '# TYPE equilearn_%s counter' % name]
+            for (metric, endpoint), value in totals:
+                if metric == name:
+                    lines.append('equilearn_%s{%s} %d' % (name, _labels(endpoint=endpoint), value))
+        return '\n'.join(lines) + '\n'
+
+    def _export(self):
+        return current_app.response_class(self.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,45 @@
+"""Add per-donor running totals table
+
+Revision ID: 0a6d8e2c4f71
+Revises: f4c72a9e3b18
+Create Date: 2026-10-18 12:48:02.317586
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d8e2c4f71'
+down_revision = 'f4c72a9e3b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('donor_totals',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('donations_total', sa.Float(), nullable=False),
+    sa.Column('donations_count', sa.Integer(), nullable=False),
+    sa.Column('featured_total', sa.Float(), nullable=False),
+    sa.Column('featured_count', sa.Integer(), nullable=False),
+    sa.Column('pools_total', sa.Float(), nullable=False),
+    sa.Column('pools_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Seed the totals from the existing donation history
+    op.execute(
+        "INSERT INTO donor_totals (user_id, donations_total, donations_count, featured_total, featured_count, "
+        "pools_total, pools_count, updated_at) "
+        "SELECT user_id, SUM(dt), SUM(dc), SUM(ft), SUM(fc), SUM(pt), SUM(pc), CURRENT_TIMESTAMP FROM ("
+        "SELECT donor_id AS user_id, amount AS dt, 1 AS dc, 0 AS ft, 0 AS fc, 0 AS pt, 0 AS pc "
+        "FROM donation WHERE donor_id IS NOT NULL "
+        "UNION ALL SELECT user_id, 0, 0, amount, 1, 0, 0 FROM featured_school_donation "
+        "UNION ALL SELECT user_id, 0, 0, 0, 0, COALESCE(amount, 0), 1 FROM micro_donation_pool_join"
+        ") AS history GROUP BY user_id"
+    )
+
+
+def downgrade():
+    op.drop_table('donor_totals')
@@ -0,0 +1,28 @@
+"""Add composite indexes for donor donation history
+
+Revision ID: 1c5e9b7a3d20
+Revises: 0a6d8e2c4f71
+Create Date: 2026-10-18 13:31:45.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c5e9b7a3d20'
+down_revision = '0a6d8e2c4f71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_donation_donor_created', 'donation', ['donor_id', 'created_at'], unique=False)
+    op.create_index('ix_featured_school_donation_user_created', 'featured_school_donation', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_micro_donation_pool_join_user_joined', 'micro_donation_pool_join', ['user_id', 'joined_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_micro_donation_pool_join_user_joined', table_name='micro_donation_pool_join')
+    op.drop_index('ix_featured_school_donation_user_created', table_name='featured_school_donation')
+    op.drop_index('ix_donation_donor_created', table_name='donation')
@@ -0,0 +1,32 @@
+"""Add indexes for the hot route filters
+
+Revision ID: 2d8f6a1b9c47
+Revises: 1c5e9b7a3d20
+Create Date: 2026-10-18 17:12:08.415530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d8f6a1b9c47'
+down_revision = '1c5e9b7a3d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_school_name_city_state', 'school', ['name', 'city', 'state'], unique=False)
+    op.create_index('ix_need_status', 'need', ['status'], unique=False)
+    op.create_index('ix_need_school_status', 'need', ['school_id', 'status'], unique=False)
+    op.create_index('ix_featured_school_city_user', 'featured_school', ['city', 'user_id'], unique=False)
+    op.create_index('ix_micro_donation_pool_join_pool_user', 'micro_donation_pool_join', ['pool_id', 'user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_micro_donation_pool_join_pool_user', table_name='micro_donation_pool_join')
+    op.drop_index('ix_featured_school_city_user', table_name='featured_school')
+    op.drop_index('ix_need_school_status', table_name='need')
+    op.drop_index('ix_need_status', table_name='need')
+    op.drop_index('ix_school_name_city_state', table_name='school')
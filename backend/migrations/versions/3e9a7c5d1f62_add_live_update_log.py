@@ -0,0 +1,34 @@
+"""Add the live_update change log
+
+Revision ID: 3e9a7c5d1f62
+Revises: 2d8f6a1b9c47
+Create Date: 2026-10-18 18:02:41.273904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e9a7c5d1f62'
+down_revision = '2d8f6a1b9c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('live_update',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('topic', sa.String(length=120), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_live_update_created', 'live_update', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_live_update_created', table_name='live_update')
+    op.drop_table('live_update')
@@ -0,0 +1,50 @@
+"""Add micro pool status and settlement records
+
+Revision ID: 4a1f8d3b6e29
+Revises: 3e9a7c5d1f62
+Create Date: 2026-10-18 18:41:09.518227
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a1f8d3b6e29'
+down_revision = '3e9a7c5d1f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('micro_donation_pool', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=False, server_default='active'))
+        batch_op.create_index('ix_micro_donation_pool_status_end', ['status', 'end_date'], unique=False)
+
+    op.create_table('micro_donation_pool_settlement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pool_id', sa.Integer(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('joins', sa.Integer(), nullable=False),
+    sa.Column('participants', sa.Integer(), nullable=False),
+    sa.Column('target_amount', sa.Float(), nullable=False),
+    sa.Column('target_reached', sa.Boolean(), nullable=False),
+    sa.Column('settled_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['pool_id'], ['micro_donation_pool.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('pool_id')
+    )
+
+    # participants used to count every join; count distinct users for pools that have joins
+    op.execute(
+        'UPDATE micro_donation_pool SET participants = '
+        '(SELECT count(DISTINCT user_id) FROM micro_donation_pool_join j WHERE j.pool_id = micro_donation_pool.id) '
+        'WHERE EXISTS (SELECT 1 FROM micro_donation_pool_join j WHERE j.pool_id = micro_donation_pool.id)'
+    )
+
+
+def downgrade():
+    op.drop_table('micro_donation_pool_settlement')
+    with op.batch_alter_table('micro_donation_pool', schema=None) as batch_op:
+        batch_op.drop_index('ix_micro_donation_pool_status_end')
+        batch_op.drop_column('status')
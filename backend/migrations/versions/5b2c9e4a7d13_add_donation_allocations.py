@@ -0,0 +1,43 @@
+"""Add donation allocations
+
+Revision ID: 5b2c9e4a7d13
+Revises: 4a1f8d3b6e29
+Create Date: 2026-10-18 19:26:52.804417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2c9e4a7d13'
+down_revision = '4a1f8d3b6e29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('allocated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_donation_need_allocated', ['need_id', 'allocated_at'], unique=False)
+
+    op.create_table('donation_allocation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('donation_id', sa.Integer(), nullable=False),
+    sa.Column('need_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('items', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['donation_id'], ['donation.id'], ),
+    sa.ForeignKeyConstraint(['need_id'], ['need.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_donation_allocation_donation_id'), 'donation_allocation', ['donation_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_donation_allocation_donation_id'), table_name='donation_allocation')
+    op.drop_table('donation_allocation')
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.drop_index('ix_donation_need_allocated')
+        batch_op.drop_column('allocated_at')
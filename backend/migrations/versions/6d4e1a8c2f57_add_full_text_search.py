@@ -0,0 +1,49 @@
+"""Add full-text search indexes over schools and needs
+
+Revision ID: 6d4e1a8c2f57
+Revises: 5b2c9e4a7d13
+Create Date: 2026-10-18 21:04:37.518230
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6d4e1a8c2f57'
+down_revision = '5b2c9e4a7d13'
+branch_labels = None
+depends_on = None
+
+# FTS5 is SQLite only; other databases get no search indexes
+INDEXES = {
+    'school_fts': ('school', ('name', 'city', 'state', 'description')),
+    'need_fts': ('need', ('title', 'description', 'category')),
+}
+PREFIX = '1 2 3 4 5 6 7 8 9 10'
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for index, (source, columns) in INDEXES.items():
+        names = ', '.join(columns)
+        new = ', '.join('new.%s' % name for name in columns)
+        old = ', '.join('old.%s' % name for name in columns)
+        remove = f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old});"
+        add = f'INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new});'
+        op.execute(f"CREATE VIRTUAL TABLE {index} USING fts5({names}, content='{source}', content_rowid='id', "
+                   f"tokenize='unicode61 remove_diacritics 2', prefix='{PREFIX}')")
+        op.execute(f'CREATE TRIGGER {index}_insert AFTER INSERT ON {source} BEGIN {add} END')
+        op.execute(f'CREATE TRIGGER {index}_delete AFTER DELETE ON {source} BEGIN {remove} END')
+        op.execute(f'CREATE TRIGGER {index}_update AFTER UPDATE OF {names} ON {source} BEGIN {remove} {add} END')
+        # Index the rows that are already there
+        op.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for index in INDEXES:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {index}_{trigger}')
+        op.execute(f'DROP TABLE IF EXISTS {index}')
@@ -0,0 +1,25 @@
+"""Add need allocation credit
+
+Revision ID: 7e5f2b9d4a18
+Revises: 6d4e1a8c2f57
+Create Date: 2026-10-18 23:12:40.351864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e5f2b9d4a18'
+down_revision = '6d4e1a8c2f57'
+branch_labels = None
+depends_on = None
+
+
+# Plain ADD/DROP COLUMN rather than batch mode: a batch rebuild of need would drop its search triggers
+def upgrade():
+    op.add_column('need', sa.Column('allocation_credit', sa.Float(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('need', 'allocation_credit')
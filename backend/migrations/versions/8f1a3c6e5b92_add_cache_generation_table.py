@@ -0,0 +1,30 @@
+"""Add cache generation table
+
+Revision ID: 8f1a3c6e5b92
+Revises: 7e5f2b9d4a18
+Create Date: 2026-10-18 23:48:06.127593
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f1a3c6e5b92'
+down_revision = '7e5f2b9d4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_generation',
+    sa.Column('tag', sa.String(length=200), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('tag')
+    )
+    op.create_index('ix_cache_generation_generation', 'cache_generation', ['generation'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cache_generation_generation', table_name='cache_generation')
+    op.drop_table('cache_generation')
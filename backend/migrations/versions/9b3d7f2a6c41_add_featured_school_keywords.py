@@ -0,0 +1,66 @@
+"""Search featured school needs by every word, not just the first
+
+Revision ID: 9b3d7f2a6c41
+Revises: 8f1a3c6e5b92
+Create Date: 2026-10-19 00:21:53.640718
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3d7f2a6c41'
+down_revision = '8f1a3c6e5b92'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+WORD = re.compile(r'\w+')
+
+
+def upgrade():
+    keyword_table = op.create_table('featured_school_keyword',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('school_id', sa.Integer(), nullable=False),
+    sa.Column('keyword', sa.String(length=200), nullable=False),
+    sa.ForeignKeyConstraint(['school_id'], ['featured_school.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_featured_school_keyword_keyword'), 'featured_school_keyword', ['keyword'], unique=False)
+    op.create_index(op.f('ix_featured_school_keyword_school_id'), 'featured_school_keyword', ['school_id'],
+                    unique=False)
+
+    # Store each need name once per word start: 'STEM kits' -> 'stem kits', 'kits'
+    bind = op.get_bind()
+    batch, school, keywords = [], None, set()
+    for school_id, name in bind.execute(sa.text('SELECT school_id, name FROM featured_school_need ORDER BY school_id')):
+        if school_id != school:
+            school, keywords = school_id, set()
+        lowered = name.lower()
+        for word in WORD.finditer(lowered):
+            if lowered[word.start():] not in keywords:
+                keywords.add(lowered[word.start():])
+                batch.append({'school_id': school_id, 'keyword': lowered[word.start():]})
+        if len(batch) >= BATCH_SIZE:
+            op.bulk_insert(keyword_table, batch)
+            batch = []
+    if batch:
+        op.bulk_insert(keyword_table, batch)
+
+    with op.batch_alter_table('featured_school_need', schema=None) as batch_op:
+        batch_op.drop_index('ix_featured_school_need_keyword')
+        batch_op.drop_column('keyword')
+
+
+def downgrade():
+    with op.batch_alter_table('featured_school_need', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('keyword', sa.String(length=200), nullable=False, server_default=''))
+        batch_op.create_index('ix_featured_school_need_keyword', ['keyword'], unique=False)
+    op.execute('UPDATE featured_school_need SET keyword = lower(name)')
+
+    op.drop_index(op.f('ix_featured_school_keyword_school_id'), table_name='featured_school_keyword')
+    op.drop_index(op.f('ix_featured_school_keyword_keyword'), table_name='featured_school_keyword')
+    op.drop_table('featured_school_keyword')
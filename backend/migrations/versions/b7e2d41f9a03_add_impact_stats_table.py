@@ -0,0 +1,40 @@
+"""Add impact stats table
+
+Revision ID: b7e2d41f9a03
+Revises: 4c4b46d351bd
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d41f9a03'
+down_revision = '4c4b46d351bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('impact_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('total_donations', sa.Float(), nullable=False),
+    sa.Column('schools_helped', sa.Integer(), nullable=False),
+    sa.Column('needs_funded', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Seed the totals from the existing data
+    op.execute(
+        "INSERT INTO impact_stats (id, total_donations, schools_helped, needs_funded, updated_at) "
+        "SELECT 1, "
+        "(SELECT COALESCE(SUM(amount), 0) FROM donation), "
+        "(SELECT COUNT(*) FROM school WHERE verified = 1), "
+        "(SELECT COUNT(*) FROM need WHERE status = 'approved'), "
+        "CURRENT_TIMESTAMP"
+    )
+
+
+def downgrade():
+    op.drop_table('impact_stats')
@@ -0,0 +1,40 @@
+"""Allow guest donations without a user row
+
+Revision ID: d3a9c5e17b42
+Revises: b7e2d41f9a03
+Create Date: 2026-10-18 10:03:54.118264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a9c5e17b42'
+down_revision = 'b7e2d41f9a03'
+branch_labels = None
+depends_on = None
+
+ANONYMOUS_USERS = "SELECT id FROM \"user\" WHERE email LIKE 'anonymous\\_%@equilearn.org' ESCAPE '\\'"
+
+
+def upgrade():
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('donor_name', sa.String(length=100), nullable=True))
+        batch_op.alter_column('donor_id', existing_type=sa.Integer(), nullable=True)
+
+    # Fold the throwaway anonymous_*@equilearn.org users into guest donations
+    op.execute(
+        "UPDATE donation SET donor_name = (SELECT name FROM \"user\" WHERE \"user\".id = donation.donor_id), "
+        "donor_id = NULL "
+        f"WHERE donor_id IN ({ANONYMOUS_USERS})"
+    )
+    op.execute(f"DELETE FROM \"user\" WHERE id IN ({ANONYMOUS_USERS})")
+
+
+def downgrade():
+    # Guest donations are kept but can't be re-attached to users, so drop them
+    op.execute("DELETE FROM donation WHERE donor_id IS NULL")
+    with op.batch_alter_table('donation', schema=None) as batch_op:
+        batch_op.alter_column('donor_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('donor_name')
@@ -0,0 +1,46 @@
+"""Make featured schools unique per city, user and name
+
+Revision ID: e81f0b6c2d95
+Revises: d3a9c5e17b42
+Create Date: 2026-10-18 11:27:40.536902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81f0b6c2d95'
+down_revision = 'd3a9c5e17b42'
+branch_labels = None
+depends_on = None
+
+SAME_KEY = ("d.city = featured_school.city AND COALESCE(d.user_id, 0) = COALESCE(featured_school.user_id, 0) "
+            "AND d.name = featured_school.name")
+KEPT_IDS = "SELECT MIN(id) FROM featured_school GROUP BY city, COALESCE(user_id, 0), name"
+
+
+def upgrade():
+    # Merge duplicates left by concurrent generation into the oldest copy. Every
+    # copy started from the same generated funding, so the oldest keeps its own
+    # funding plus what was donated to the others, then takes their donations.
+    op.execute(
+        "UPDATE featured_school SET current_funding = COALESCE(current_funding, 0) + ("
+        "SELECT COALESCE(SUM(fd.amount), 0) FROM featured_school_donation fd JOIN featured_school d "
+        f"ON d.id = fd.school_id WHERE {SAME_KEY} AND d.id != featured_school.id) "
+        f"WHERE id IN ({KEPT_IDS})"
+    )
+    op.execute(
+        "UPDATE featured_school_donation SET school_id = ("
+        "SELECT MIN(k.id) FROM featured_school k JOIN featured_school d "
+        "ON k.city = d.city AND COALESCE(k.user_id, 0) = COALESCE(d.user_id, 0) AND k.name = d.name "
+        "WHERE d.id = featured_school_donation.school_id) "
+        "WHERE school_id IN (SELECT id FROM featured_school)"
+    )
+    op.execute(f"DELETE FROM featured_school WHERE id NOT IN ({KEPT_IDS})")
+    op.create_index('ux_featured_school_city_user_name', 'featured_school',
+                    ['city', sa.text('coalesce(user_id, 0)'), 'name'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_featured_school_city_user_name', table_name='featured_school')
@@ -0,0 +1,77 @@
+"""Move featured school needs from a JSON column into their own table
+
+Revision ID: f4c72a9e3b18
+Revises: e81f0b6c2d95
+Create Date: 2026-10-18 12:05:11.873044
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c72a9e3b18'
+down_revision = 'e81f0b6c2d95'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# SQLite batch mode rebuilds featured_school without expression indexes, so restore this one
+RESTORE_UNIQUE_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS ux_featured_school_city_user_name "
+                        "ON featured_school (city, coalesce(user_id, 0), name)")
+
+
+def upgrade():
+    need_table = op.create_table('featured_school_need',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('school_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('keyword', sa.String(length=200), nullable=False),
+    sa.ForeignKeyConstraint(['school_id'], ['featured_school.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_featured_school_need_school_id'), 'featured_school_need', ['school_id'], unique=False)
+    op.create_index(op.f('ix_featured_school_need_keyword'), 'featured_school_need', ['keyword'], unique=False)
+
+    # Convert the JSON strings into rows
+    bind = op.get_bind()
+    batch = []
+    for school_id, needs in bind.execute(sa.text('SELECT id, needs FROM featured_school WHERE needs IS NOT NULL')):
+        try:
+            names = json.loads(needs)
+        except ValueError:
+            continue
+        for position, name in enumerate(names if isinstance(names, list) else []):
+            name = str(name)[:200]
+            batch.append({'school_id': school_id, 'position': position, 'name': name, 'keyword': name.lower()})
+        if len(batch) >= BATCH_SIZE:
+            op.bulk_insert(need_table, batch)
+            batch = []
+    if batch:
+        op.bulk_insert(need_table, batch)
+
+    with op.batch_alter_table('featured_school', schema=None) as batch_op:
+        batch_op.drop_column('needs')
+    op.execute(RESTORE_UNIQUE_INDEX)
+
+
+def downgrade():
+    with op.batch_alter_table('featured_school', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('needs', sa.Text(), nullable=True))
+    op.execute(RESTORE_UNIQUE_INDEX)
+
+    bind = op.get_bind()
+    needs = {}
+    for school_id, name in bind.execute(sa.text('SELECT school_id, name FROM featured_school_need ORDER BY school_id, position')):
+        needs.setdefault(school_id, []).append(name)
+    for school_id, names in needs.items():
+        bind.execute(sa.text('UPDATE featured_school SET needs = :needs WHERE id = :id'),
+                     {'needs': json.dumps(names), 'id': school_id})
+
+    op.drop_index(op.f('ix_featured_school_need_keyword'), table_name='featured_school_need')
+    op.drop_index(op.f('ix_featured_school_need_school_id'), table_name='featured_school_need')
+    op.drop_table('featured_school_need')
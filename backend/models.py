@@ -29,6 +29,9 @@ class School(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     needs = db.relationship('Need', backref='school', lazy=True)
 
+# Bulk school imports de-duplicate on this key
+db.Index('ix_school_name_city_state', School.name, School.city, School.state)
+
 class Need(db.Model):
     """Database model for specific needs at schools."""
     id = db.Column(db.Integer, primary_key=True)
@@ -40,19 +43,41 @@ class Need(db.Model):
     total_needed = db.Column(db.Integer, nullable=False)
     current_donations = db.Column(db.Integer, default=0)
     cost_per_item = db.Column(db.Float, nullable=False)
+    allocation_credit = db.Column(db.Float, nullable=False, default=0, server_default='0')  # Allocated dollars short of another whole item
     status = db.Column(db.String(20), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     donations = db.relationship('Donation', backref='need', lazy=True)
 
+# The admin queue filters on status alone (ordered by id, which SQLite keeps in
+# every index); school listings probe a school's needs by status and count them
+db.Index('ix_need_status', Need.status)
+db.Index('ix_need_school_status', Need.school_id, Need.status)
+
 class Donation(db.Model):
     """Database model for individual donations made by users."""
     id = db.Column(db.Integer, primary_key=True)
-    donor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    donor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # NULL for guest donations
+    donor_name = db.Column(db.String(100), nullable=True)  # Guest donor's display name
     need_id = db.Column(db.Integer, db.ForeignKey('need.id'), nullable=True)
     amount = db.Column(db.Float, nullable=False)
     donation_type = db.Column(db.String(20), nullable=False)
     message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow) 
+    allocated_at = db.Column(db.DateTime, nullable=True)  # When a donation without a need was split across needs
+
+# Donation history pages are range scans on these (SQLite appends the row id to each entry)
+db.Index('ix_donation_donor_created', Donation.donor_id, Donation.created_at)
+# The allocation queue is the donations with neither a need nor an allocation, in id order
+db.Index('ix_donation_need_allocated', Donation.need_id, Donation.allocated_at)
+
+class DonationAllocation(db.Model):
+    """One need's share of a donation that was made without a need."""
+    id = db.Column(db.Integer, primary_key=True)
+    donation_id = db.Column(db.Integer, db.ForeignKey('donation.id'), nullable=False, index=True)
+    need_id = db.Column(db.Integer, db.ForeignKey('need.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    items = db.Column(db.Integer, nullable=False)  # Whole items the share paid for
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class FeaturedSchool(db.Model):
     """Database model for featured schools on the platform."""
@@ -62,9 +87,29 @@ class FeaturedSchool(db.Model):
     name = db.Column(db.String(200), nullable=False)
     location = db.Column(db.String(100), nullable=True)
     description = db.Column(db.Text, nullable=True)
-    needs = db.Column(db.Text, nullable=True)  # Store as JSON string 
     funding_goal = db.Column(db.Float, nullable=True)
     current_funding = db.Column(db.Float, nullable=True) 
+    needs = db.relationship('FeaturedSchoolNeed', backref='school', lazy='selectin',
+                            order_by='FeaturedSchoolNeed.position')
+
+class FeaturedSchoolNeed(db.Model):
+    """Database model for one need listed by a featured school."""
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('featured_school.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    name = db.Column(db.String(200), nullable=False)
+
+class FeaturedSchoolKeyword(db.Model):
+    """A featured school need's lowercased name from one of its words on, for prefix search."""
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('featured_school.id'), nullable=False, index=True)
+    keyword = db.Column(db.String(200), nullable=False, index=True)
+
+# One copy of each generated school per (city, user); NULL user ids compare equal here
+db.Index('ux_featured_school_city_user_name', FeaturedSchool.city,
+         db.func.coalesce(FeaturedSchool.user_id, 0), FeaturedSchool.name, unique=True)
+# Per-user featured lists filter on the raw user_id, which the expression index can't serve
+db.Index('ix_featured_school_city_user', FeaturedSchool.city, FeaturedSchool.user_id)
 
 class FeaturedSchoolDonation(db.Model):
     """Database model for donations made to featured schools."""
@@ -74,6 +119,8 @@ class FeaturedSchoolDonation(db.Model):
     amount = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow) 
 
+db.Index('ix_featured_school_donation_user_created', FeaturedSchoolDonation.user_id, FeaturedSchoolDonation.created_at)
+
 class MicroDonationPoolJoin(db.Model):
     """Database model for users who have joined a micro donation pool."""
     id = db.Column(db.Integer, primary_key=True)
@@ -82,6 +129,9 @@ class MicroDonationPoolJoin(db.Model):
     amount = db.Column(db.Float, nullable=True)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow) 
 
+db.Index('ix_micro_donation_pool_join_user_joined', MicroDonationPoolJoin.user_id, MicroDonationPoolJoin.joined_at)
+db.Index('ix_micro_donation_pool_join_pool_user', MicroDonationPoolJoin.pool_id, MicroDonationPoolJoin.user_id)
+
 class MicroDonationPool(db.Model):
     """Database model for a pool of micro donations."""
     id = db.Column(db.Integer, primary_key=True)
@@ -89,5 +139,59 @@ class MicroDonationPool(db.Model):
     description = db.Column(db.Text, nullable=False)
     target_amount = db.Column(db.Float, nullable=False)
     current_amount = db.Column(db.Float, default=0)
-    participants = db.Column(db.Integer, default=0)
-    end_date = db.Column(db.DateTime, nullable=False) 
\ No newline at end of file
+    participants = db.Column(db.Integer, default=0)  # Distinct users who joined
+    end_date = db.Column(db.DateTime, nullable=False) 
+    status = db.Column(db.String(20), nullable=False, default='active')  # active, closed or settled
+
+# The public list reads active pools by end date; settlement looks pools up by status
+db.Index('ix_micro_donation_pool_status_end', MicroDonationPool.status, MicroDonationPool.end_date)
+
+class MicroDonationPoolSettlement(db.Model):
+    """Final totals of a closed micro donation pool, written once by settlement."""
+    id = db.Column(db.Integer, primary_key=True)
+    pool_id = db.Column(db.Integer, db.ForeignKey('micro_donation_pool.id'), nullable=False, unique=True)
+    total_amount = db.Column(db.Float, nullable=False)
+    joins = db.Column(db.Integer, nullable=False)
+    participants = db.Column(db.Integer, nullable=False)
+    target_amount = db.Column(db.Float, nullable=False)
+    target_reached = db.Column(db.Boolean, nullable=False)
+    settled_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ImpactStats(db.Model):
+    """Materialized platform totals behind /api/impact (a single row, id=1)."""
+    id = db.Column(db.Integer, primary_key=True)
+    total_donations = db.Column(db.Float, nullable=False, default=0)
+    schools_helped = db.Column(db.Integer, nullable=False, default=0)
+    needs_funded = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DonorTotals(db.Model):
+    """Running per-donor totals, kept up to date by every donation write."""
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    donations_total = db.Column(db.Float, nullable=False, default=0)
+    donations_count = db.Column(db.Integer, nullable=False, default=0)
+    featured_total = db.Column(db.Float, nullable=False, default=0)
+    featured_count = db.Column(db.Integer, nullable=False, default=0)
+    pools_total = db.Column(db.Float, nullable=False, default=0)
+    pools_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheGeneration(db.Model):
+    """When each cache tag was last invalidated, on a clock kept in the ``*`` row; read by every worker."""
+    tag = db.Column(db.String(200), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+# Workers read the tags stamped after the clock value they last saw
+db.Index('ix_cache_generation_generation', CacheGeneration.generation)
+
+class LiveUpdate(db.Model):
+    """Change log of funding progress, read by every worker's live stream poller."""
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(120), nullable=False)  # city:<name>, pool:<id> or school:<id>
+    kind = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Old rows are pruned by age
+db.Index('ix_live_update_created', LiveUpdate.created_at)
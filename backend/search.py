@@ -0,0 +1,210 @@
+"""
+search.py - Full-text search over schools and needs for EquiLearn
+Schools (name, city, state, description) and needs (title, description,
+category) are indexed in SQLite FTS5 tables that read their text from the
+main tables. Triggers keep the indexes in step with every write, including
+the bulk loaders' Core inserts. The update triggers fire only when an indexed
+column changes, so donation counters never touch an index.
+
+Results are ranked by BM25 with per-column weights, and the last search term
+matches as a prefix, for search-as-you-type. Every match is ranked: FTS5
+sorts its matches by rank itself, so a page is read in rank order straight
+from the index.
+
+The indexes exist on SQLite only; ``search_available()`` is False elsewhere.
+"""
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import DDL, bindparam, column, event, func, literal, select, table, text
+
+from extensions import db
+from models import Need, School
+
+SCHOOL_INDEX = 'school_fts'
+NEED_INDEX = 'need_fts'
+SEARCH_TYPES = ('all', 'schools', 'needs')
+
+# BM25 weight of each indexed column, in column order: a hit in a title counts for more than one in a description
+SCHOOL_WEIGHTS = {'name': 10.0, 'city': 5.0, 'state': 2.0, 'description': 1.0}
+NEED_WEIGHTS = {'title': 10.0, 'description': 1.0, 'category': 4.0}
+# Terms beyond this are ignored, so one query can't make FTS5 intersect dozens of lists
+MAX_TERMS = 8
+# FTS5 answers a longer prefix by merging the match lists of every term it starts before returning a row.
+# Indexing each of these lengths roughly doubles the index but keeps every keystroke a single list read.
+PREFIX_LENGTHS = tuple(range(1, 11))
+
+_TERM = re.compile(r'\w+')
+_TRIGGERS = ('insert', 'delete', 'update')
+
+
+def _index_ddl(index, source, columns):
+    """CREATE and DROP statements for an FTS5 index over ``source`` kept in sync by triggers."""
+    names = ', '.join(columns)
+    new = ', '.join('new.%s' % name for name in columns)
+    old = ', '.join('old.%s' % name for name in columns)
+    remove = "INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    add = 'INSERT INTO {index}(rowid, {names}) VALUES (new.id, {new});'
+    create = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({names}, content='{source}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='{prefix}')",
+        'CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {source} BEGIN %s END' % add,
+        'CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {source} BEGIN %s END' % remove,
+        'CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {names} ON {source} BEGIN %s %s END'
+        % (remove, add),
+    ]
+    drop = ['DROP TRIGGER IF EXISTS {index}_%s' % trigger for trigger in _TRIGGERS] + ['DROP TABLE IF EXISTS {index}']
+    fields = {'index': index, 'source': source, 'names': names, 'new': new, 'old': old,
+              'prefix': ' '.join(str(length) for length in PREFIX_LENGTHS)}
+    return [sql.format(**fields) for sql in create], [sql.format(**fields) for sql in drop]
+
+
+INDEXES = {
+    SCHOOL_INDEX: (School.__table__, _index_ddl(SCHOOL_INDEX, 'school', list(SCHOOL_WEIGHTS))),
+    NEED_INDEX: (Need.__table__, _index_ddl(NEED_INDEX, 'need', list(NEED_WEIGHTS))),
+}
+
+# create_all and drop_all build and remove the indexes along with their tables
+for _source, (_create, _drop) in INDEXES.values():
+    for _sql in _create:
+        event.listen(_source, 'after_create', DDL(_sql).execute_if(dialect='sqlite'))
+    for _sql in _drop:
+        event.listen(_source, 'before_drop', DDL(_sql).execute_if(dialect='sqlite'))
+
+
+def is_search_table(name):
+    """True for the FTS5 tables and the shadow tables FTS5 keeps beside them."""
+    return any(name == index or name.startswith(index + '_') for index in INDEXES)
+
+
+def search_available():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def match_expression(words):
+    """Turn free-text ``words`` into an FTS5 query: every term must match, the last one as a prefix.
+
+    Terms are quoted, so FTS5 operators and punctuation in ``words`` are
+    searched for rather than parsed. Returns None when there is nothing to search for.
+    """
+    terms = _TERM.findall(words.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join('"%s"' % term for term in terms) + '*'
+
+
+def _page_query(index, weights, source, *columns, where=()):
+    """One page of ``columns`` for the rows matching ``:query``, best BM25 rank first.
+
+    ``source`` joins the indexed table (and any others ``columns`` come
+    from) to the index, and ``where`` keeps only the rows that may be shown.
+    """
+    fts = table(index, column('rowid'), column(index), column('rank'))
+    ranking = 'bm25(%s)' % ', '.join(str(weight) for weight in weights.values())
+    # Ordering by rank alone lets FTS5 hand the matches over already sorted
+    return (select(*columns, fts.c.rank)
+            .select_from(source(fts))
+            .where(fts.c[index].op('MATCH')(bindparam('query')), fts.c.rank.op('MATCH')(literal(ranking)), *where)
+            .order_by(fts.c.rank)
+            .limit(bindparam('limit'))
+            .offset(bindparam('offset')))
+
+
+SCHOOL_QUERY = _page_query(
+    SCHOOL_INDEX, SCHOOL_WEIGHTS,
+    lambda fts: fts.join(School, School.id == fts.c.rowid),
+    School.id, School.name, School.location, School.city, School.state,
+    where=(School.verified == True,))
+
+NEED_QUERY = _page_query(
+    NEED_INDEX, NEED_WEIGHTS,
+    lambda fts: fts.join(Need, Need.id == fts.c.rowid).join(School, School.id == Need.school_id),
+    Need.id, Need.school_id, School.name.label('school_name'), School.city, Need.title, Need.category,
+    Need.urgency, Need.total_needed, Need.current_donations, Need.cost_per_item,
+    where=(Need.status == 'approved', School.verified == True))
+
+
+def search_schools(query, limit, offset=0):
+    """Verified schools matching ``query``, best first, as (rank, result dict)."""
+    rows = db.session.execute(SCHOOL_QUERY, {'query': query, 'limit': limit, 'offset': offset})
+    return [(row.rank, {'type': 'school', 'id': row.id, 'name': row.name, 'location': row.location,
+                        'city': row.city, 'state': row.state, 'score': round(-row.rank, 4)})
+            for row in rows]
+
+
+def search_needs(query, limit, offset=0):
+    """Approved needs at verified schools matching ``query``, best first, as (rank, result dict)."""
+    rows = db.session.execute(NEED_QUERY, {'query': query, 'limit': limit, 'offset': offset})
+    return [(row.rank, {'type': 'need', 'id': row.id, 'schoolId': row.school_id, 'schoolName': row.school_name,
+                        'city': row.city, 'title': row.title, 'category': row.category, 'urgency': row.urgency,
+                        'totalNeeded': row.total_needed, 'currentDonations': row.current_donations,
+                        'costPerItem': row.cost_per_item, 'score': round(-row.rank, 4)})
+            for row in rows]
+
+
+def search(words, kind='all', limit=50, offset=0):
+    """One page of results for free-text ``words`` and whether more follow.
+
+    With ``kind='all'`` schools and needs are merged by BM25 rank, which is
+    comparable across the two indexes because both weight their best column
+    alike.
+    """
+    query = match_expression(words)
+    if query is None:
+        return [], False
+    if kind == 'schools':
+        hits = search_schools(query, limit + 1, offset)
+    elif kind == 'needs':
+        hits = search_needs(query, limit + 1, offset)
+    else:
+        hits = search_schools(query, offset + limit + 1) + search_needs(query, offset + limit + 1)
+        hits.sort(key=lambda hit: hit[0])
+        hits = hits[offset:]
+    return [result for _, result in hits[:limit]], len(hits) > limit
+
+
+def _rebuild(execute, index):
+    for sql in INDEXES[index][1][0]:
+        execute(text(sql))
+    execute(text("INSERT INTO {0}({0}) VALUES ('rebuild')".format(index)))
+    # Merge the rebuilt index into one b-tree so queries read fewer pages
+    execute(text("INSERT INTO {0}({0}) VALUES ('optimize')".format(index)))
+
+
+def rebuild_search_index():
+    """Create any missing index and rebuild every index from its table. Returns the rows indexed.
+
+    Needed when rows were written without the triggers, e.g. after a restore
+    without them or a batch migration that rebuilt ``school`` or ``need``
+    (SQLite drops a table's triggers with it). The caller commits.
+    """
+    counts = {}
+    for index, (source, _) in INDEXES.items():
+        _rebuild(db.session.execute, index)
+        counts[index] = db.session.execute(select(func.count()).select_from(source)).scalar()
+    return counts
+
+
+@contextmanager
+def deferred_indexing(conn):
+    """Drop the index triggers while ``conn`` bulk-loads, then rebuild the indexes in one pass.
+
+    One rebuild is several times faster than indexing each row as it is
+    inserted. Rows other connections write meanwhile are picked up by the rebuild.
+    """
+    indexes = []
+    if conn.dialect.name == 'sqlite':
+        existing = {name for name, in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        indexes = [index for index in INDEXES if index in existing]
+    for index in indexes:
+        for trigger in _TRIGGERS:
+            conn.exec_driver_sql('DROP TRIGGER IF EXISTS %s_%s' % (index, trigger))
+    conn.commit()
+    try:
+        yield
+    finally:
+        # Also after a failed load, so the indexes never stay without triggers
+        conn.rollback()
+        for index in indexes:
+            _rebuild(conn.execute, index)
+        conn.commit()
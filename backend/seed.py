@@ -0,0 +1,266 @@
+"""
+seed.py - Deterministic bulk data generator for EquiLearn
+Generates realistic schools, needs, donors, donations and pool joins at load
+testing scale and writes them with Core bulk inserts in large transactions.
+The same seed always produces the same rows.
+"""
+import bisect
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, case, func, insert, select, update
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import User, School, Need, Donation, MicroDonationPool, MicroDonationPoolJoin
+from aggregates import rebuild_impact_stats, reconcile_donor_totals
+from search import deferred_indexing
+
+DEFAULT_SCALE = {'schools': 10000, 'needs': 50000, 'users': 20000, 'donations': 1000000,
+                 'pools': 50, 'pool_joins': 100000}
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_TRANSACTION_ROWS = 200000
+DEFAULT_PASSWORD = 'equilearn'
+
+# Weighted roughly by population so a few states dominate, as they do in production
+STATES = {'CA': 12, 'TX': 9, 'FL': 7, 'NY': 6, 'PA': 4, 'IL': 4, 'OH': 4, 'GA': 3, 'NC': 3, 'MI': 3,
+          'NJ': 3, 'VA': 3, 'WA': 2, 'AZ': 2, 'TN': 2, 'MA': 2, 'IN': 2, 'MO': 2, 'MD': 2, 'CO': 2}
+CITY_NAMES = ('Springfield', 'Riverside', 'Fairview', 'Franklin', 'Greenville', 'Bristol', 'Clinton',
+              'Georgetown', 'Salem', 'Madison', 'Oakwood', 'Farmville', 'Ashland', 'Milton', 'Dover')
+SCHOOL_KINDS = ('Elementary', 'Middle School', 'High School', 'Academy', 'Primary School')
+LOCATIONS = {'urban': 5, 'suburban': 3, 'rural': 2}
+CATEGORIES = {'Books': 4, 'Supplies': 5, 'Technology': 3, 'Sports': 2, 'Arts': 2, 'Furniture': 1}
+NEED_TITLES = {
+    'Books': ('Library books', 'Reading workbooks', 'Textbooks'),
+    'Supplies': ('Notebooks', 'Pencils', 'Backpacks', 'Art paper'),
+    'Technology': ('Laptops', 'Tablets', 'Projectors', 'STEM kits'),
+    'Sports': ('Soccer balls', 'Team uniforms', 'Gym mats'),
+    'Arts': ('Musical instruments', 'Paint sets', 'Clay'),
+    'Furniture': ('Desks', 'Chairs', 'Bookshelves'),
+}
+URGENCIES = {'low': 3, 'medium': 5, 'high': 2}
+NEED_STATUSES = {'approved': 7, 'pending': 2, 'rejected': 1}
+DONATION_TYPES = {'direct': 7, 'general': 3}
+
+
+class SeedReport:
+    """Rows written per table and the time each took."""
+
+    def __init__(self):
+        self.tables = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def table(self, name):
+        started = time.perf_counter()
+        counter = {'rows': 0}
+        yield counter
+        self.tables[name] = {'rows': counter['rows'], 'seconds': round(time.perf_counter() - started, 3)}
+
+    def to_dict(self):
+        seconds = time.perf_counter() - self.started
+        rows = sum(table['rows'] for table in self.tables.values())
+        return {
+            'tables': {name: dict(table, rows_per_second=round(table['rows'] / table['seconds'], 1)
+                                  if table['seconds'] else None)
+                       for name, table in self.tables.items()},
+            'rows': rows,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        }
+
+
+class _Weighted:
+    """Fast repeated weighted choice from a fixed population."""
+
+    def __init__(self, weights):
+        self.values = list(weights)
+        self.cumulative = list(itertools.accumulate(weights.values()))
+
+    def pick(self, rng):
+        return self.values[bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def _zipf(start, count, exponent=1.1):
+    """Ids ``start..start+count-1`` where low ranks are picked far more often."""
+    return _Weighted({start + rank: 1 / (rank + 1) ** exponent for rank in range(count)})
+
+
+@contextmanager
+def relaxed_pragmas(conn):
+    """Trade durability for load speed on SQLite while ``conn`` is loading."""
+    if conn.dialect.name != 'sqlite':
+        yield
+        return
+    relaxed = {'synchronous': 'OFF', 'temp_store': 'MEMORY', 'cache_size': -262144}
+    saved = {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in relaxed}
+    for name, value in relaxed.items():
+        conn.exec_driver_sql(f'PRAGMA {name}={value}')
+    try:
+        yield
+    finally:
+        # The connection goes back to the pool, so put its settings back
+        for name, value in saved.items():
+            conn.exec_driver_sql(f'PRAGMA {name}={value}')
+
+
+def _next_id(conn, model):
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+class _Writer:
+    """Insert rows in executemany chunks, committing every ``transaction_rows`` rows."""
+
+    def __init__(self, conn, chunk_size, transaction_rows):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.transaction_rows = transaction_rows
+        self.pending = 0
+
+    def write(self, model, rows, counter):
+        stmt = insert(model.__table__)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.conn.execute(stmt, chunk)
+            counter['rows'] += len(chunk)
+            self.pending += len(chunk)
+            if self.pending >= self.transaction_rows:
+                self.conn.commit()
+                self.pending = 0
+        self.conn.commit()
+        self.pending = 0
+
+
+def seed_database(scale=None, seed=1, chunk_size=DEFAULT_CHUNK_SIZE, transaction_rows=DEFAULT_TRANSACTION_ROWS,
+                  password=DEFAULT_PASSWORD, days=365):
+    """Append a generated dataset of ``scale`` rows and return a SeedReport.
+
+    New rows take ids after the existing ones, so seeding an initialized
+    database keeps its admin account and sample data. Need progress, pool
+    totals, impact stats and donor totals are brought in line with the
+    generated donations, and the search indexes are rebuilt once at the end.
+    """
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    # Timestamps count back from midnight, so a seed gives identical rows all day
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    report = SeedReport()
+
+    with db.engine.connect() as conn, relaxed_pragmas(conn), deferred_indexing(conn):
+        writer = _Writer(conn, chunk_size, transaction_rows)
+        first_user = _next_id(conn, User)
+        first_school = _next_id(conn, School)
+        first_need = _next_id(conn, Need)
+        first_pool = _next_id(conn, MicroDonationPool)
+
+        states, locations = _Weighted(STATES), _Weighted(LOCATIONS)
+        categories, urgencies, statuses = _Weighted(CATEGORIES), _Weighted(URGENCIES), _Weighted(NEED_STATUSES)
+        donation_types = _Weighted(DONATION_TYPES)
+
+        def created_at():
+            # Squaring skews timestamps towards the recent end of the window
+            return now - timedelta(seconds=int(days * 86400 * rng.random() ** 2))
+
+        password_hash = generate_password_hash(password)
+        with report.table('user') as counter:
+            writer.write(User, ({'id': user_id, 'email': f'donor{user_id}@seed.equilearn.org',
+                                 'password_hash': password_hash, 'name': f'Donor {user_id}', 'role': 'donor',
+                                 'created_at': created_at()}
+                                for user_id in range(first_user, first_user + scale['users'])), counter)
+
+        with report.table('school') as counter:
+            writer.write(School, ({'id': school_id,
+                                   'name': f"{rng.choice(CITY_NAMES)} {rng.choice(SCHOOL_KINDS)} #{school_id}",
+                                   'location': locations.pick(rng), 'city': rng.choice(CITY_NAMES),
+                                   'state': states.pick(rng), 'description': '', 'verified': rng.random() < 0.85,
+                                   'created_at': created_at()}
+                                  for school_id in range(first_school, first_school + scale['schools'])), counter)
+
+        # Some schools post many more needs than others
+        school_picker = _zipf(first_school, scale['schools'], exponent=0.6)
+        costs = {}
+
+        def needs():
+            for need_id in range(first_need, first_need + scale['needs']):
+                category = categories.pick(rng)
+                costs[need_id] = float(rng.choice((1, 2, 5, 10, 25, 50, 150, 400)))
+                yield {'id': need_id, 'school_id': school_picker.pick(rng),
+                       'title': rng.choice(NEED_TITLES[category]), 'description': '', 'category': category,
+                       'urgency': urgencies.pick(rng), 'total_needed': rng.randint(10, 500),
+                       'current_donations': 0, 'cost_per_item': costs[need_id], 'status': statuses.pick(rng),
+                       'created_at': created_at()}
+
+        with report.table('need') as counter:
+            writer.write(Need, needs(), counter)
+
+        # A small share of donors give most donations and a few needs draw most of the money
+        donor_picker = _zipf(first_user, scale['users'])
+        need_picker = _zipf(first_need, scale['needs'], exponent=0.8)
+        items_by_need = {}
+
+        def donations():
+            for _ in range(scale['donations']):
+                guest = rng.random() < 0.1
+                donation_type = donation_types.pick(rng)
+                need_id = need_picker.pick(rng) if donation_type == 'direct' else None
+                amount = round(min(5000.0, max(1.0, rng.lognormvariate(3.2, 1.0))), 2)
+                if need_id is not None:
+                    items_by_need[need_id] = items_by_need.get(need_id, 0) + int(amount / costs[need_id])
+                yield {'donor_id': None if guest else donor_picker.pick(rng),
+                       'donor_name': 'Anonymous Donor' if guest else None, 'need_id': need_id,
+                       'amount': amount, 'donation_type': donation_type, 'message': '',
+                       'created_at': created_at()}
+
+        with report.table('donation') as counter:
+            writer.write(Donation, donations(), counter)
+
+        with report.table('micro_donation_pool') as counter:
+            writer.write(MicroDonationPool, ({'id': pool_id, 'name': f'Micro Pool {pool_id}',
+                                              'description': 'Pooled small donations for classroom supplies.',
+                                              'target_amount': float(rng.choice((500, 1000, 2500, 5000))),
+                                              'current_amount': 0.0, 'participants': 0,
+                                              'end_date': now + timedelta(days=rng.randint(-30, 90))}
+                                             for pool_id in range(first_pool, first_pool + scale['pools'])), counter)
+
+        pool_picker = _zipf(first_pool, scale['pools'], exponent=0.7) if scale['pools'] else None
+        pool_totals = {}
+
+        def pool_joins():
+            for _ in range(scale['pool_joins']):
+                pool_id = pool_picker.pick(rng)
+                user_id = donor_picker.pick(rng)
+                amount = float(rng.choice((1, 2, 5, 10)))
+                totals = pool_totals.setdefault(pool_id, [0.0, set()])
+                totals[0] += amount
+                totals[1].add(user_id)
+                yield {'user_id': user_id, 'pool_id': pool_id, 'amount': amount, 'joined_at': created_at()}
+
+        with report.table('micro_donation_pool_join') as counter:
+            if pool_picker is not None:
+                writer.write(MicroDonationPoolJoin, pool_joins(), counter)
+
+        need = Need.__table__
+        progress = func.coalesce(need.c.current_donations, 0) + bindparam('items')
+        if items_by_need:
+            conn.execute(update(need).where(need.c.id == bindparam('need_pk'))
+                         .values(current_donations=case((progress > need.c.total_needed, need.c.total_needed),
+                                                        else_=progress)),
+                         [{'need_pk': need_id, 'items': items} for need_id, items in items_by_need.items()])
+        pool = MicroDonationPool.__table__
+        if pool_totals:
+            conn.execute(update(pool).where(pool.c.id == bindparam('pool_pk'))
+                         .values(current_amount=pool.c.current_amount + bindparam('amount'),
+                                 participants=pool.c.participants + bindparam('people')),
+                         [{'pool_pk': pool_id, 'amount': amount, 'people': len(users)}
+                          for pool_id, (amount, users) in pool_totals.items()])
+        conn.commit()
+
+    rebuild_impact_stats()
+    db.session.commit()
+    reconcile_donor_totals(fix=True)
+    return report
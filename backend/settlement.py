@@ -0,0 +1,138 @@
+"""
+settlement.py - Settlement of expired micro donation pools for EquiLearn
+Closes pools whose end date has passed so they stop taking joins, then
+settles each closed pool. Its joins are streamed in keyset-paginated chunks
+to total the amount and count distinct participants, and the results are
+written as MicroDonationPoolSettlement records, one batch of pools per
+transaction. Memory is bounded by the chunk size however many joins a pool
+has, and a run that stops part way is finished by the next one.
+
+A pool's own amount and participant counters are only reported when they
+drift from its joins, and overwritten only with ``fix=True``. Pools without
+join rows (created before joins were recorded, like the init-db samples)
+settle on their own counters.
+"""
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, select, tuple_, update
+
+from extensions import db
+from models import MicroDonationPool, MicroDonationPoolJoin, MicroDonationPoolSettlement
+
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+
+
+class SettlementReport:
+    """Pools closed and settled by one run."""
+
+    def __init__(self):
+        self.closed = 0
+        self.settled = 0
+        self.joins = 0
+        self.drifted = []  # (pool_id, recorded amount, settled amount)
+
+    def to_dict(self):
+        return {'closed': self.closed, 'settled': self.settled, 'joins': self.joins,
+                'drifted': [{'pool_id': pool_id, 'recorded': recorded, 'settled': settled}
+                            for pool_id, recorded, settled in self.drifted]}
+
+
+def close_expired_pools(now=None):
+    """Close every active pool whose end date has passed and return how many closed."""
+    closed = db.session.execute(
+        update(MicroDonationPool)
+        .where(MicroDonationPool.status == 'active', MicroDonationPool.end_date <= (now or datetime.utcnow()))
+        .values(status='closed')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return closed
+
+
+def tally_joins(pool_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a pool's joins and return (total amount, joins, distinct participants).
+
+    Joins are read in (user_id, id) order along the pool/user index, so a new
+    participant is just a change of user_id and nothing is kept per user.
+    """
+    join = MicroDonationPoolJoin
+    total, joins, participants = 0.0, 0, 0
+    previous_user = last = None
+    with db.engine.connect() as conn:
+        while True:
+            query = select(join.user_id, join.id, join.amount).where(join.pool_id == pool_id)
+            if last is not None:
+                query = query.where(tuple_(join.user_id, join.id) > last)
+            rows = conn.execute(query.order_by(join.user_id, join.id).limit(chunk_size)).all()
+            # End the read transaction between chunks so a long pool doesn't hold back WAL checkpoints
+            conn.rollback()
+            if not rows:
+                break
+            for user_id, _, amount in rows:
+                if user_id != previous_user:
+                    participants += 1
+                    previous_user = user_id
+                total += amount or 0
+            joins += len(rows)
+            last = (rows[-1].user_id, rows[-1].id)
+    return round(total, 2), joins, participants
+
+
+def settle_pools(chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE, now=None, fix=False):
+    """Close expired pools and settle every closed pool. Returns a SettlementReport.
+
+    Each batch of ``batch_size`` pools gets its settlement records and
+    ``settled`` status in one transaction. With ``fix``, drifted pools that
+    have joins also take the joins' amount and distinct participants.
+    """
+    report = SettlementReport()
+    report.closed = close_expired_pools(now)
+    pool = MicroDonationPool.__table__
+    last_id = 0
+    while True:
+        pools = db.session.execute(
+            select(pool.c.id, pool.c.target_amount, pool.c.current_amount, pool.c.participants)
+            .where(pool.c.status == 'closed', pool.c.id > last_id)
+            .order_by(pool.c.id)
+            .limit(batch_size)
+        ).all()
+        if not pools:
+            break
+        last_id = pools[-1].id
+
+        settled_at = datetime.utcnow()
+        records, corrected = [], []
+        for row in pools:
+            total, joins, participants = tally_joins(row.id, chunk_size)
+            if not joins:
+                # Nothing to check the counters against
+                total, participants = round(row.current_amount or 0, 2), row.participants or 0
+            elif abs((row.current_amount or 0) - total) >= 0.01 or (row.participants or 0) != participants:
+                report.drifted.append((row.id, row.current_amount, total))
+                corrected.append({'pool_pk': row.id, 'total': total, 'people': participants})
+            records.append({'pool_id': row.id, 'total_amount': total, 'joins': joins,
+                            'participants': participants, 'target_amount': row.target_amount,
+                            'target_reached': total >= row.target_amount, 'settled_at': settled_at})
+            report.joins += joins
+
+        try:
+            db.session.execute(insert(MicroDonationPoolSettlement.__table__), records)
+            db.session.execute(
+                update(pool)
+                .where(pool.c.id == bindparam('pool_pk'), pool.c.status == 'closed')
+                .values(status='settled'),
+                [{'pool_pk': record['pool_id']} for record in records]
+            )
+            if fix and corrected:
+                db.session.execute(
+                    update(pool).where(pool.c.id == bindparam('pool_pk'))
+                    .values(current_amount=bindparam('total'), participants=bindparam('people')),
+                    corrected
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        report.settled += len(records)
+    return report
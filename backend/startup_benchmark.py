@@ -0,0 +1,106 @@
+"""
+startup_benchmark.py - Cold start timing for EquiLearn
+Starts fresh interpreters and times importing app.py, building the app with
+create_app() and serving the first request, so cold start can be held to a
+budget as the app grows.
+
+    python startup_benchmark.py --runs 10 --budget-ms 800
+    python startup_benchmark.py --importtime 15
+
+Exits non-zero when the median total exceeds --budget-ms.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import click
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter; prints one JSON line of timings in milliseconds
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get(%(path)r)
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+    'status': response.status_code,
+}))
+'''
+
+
+def _run(code, env, extra_args=()):
+    result = subprocess.run([sys.executable, *extra_args, '-c', code], cwd=HERE, env=env,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise click.ClickException(result.stderr.strip().splitlines()[-1] if result.stderr else 'probe failed')
+    return result
+
+
+@click.command()
+@click.option('--runs', default=10, show_default=True, help='Fresh interpreters to time.')
+@click.option('--path', default='/api/impact', show_default=True, help='Route for the first request.')
+@click.option('--budget-ms', type=float, help='Fail when the median total startup time exceeds this.')
+@click.option('--importtime', 'importtime', default=0, help='Also list the N slowest imports of app.py.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results as JSON.')
+def main(runs, path, budget_ms, importtime, output):
+    """Time importing app.py, create_app() and the first request in fresh processes."""
+    env = dict(os.environ)
+    env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='equilearn-startup-'), 'startup.db')
+    # Set up the tables once so every timed run sees a ready database
+    _run('import app; flask_app = app.create_app()\nwith flask_app.app_context(): app.init_db()', env)
+
+    samples = []
+    for _ in range(runs):
+        sample = json.loads(_run(PROBE % {'path': path}, env).stdout.strip().splitlines()[-1])
+        if sample['status'] >= 500:
+            raise click.ClickException(f"{path} answered {sample['status']}")
+        samples.append(sample)
+
+    results = {'runs': runs, 'path': path, 'python': sys.version.split()[0]}
+    click.echo(f"{'phase':<18}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = [sample[phase] for sample in samples]
+        results[phase] = {'median': round(statistics.median(values), 2),
+                          'min': round(min(values), 2), 'max': round(max(values), 2)}
+        click.echo(f"{phase[:-3]:<18}{results[phase]['median']:>12}{results[phase]['min']:>10}"
+                   f"{results[phase]['max']:>10}")
+
+    if importtime:
+        # -X importtime writes "self | cumulative | module" lines to stderr
+        lines = _run('import app', env, ('-X', 'importtime')).stderr.splitlines()
+        rows = []
+        for line in lines:
+            parts = line.split('|')
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                rows.append((int(parts[1]), parts[2].rstrip()))
+        rows.sort(reverse=True)
+        results['slowest_imports'] = [{'module': name.strip(), 'cumulative_ms': round(us / 1000, 1)}
+                                      for us, name in rows[:importtime]]
+        click.echo('\nslowest imports (cumulative ms)')
+        for us, name in rows[:importtime]:
+            click.echo(f'{us / 1000:>10.1f}  {name}')
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f'Wrote {output}')
+
+    if budget_ms is not None and results['total_ms']['median'] > budget_ms:
+        click.echo(f"Median startup {results['total_ms']['median']} ms is over the {budget_ms} ms budget.", err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
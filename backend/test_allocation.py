@@ -0,0 +1,150 @@
+"""
+test_allocation.py - Tests for splitting donations without a need across open needs
+Shares must add up to the donation and buy whole items, with the cents left
+over carried on a need as credit toward its next item.
+"""
+import pytest
+
+from allocation import allocator, NeedSnapshot, _load_numpy
+from conftest import login_as
+from extensions import db
+from models import User, School, Need, Donation, DonationAllocation, LiveUpdate
+
+
+def _seed(app, *needs):
+    """Add a verified school with approved needs given as (urgency, total_needed, cost_per_item)."""
+    with app.app_context():
+        user = User(email='allocator@equilearn.org', password_hash='x', name='General Donor')
+        school = School(name='Split School', location='rural', city='Springfield', state='IL', verified=True)
+        db.session.add_all([user, school])
+        db.session.flush()
+        rows = [Need(school_id=school.id, title='Need %d' % n, description='Need', category='Supplies',
+                     urgency=urgency, total_needed=total, current_donations=0, cost_per_item=cost, status='approved')
+                for n, (urgency, total, cost) in enumerate(needs)]
+        db.session.add_all(rows)
+        db.session.commit()
+        allocator.reset()
+        return user.id, [need.id for need in rows]
+
+
+def _snapshot(app):
+    with app.app_context():
+        snapshot = NeedSnapshot(_load_numpy())
+        snapshot.load()
+        return snapshot
+
+
+def _fill(app, need_id, log_id):
+    """Fund a need to its total and log it under ``log_id``, as a write committing now would."""
+    with app.app_context():
+        need = db.session.get(Need, need_id)
+        need.current_donations = need.total_needed
+        db.session.add(LiveUpdate(id=log_id, topic='school:%d' % need.school_id, kind='need', item_id=need_id,
+                                  payload='{}'))
+        db.session.commit()
+
+
+def test_sync_reads_log_rows_that_commit_out_of_order(app):
+    _, (first, second, third) = _seed(app, ('high', 10, 5), ('low', 10, 5), ('low', 10, 5))
+    _fill(app, third, 1)
+    snapshot = _snapshot(app)
+
+    # Log id 3 commits before id 2, whose transaction was still open
+    _fill(app, second, 3)
+    with app.app_context():
+        assert snapshot.sync()
+    assert snapshot.gap[snapshot.positions[second]] == 0
+    _fill(app, first, 2)
+    with app.app_context():
+        assert snapshot.sync()
+    assert snapshot.gap[snapshot.positions[first]] == 0
+
+
+def _check_split(snapshot, amount, fanout, before):
+    split = snapshot.split(amount, fanout)
+    assert sum(share for _, share, _ in split) == pytest.approx(amount)
+    for need_id, share, items in split:
+        position = snapshot.positions[need_id]
+        cost = snapshot.cost[position]
+        # The share pays for its items, give or take the credit held before and after
+        carried = snapshot.credit[position] - before[need_id]
+        assert items * cost == pytest.approx(share - carried)
+        assert 0 <= snapshot.credit[position] < cost
+    return split
+
+
+def test_split_buys_whole_items(app):
+    _, (laptops, kits) = _seed(app, ('high', 10, 300), ('high', 10, 150))
+    snapshot = _snapshot(app)
+
+    split = _check_split(snapshot, 500, 5, {laptops: 0, kits: 0})
+
+    # $500 buys one $300 laptop and one $150 kit; the last $50 waits as credit
+    assert sum(items for _, _, items in split) == 2
+    assert sum(snapshot.credit) == pytest.approx(50)
+
+
+def test_split_shares_add_up_over_many_donations(app):
+    _, need_ids = _seed(app, ('high', 40, 12.5), ('medium', 25, 33), ('low', 60, 7.25), ('high', 5, 99.99))
+    snapshot = _snapshot(app)
+    items_before = dict(zip(need_ids, snapshot.gap.tolist()))
+
+    total = 0.0
+    for amount in (3.5, 20, 47.13, 101, 250, 9.99, 0.01, 75):
+        before = {need_id: snapshot.credit[snapshot.positions[need_id]] for need_id in need_ids}
+        total += sum(share for _, share, _ in _check_split(snapshot, amount, 3, before))
+
+    # Every dollar went to items or is still held as credit
+    spent = sum((items_before[need_id] - snapshot.gap[snapshot.positions[need_id]])
+                * snapshot.cost[snapshot.positions[need_id]] for need_id in need_ids)
+    assert spent + sum(snapshot.credit) == pytest.approx(total)
+
+
+def test_split_stops_at_the_gap(app):
+    _, (need_id,) = _seed(app, ('high', 2, 40))
+    snapshot = _snapshot(app)
+
+    split = snapshot.split(500, 5)
+
+    assert split == [(need_id, 80.0, 2)]
+    assert snapshot.split(10, 5) == []
+
+
+def test_general_donation_counts_as_whole_items(app):
+    user_id, (laptops, kits) = _seed(app, ('high', 10, 300), ('high', 10, 150))
+    client = app.test_client()
+    login_as(client, user_id)
+
+    response = client.post('/api/donations', json={'amount': 500, 'donation_type': 'general'})
+    assert response.status_code == 201
+    allocations = response.get_json()['allocations']
+    assert sum(share['amount'] for share in allocations) == pytest.approx(500)
+
+    with app.app_context():
+        needs = {need.id: need for need in Need.query.all()}
+        assert needs[laptops].current_donations + needs[kits].current_donations == 2
+        assert sum(need.allocation_credit for need in needs.values()) == pytest.approx(50)
+    # The $50 waits on the $300 laptops, so $250 more completes one
+    client.post('/api/donations', json={'amount': 250, 'donation_type': 'general'})
+    with app.app_context():
+        assert sum(need.current_donations for need in Need.query.all()) == 3
+        assert sum(need.allocation_credit for need in Need.query.all()) == pytest.approx(0)
+
+
+def test_allocate_queued_records_every_dollar(app):
+    user_id, need_ids = _seed(app, ('high', 50, 20), ('medium', 50, 35), ('low', 50, 8))
+    with app.app_context():
+        db.session.add_all([Donation(donor_id=user_id, amount=amount, donation_type='general')
+                            for amount in (15, 60, 42.5, 7, 130)])
+        db.session.commit()
+
+        report = allocator.allocate_queued(chunk_size=2)
+
+        assert report.donations == 5
+        assert report.amount == pytest.approx(254.5)
+        allocated = db.session.query(db.func.sum(DonationAllocation.amount)).scalar()
+        assert allocated == pytest.approx(254.5)
+        needs = Need.query.filter(Need.id.in_(need_ids)).all()
+        assert (sum(need.current_donations * need.cost_per_item for need in needs)
+                + sum(need.allocation_credit for need in needs)) == pytest.approx(254.5)
+        assert Donation.query.filter(Donation.allocated_at.is_(None)).count() == 0
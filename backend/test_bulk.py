@@ -0,0 +1,205 @@
+"""
+test_bulk.py - Tests for the streaming donation and school importers
+Feeds NDJSON and CSV through iter_records and checks what was written and
+what the import report says about the rows that were not.
+"""
+import io
+import json
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+import bulk
+from bulk import import_donations, import_schools, iter_records
+from extensions import db
+from models import Donation, DonorTotals, ImpactStats, Need, School, User
+
+
+def _ndjson(*records):
+    return io.BytesIO(''.join(json.dumps(record) + '\n' for record in records).encode())
+
+
+def _seed_need(app, total_needed=10, cost_per_item=5):
+    with app.app_context():
+        donor = User(email='bulk@equilearn.org', password_hash='x', name='Bulk Donor')
+        school = School(name='Bulk School', location='urban', city='Springfield', state='IL', verified=True)
+        db.session.add_all([donor, school])
+        db.session.flush()
+        need = Need(school_id=school.id, title='Books', description='Books', category='Books', urgency='high',
+                    total_needed=total_needed, current_donations=0, cost_per_item=cost_per_item, status='approved')
+        db.session.add(need)
+        db.session.commit()
+        return donor.id, need.id
+
+
+def test_imports_donations_and_their_totals(app):
+    donor_id, need_id = _seed_need(app)
+    with app.app_context():
+        report = import_donations(iter_records(_ndjson(
+            {'amount': 20, 'donation_type': 'direct', 'need_id': need_id, 'donor_id': donor_id},
+            {'amount': 100, 'donation_type': 'direct', 'need_id': need_id},
+            {'amount': 7.5, 'donation_type': 'general', 'donor_name': 'Guest'},
+            {'amount': 5, 'donation_type': 'direct', 'need_id': 999},
+            {'amount': 5, 'donation_type': 'direct', 'donor_id': 999},
+        ), 'ndjson'), chunk_size=2).to_dict()
+
+        assert (report['rows'], report['inserted'], report['failed']) == (5, 3, 2)
+        assert [error['line'] for error in report['errors']] == [4, 5]
+        assert Donation.query.count() == 3
+        # 4 + 20 items, clamped to the 10 needed
+        assert db.session.get(Need, need_id).current_donations == 10
+        assert db.session.get(ImpactStats, 1).total_donations == 127.5
+        assert db.session.get(DonorTotals, donor_id).donations_total == 20
+
+
+def test_rejects_amounts_that_are_not_finite(app):
+    _seed_need(app)
+    csv = io.BytesIO(b'amount,donation_type\nnan,general\ninf,general\n-inf,general\n0,general\n12,general\n')
+    ndjson = io.BytesIO(b'{"amount": NaN, "donation_type": "general"}\n'
+                        b'{"amount": Infinity, "donation_type": "general"}\n')
+    with app.app_context():
+        from_csv = import_donations(iter_records(csv, 'csv')).to_dict()
+        from_ndjson = import_donations(iter_records(ndjson, 'ndjson')).to_dict()
+
+        assert (from_csv['inserted'], from_csv['failed']) == (1, 4)
+        assert {error['error'] for error in from_csv['errors']} == {'amount must be a positive number'}
+        assert (from_ndjson['inserted'], from_ndjson['failed']) == (0, 2)
+        assert db.session.get(ImpactStats, 1).total_donations == 12
+
+
+def test_failed_chunk_is_reported_and_the_rest_import(app, monkeypatch):
+    donor_id, need_id = _seed_need(app, total_needed=100)
+    calls = []
+    bump = bulk.bump_impact_stats
+
+    def fail_second_chunk(**deltas):
+        calls.append(deltas)
+        if len(calls) == 2:
+            raise OperationalError('UPDATE impact_stats', {}, Exception('database is locked'))
+        bump(**deltas)
+
+    monkeypatch.setattr(bulk, 'bump_impact_stats', fail_second_chunk)
+    with app.app_context():
+        report = import_donations(iter_records(_ndjson(
+            *({'amount': 5, 'donation_type': 'direct', 'need_id': need_id} for _ in range(5)),
+            {'amount': 5, 'donation_type': 'direct', 'need_id': 999},
+        ), 'ndjson'), chunk_size=2).to_dict()
+
+        assert (report['rows'], report['inserted'], report['chunks'], report['failed']) == (6, 3, 2, 3)
+        assert [error['line'] for error in report['errors']] == [3, 4, 6]
+        assert 'database is locked' in report['errors'][0]['error']
+        assert report['errors'][2]['error'] == 'need 999 does not exist'
+        # The failed chunk left nothing behind
+        assert Donation.query.count() == 3
+        assert db.session.get(Need, need_id).current_donations == 3
+        assert db.session.get(ImpactStats, 1).total_donations == 15
+
+
+def _school(name, needs=(), **fields):
+    return dict({'name': name, 'location': 'rural', 'city': 'Springfield', 'state': 'IL', 'needs': list(needs)},
+                **fields)
+
+
+def _need(title, **fields):
+    return dict({'title': title, 'description': title, 'category': 'Books', 'urgency': 'high',
+                 'total_needed': 10, 'cost_per_item': 2.5}, **fields)
+
+
+def test_imports_schools_with_their_needs(app):
+    with app.app_context():
+        db.session.add(School(name='Existing', location='urban', city='Springfield', state='IL'))
+        db.session.commit()
+
+        report = import_schools(iter_records(_ndjson(
+            _school('Maple', [_need('Books', status='approved'), _need('Pencils')], verified=True),
+            _school('Existing', [_need('Chairs')]),
+            _school('Maple', [_need('Globes')]),
+            _school('Oak', [_need('Desks', cost_per_item='NaN')]),
+            _school('Oak', [_need('Desks', total_needed=0)]),
+            {'name': 'Birch', 'city': 'Springfield'},
+            _school('Pine'),
+        ), 'ndjson'), chunk_size=2).to_dict()
+
+        assert (report['schools_inserted'], report['schools_existing'], report['needs_inserted']) == (2, 1, 4)
+        assert [error['line'] for error in report['errors']] == [4, 5, 6]
+        assert report['errors'][2]['error'] == 'missing location, state'
+        maple = School.query.filter_by(name='Maple').one()
+        # The repeated row added its need to the school the first row created
+        assert sorted(need.title for need in Need.query.filter_by(school_id=maple.id)) == ['Books', 'Globes', 'Pencils']
+        existing = School.query.filter_by(name='Existing').one()
+        assert [need.title for need in Need.query.filter_by(school_id=existing.id)] == ['Chairs']
+        stats = db.session.get(ImpactStats, 1)
+        assert (stats.schools_helped, stats.needs_funded) == (1, 1)
+
+
+def test_imports_schools_from_csv_rows(app):
+    csv = io.BytesIO(b'name,location,city,state,verified,need_title,need_description,need_category,need_urgency,'
+                     b'need_total_needed,need_cost_per_item\n'
+                     b'Cedar,urban,Springfield,IL,yes,Laptops,Laptops,Technology,high,5,300\n'
+                     b'Cedar,urban,Springfield,IL,yes,Mice,Mice,Technology,low,5,10\n'
+                     b'Elm,urban,Springfield,IL,no,,,,,,\n')
+    with app.app_context():
+        report = import_schools(iter_records(csv, 'csv')).to_dict()
+
+        assert (report['schools_inserted'], report['needs_inserted'], report['failed']) == (2, 2, 0)
+        cedar = School.query.filter_by(name='Cedar').one()
+        assert cedar.verified
+        assert Need.query.filter_by(school_id=cedar.id).count() == 2
+        assert not School.query.filter_by(name='Elm').one().verified
+
+
+def test_school_chunk_is_one_insert(app):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO school '):
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            report = import_schools(iter_records(_ndjson(*(_school(f'School {i}') for i in range(100))), 'ndjson'))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert report.counts['schools_inserted'] == School.query.count() == 100
+        assert len(statements) == 1
+
+
+def test_failed_school_chunk_is_reported_and_the_rest_import(app, monkeypatch):
+    calls = []
+    bump = bulk.bump_impact_stats
+
+    def fail_second_chunk(**deltas):
+        calls.append(deltas)
+        if len(calls) == 2:
+            raise OperationalError('UPDATE impact_stats', {}, Exception('database is locked'))
+        bump(**deltas)
+
+    monkeypatch.setattr(bulk, 'bump_impact_stats', fail_second_chunk)
+    with app.app_context():
+        report = import_schools(iter_records(_ndjson(
+            _school('Maple', [_need('Books')], verified=True),
+            _school('Oak', [_need('Desks')], verified=True),
+            _school('Pine', [_need('Chairs')], verified=True),
+            _school('Elm', [_need('Maps')], verified=True),
+            # Pine was rolled back with its chunk, so this row inserts it again
+            _school('Pine', [_need('Globes')], verified=True),
+            _school('Maple', [_need('Pens')], verified=True),
+        ), 'ndjson'), chunk_size=2).to_dict()
+
+        assert (report['schools_inserted'], report['needs_inserted'], report['chunks'], report['failed']) == (3, 4, 2, 2)
+        assert [error['line'] for error in report['errors']] == [3, 4]
+        assert 'database is locked' in report['errors'][0]['error']
+        assert sorted(school.name for school in School.query) == ['Maple', 'Oak', 'Pine']
+        assert sorted(need.title for need in Need.query) == ['Books', 'Desks', 'Globes', 'Pens']
+        assert db.session.get(ImpactStats, 1).schools_helped == 3
+
+
+def test_dry_run_writes_nothing(app):
+    with app.app_context():
+        report = import_schools(iter_records(_ndjson(_school('Maple', [_need('Books')])), 'ndjson'),
+                                dry_run=True).to_dict()
+
+        assert (report['dry_run'], report['schools_inserted'], report['needs_inserted']) == (True, 1, 1)
+        assert School.query.count() == Need.query.count() == 0
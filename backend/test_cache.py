@@ -0,0 +1,207 @@
+"""
+test_cache.py - Tests for the response cache and its invalidation
+Covers conditional GETs and the write handlers dropping the bodies they
+change. For sharing invalidations between worker processes, a second
+SharedInvalidation stands in for another gunicorn worker using the same database.
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from cache import SharedInvalidation
+from conftest import login_as
+from extensions import db, cache_sync, featured_cache, response_cache
+from models import CacheGeneration, ImpactStats, MicroDonationPool, Need, School, User
+
+
+def _seed(app):
+    with app.app_context():
+        admin = User(email='admin@equilearn.org', password_hash='x', name='Admin', role='admin')
+        donor = User(email='donor@equilearn.org', password_hash='x', name='Donor')
+        maple = School(name='Maple', location='rural', city='Springfield', state='IL', verified=True)
+        oak = School(name='Oak', location='urban', city='Springfield', state='IL', verified=False)
+        db.session.add_all([admin, donor, maple, oak, ImpactStats(id=1, total_donations=0, schools_helped=1,
+                                                                     needs_funded=1)])
+        db.session.flush()
+        books = Need(school_id=maple.id, title='Books', description='Books', category='Books', urgency='high',
+                     total_needed=10, current_donations=0, cost_per_item=5, status='approved')
+        chairs = Need(school_id=maple.id, title='Chairs', description='Chairs', category='Supplies',
+                      urgency='low', total_needed=10, current_donations=0, cost_per_item=5, status='pending')
+        desks = Need(school_id=oak.id, title='Desks', description='Desks', category='Supplies', urgency='low',
+                     total_needed=10, current_donations=0, cost_per_item=5, status='approved')
+        pool = MicroDonationPool(name='Pool', description='Pool', target_amount=100, current_amount=0,
+                                 participants=0, end_date=datetime.utcnow() + timedelta(days=7))
+        db.session.add_all([books, chairs, desks, pool])
+        db.session.commit()
+        return {'admin': admin.id, 'donor': donor.id, 'oak': oak.id, 'books': books.id, 'chairs': chairs.id,
+                'pool': pool.id}
+
+
+@pytest.fixture
+def no_sync(monkeypatch):
+    """Keep this worker from polling, so only the write handlers' own invalidations drop entries."""
+    monkeypatch.setattr(cache_sync, '_next_poll', float('inf'))
+
+
+def _cached_get(client, path):
+    """GET ``path`` twice, checking the second answer came from the cache, and return its JSON."""
+    client.get(path)
+    hits = response_cache.stats()['hits']
+    response = client.get(path)
+    assert response_cache.stats()['hits'] == hits + 1
+    return response.get_json()
+
+
+def _need_titles(client):
+    return [need['title'] for school in _cached_get(client, '/api/schools') for need in school['needs']]
+
+
+def test_conditional_get_answers_304(app, no_sync):
+    ids = _seed(app)
+    client = app.test_client()
+
+    first = client.get('/api/impact')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    not_modified = client.get('/api/impact', headers={'If-None-Match': etag})
+    assert (not_modified.status_code, not_modified.data) == (304, b'')
+
+    login_as(client, ids['donor'])
+    client.post('/api/donations', json={'amount': 5, 'donation_type': 'general'})
+    changed = client.get('/api/impact', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['total_donations'] == 5
+
+
+def test_donation_drops_impact_and_schools(app, no_sync):
+    ids = _seed(app)
+    client = app.test_client()
+    login_as(client, ids['donor'])
+    assert _cached_get(client, '/api/impact')['total_donations'] == 0
+    assert _cached_get(client, '/api/schools')[0]['needs'][0]['currentDonations'] == 0
+
+    client.post('/api/donations', json={'amount': 10, 'donation_type': 'direct', 'need_id': ids['books']})
+
+    assert _cached_get(client, '/api/impact')['total_donations'] == 10
+    assert _cached_get(client, '/api/schools')[0]['needs'][0]['currentDonations'] == 2
+
+
+def test_approving_a_need_drops_schools(app, no_sync):
+    ids = _seed(app)
+    client = app.test_client()
+    login_as(client, ids['admin'])
+    assert _need_titles(client) == ['Books']
+
+    assert client.post(f"/api/admin/needs/{ids['chairs']}/approve").status_code == 200
+
+    assert _need_titles(client) == ['Books', 'Chairs']
+    assert _cached_get(client, '/api/impact')['needs_funded'] == 2
+
+
+def test_verifying_a_school_drops_schools(app, no_sync):
+    ids = _seed(app)
+    client = app.test_client()
+    login_as(client, ids['admin'])
+    assert [school['name'] for school in _cached_get(client, '/api/schools')] == ['Maple']
+
+    assert client.post(f"/api/admin/schools/{ids['oak']}/verify").status_code == 200
+
+    assert [school['name'] for school in _cached_get(client, '/api/schools')] == ['Maple', 'Oak']
+    assert _cached_get(client, '/api/impact')['schools_helped'] == 2
+
+
+def test_joining_a_pool_drops_micro_pools(app, no_sync):
+    ids = _seed(app)
+    client = app.test_client()
+    login_as(client, ids['donor'])
+    assert _cached_get(client, '/api/micro-pools')[0]['currentAmount'] == 0
+
+    assert client.post('/api/micro-pools/join', json={'pool_id': ids['pool'], 'amount': 3}).status_code == 200
+
+    pools = _cached_get(client, '/api/micro-pools')
+    assert (pools[0]['currentAmount'], pools[0]['participants']) == (3, 1)
+
+
+def _worker(app):
+    other = Flask('other_worker')
+    other.config['CACHE_SYNC_MS'] = 1
+    worker = SharedInvalidation()
+    with app.app_context():
+        worker.init_app(other, db, CacheGeneration)
+    return worker
+
+
+def _poll(worker):
+    time.sleep(worker.interval * 2)
+    worker.poll()
+
+
+def test_published_tags_reach_other_workers(app):
+    worker = _worker(app)
+    dropped = []
+    worker.subscribe(dropped.append)
+    with app.app_context():
+        worker.poll()
+
+        cache_sync.publish('impact', 'featured_schools:Springfield')
+        cache_sync.publish('micro_pools')
+        _poll(worker)
+        assert dropped == [{'impact', 'featured_schools:Springfield', 'micro_pools'}]
+
+        # Nothing new since the last poll
+        _poll(worker)
+        assert len(dropped) == 1
+        cache_sync.publish('impact')
+        _poll(worker)
+        assert dropped[1] == {'impact'}
+
+
+def test_write_in_another_worker_drops_cached_responses(app):
+    client = app.test_client()
+    with app.app_context():
+        db.session.add(ImpactStats(id=1, total_donations=10, schools_helped=1, needs_funded=1))
+        db.session.commit()
+    # Let this request poll, so the next poll is a full interval away
+    time.sleep(cache_sync.interval)
+    assert client.get('/api/impact').get_json()['total_donations'] == 10
+    featured_cache.set(('Springfield', None), b'[]')
+
+    worker = _worker(app)
+    with app.app_context():
+        # What another worker's donation write does: commit, then invalidate
+        db.session.get(ImpactStats, 1).total_donations = 25
+        db.session.commit()
+        worker.publish('impact', 'featured_schools:Springfield')
+
+    # Until this worker polls it keeps serving its cached copy
+    assert client.get('/api/impact').get_json()['total_donations'] == 10
+    time.sleep(cache_sync.interval)
+    assert client.get('/api/impact').get_json()['total_donations'] == 25
+    assert featured_cache.get(('Springfield', None)) is None
+
+
+def test_failed_publish_is_sent_later(app, monkeypatch):
+    worker = _worker(app)
+    dropped = []
+    worker.subscribe(dropped.append)
+    stamp = cache_sync._stamp
+
+    def locked(tags):
+        raise OperationalError('INSERT INTO cache_generation', {}, Exception('database is locked'))
+
+    with app.app_context():
+        worker.poll()
+        monkeypatch.setattr(cache_sync, '_stamp', locked)
+        # The write already committed, so the request must not fail
+        cache_sync.publish('impact')
+        _poll(worker)
+        assert dropped == []
+
+        monkeypatch.setattr(cache_sync, '_stamp', stamp)
+        cache_sync.publish('schools')
+        _poll(worker)
+        assert dropped == [{'impact', 'schools'}]
@@ -0,0 +1,101 @@
+"""
+test_concurrency.py - Stress tests for concurrent donation and pool writes
+Fires thousands of parallel requests through the Flask test client and checks
+that the counters they increment end up exactly right. On a loaded machine
+some writes may time out on the SQLite lock and get a 503; the totals must
+then match exactly the requests that succeeded.
+"""
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+import app as app_module
+from conftest import login_as
+from extensions import db
+from models import User, School, Need, FeaturedSchool, MicroDonationPool, ImpactStats
+
+WORKERS = 16
+REQUESTS = 1000
+
+
+def _seed(app, total_needed):
+    with app.app_context():
+        user = User(email='stress@equilearn.org', password_hash='x', name='Stress Donor')
+        school = School(name='Stress School', location='urban', city='Springfield', state='IL', verified=True)
+        db.session.add_all([user, school])
+        db.session.flush()
+        need = Need(school_id=school.id, title='Pencils', description='Pencils', category='Supplies',
+                    urgency='high', total_needed=total_needed, current_donations=0, cost_per_item=1, status='approved')
+        featured = FeaturedSchool(city='Springfield', name='Featured', funding_goal=10 ** 9, current_funding=0)
+        pool = MicroDonationPool(name='Pool', description='Pool', target_amount=10 ** 9, current_amount=0,
+                                 participants=0, end_date=datetime.utcnow() + timedelta(days=30))
+        db.session.add_all([need, featured, pool])
+        db.session.commit()
+        return user.id, need.id, featured.id, pool.id
+
+
+def _fire(app, user_id, count, path, payload):
+    def worker(n):
+        client = app.test_client()
+        login_as(client, user_id)
+        return [client.post(path, json=payload).status_code for _ in range(n)]
+
+    share = [count // WORKERS + (1 if i < count % WORKERS else 0) for i in range(WORKERS)]
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        statuses = [status for batch in pool.map(worker, share) for status in batch]
+    assert len(statuses) == count
+    return statuses
+
+
+def test_parallel_writes_keep_exact_totals(app):
+    user_id, need_id, featured_id, pool_id = _seed(app, total_needed=10 ** 9)
+
+    donations = _fire(app, user_id, REQUESTS, '/api/donations',
+                      {'amount': 1, 'donation_type': 'direct', 'need_id': need_id})
+    featured = _fire(app, user_id, REQUESTS, '/api/featured-schools/donate',
+                     {'school_id': featured_id, 'amount': 1})
+    joins = _fire(app, user_id, REQUESTS, '/api/micro-pools/join',
+                  {'pool_id': pool_id, 'amount': 1})
+    assert set(donations + featured + joins) <= {200, 201, 503}
+    donated, funded, joined = (sum(status < 300 for status in statuses) for statuses in (donations, featured, joins))
+    assert donated and funded and joined
+
+    with app.app_context():
+        assert db.session.get(Need, need_id).current_donations == donated
+        assert db.session.get(FeaturedSchool, featured_id).current_funding == funded
+        pool = db.session.get(MicroDonationPool, pool_id)
+        assert pool.current_amount == joined
+        # Every join came from one user, who counts once
+        assert pool.participants == 1
+        assert db.session.get(ImpactStats, 1).total_donations == donated
+
+
+def test_parallel_donations_clamp_to_total_needed(app):
+    user_id, need_id, _, _ = _seed(app, total_needed=25)
+
+    statuses = _fire(app, user_id, 200, '/api/donations',
+                     {'amount': 1, 'donation_type': 'direct', 'need_id': need_id})
+    assert set(statuses) <= {201, 503}
+    assert statuses.count(201) >= 25
+
+    with app.app_context():
+        assert db.session.get(Need, need_id).current_donations == 25
+
+
+def test_lock_timeout_is_a_retryable_503(app, monkeypatch):
+    user_id, need_id, _, _ = _seed(app, total_needed=10)
+
+    def locked(**deltas):
+        raise OperationalError('UPDATE impact_stats', {}, sqlite3.OperationalError('database is locked'))
+
+    monkeypatch.setattr(app_module, 'bump_impact_stats', locked)
+    client = app.test_client()
+    login_as(client, user_id)
+    response = client.post('/api/donations', json={'amount': 1, 'donation_type': 'direct', 'need_id': need_id})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    with app.app_context():
+        assert db.session.get(Need, need_id).current_donations == 0
@@ -0,0 +1,46 @@
+"""
+test_featured.py - Tests for generating and searching featured schools
+"""
+from extensions import db
+from featured import clear_featured_city, need_keywords
+from models import FeaturedSchool, FeaturedSchoolKeyword, FeaturedSchoolNeed
+
+
+def _names(response):
+    return sorted(school['name'] for school in response.get_json())
+
+
+def test_need_keywords_start_at_every_word():
+    assert need_keywords('STEM kits') == ['stem kits', 'kits']
+    assert need_keywords('Art & craft supplies') == ['art & craft supplies', 'craft supplies', 'supplies']
+    assert need_keywords('') == []
+
+
+def test_search_matches_any_word_of_a_need(app):
+    client = app.test_client()
+    assert client.get('/api/featured-schools?city=Springfield').status_code == 200
+
+    # Generated needs include 'STEM kits', 'library books' and 'environmental science kits'
+    kits = _names(client.get('/api/featured-schools/search?need=kits'))
+    assert kits == _names(client.get('/api/featured-schools/search?need=KIT&city=Springfield'))
+    assert len(kits) == 2
+    assert _names(client.get('/api/featured-schools/search?need=stem k')) == _names(
+        client.get('/api/featured-schools/search?need=STEM'))
+    assert len(_names(client.get('/api/featured-schools/search?need=books'))) == 1
+    assert _names(client.get('/api/featured-schools/search?need=library books')) == _names(
+        client.get('/api/featured-schools/search?need=books'))
+    # Words match from their start only
+    assert client.get('/api/featured-schools/search?need=oks').get_json() == []
+    assert client.get('/api/featured-schools/search?need=kits&city=Shelbyville').get_json() == []
+
+
+def test_clearing_a_city_removes_its_keywords(app):
+    client = app.test_client()
+    client.get('/api/featured-schools?city=Springfield')
+
+    with app.app_context():
+        assert FeaturedSchoolKeyword.query.count() > 0
+        clear_featured_city('Springfield')
+        db.session.commit()
+        assert FeaturedSchool.query.count() == FeaturedSchoolNeed.query.count() == 0
+        assert FeaturedSchoolKeyword.query.count() == 0
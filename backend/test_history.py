@@ -0,0 +1,90 @@
+"""
+test_history.py - Tests for the merged donation history behind GET /api/donations
+Walks the timeline page by page, including timestamp ties between and within
+sources, and checks that no item is skipped or repeated.
+"""
+from datetime import datetime, timedelta
+
+from conftest import login_as
+from extensions import db
+from models import (User, Donation, FeaturedSchool, FeaturedSchoolDonation, MicroDonationPool,
+                    MicroDonationPoolJoin)
+
+START = datetime(2026, 1, 1, 12, 0)
+
+
+def _seed(app):
+    """A donor with need donations, featured donations and pool joins, several at the same instant."""
+    with app.app_context():
+        donor = User(email='history@equilearn.org', password_hash='x', name='History Donor')
+        other = User(email='other@equilearn.org', password_hash='x', name='Other Donor')
+        featured = FeaturedSchool(city='Springfield', name='Featured', funding_goal=1000, current_funding=0)
+        pool = MicroDonationPool(name='Pool', description='Pool', target_amount=1000, current_amount=0,
+                                 participants=0, end_date=START + timedelta(days=30))
+        db.session.add_all([donor, other, featured, pool])
+        db.session.flush()
+        # Minutes 0-2 each hold one row per source; minute 1 also has a second need donation
+        for minute in (0, 1, 1, 2, 3, 4):
+            db.session.add(Donation(donor_id=donor.id, amount=minute + 1, donation_type='general',
+                                    created_at=START + timedelta(minutes=minute)))
+        for minute in (0, 1, 2):
+            db.session.add(FeaturedSchoolDonation(user_id=donor.id, school_id=featured.id, amount=10,
+                                                  created_at=START + timedelta(minutes=minute)))
+            db.session.add(MicroDonationPoolJoin(user_id=donor.id, pool_id=pool.id, amount=1,
+                                                 joined_at=START + timedelta(minutes=minute)))
+        db.session.add(Donation(donor_id=other.id, amount=99, donation_type='general', created_at=START))
+        db.session.commit()
+        return donor.id
+
+
+def _walk(client, query, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        response = client.get(f'/api/donations?limit={limit}{query}' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        items += response.get_json()
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return items, pages
+
+
+def test_pages_cover_the_timeline_exactly_once(app):
+    client = app.test_client()
+    login_as(client, _seed(app))
+
+    everything, _ = _walk(client, '', 100)
+    assert len(everything) == 12
+    order = [(item['created_at'], {'need': 2, 'featured': 1, 'pool': 0}[item['type']], item['source_id'])
+             for item in everything]
+    assert order == sorted(order, reverse=True)
+    assert 99 not in [item['amount'] for item in everything]
+
+    for limit in (1, 2, 5):
+        paged, pages = _walk(client, '', limit)
+        assert [item['id'] for item in paged] == [item['id'] for item in everything]
+        assert pages == -(-len(everything) // limit)
+
+
+def test_filters_by_type_and_date_range(app):
+    client = app.test_client()
+    login_as(client, _seed(app))
+
+    pools_and_featured, _ = _walk(client, '&type=pool,featured', 2)
+    assert len(pools_and_featured) == 6
+    assert {item['type'] for item in pools_and_featured} == {'pool', 'featured'}
+
+    start, end = (START + timedelta(minutes=1)).isoformat(), (START + timedelta(minutes=2)).isoformat()
+    minute_one, _ = _walk(client, f'&start={start}&end={end}', 2)
+    assert len(minute_one) == 4
+    assert {item['created_at'] for item in minute_one} == {start}
+
+
+def test_rejects_bad_parameters(app):
+    client = app.test_client()
+    login_as(client, _seed(app))
+
+    assert client.get('/api/donations?type=gift').status_code == 400
+    assert client.get('/api/donations?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/donations?start=yesterday').status_code == 400
+    assert app.test_client().get('/api/donations').status_code == 401
@@ -0,0 +1,137 @@
+"""
+test_live.py - Tests for the live progress change log and its poller
+Each test drives its own LiveHub by calling poll() directly; its poller thread
+is given a tick long enough that it never runs during the test.
+"""
+import json
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from extensions import db
+from live import LiveHub, pool_update
+from models import LiveUpdate, MicroDonationPool
+
+
+def _hub(**config):
+    hub = LiveHub()
+    worker = Flask('live_worker')
+    worker.config.update({'LIVE_TICK_MS': 3600 * 1000}, **config)
+    hub.init_app(worker)
+    return hub
+
+
+def _update(kind, item_id, **values):
+    return {'kind': kind, 'id': item_id, **values}
+
+
+def _events(subscription):
+    """The payloads of every progress batch waiting for ``subscription``."""
+    batches = []
+    while not subscription.queue.empty():
+        chunk = subscription.queue.get_nowait()
+        assert chunk.startswith('event: progress\ndata: ')
+        batches.append(json.loads(chunk.split('data: ', 1)[1]))
+    return batches
+
+
+def _log(*ids):
+    """Commit log rows with chosen ids, as if their transactions committed in this order."""
+    db.session.add_all([LiveUpdate(id=row_id, topic='pool:1', kind='pool', item_id=row_id,
+                                   payload=json.dumps(_update('pool', row_id))) for row_id in ids])
+    db.session.commit()
+
+
+def test_poll_sends_the_latest_totals_per_topic(app):
+    hub = _hub()
+    with app.app_context():
+        school = hub.subscribe('school:1')
+        pool = hub.subscribe('pool:2')
+        hub.record(('school:1', _update('need', 10, currentDonations=1)),
+                   ('school:1', _update('need', 11, currentDonations=4)),
+                   ('school:1', _update('need', 10, currentDonations=3)),
+                   ('school:9', _update('need', 90, currentDonations=1)))
+        db.session.commit()
+
+        assert hub.poll() == 4
+        assert _events(school) == [[_update('need', 10, currentDonations=3), _update('need', 11, currentDonations=4)]]
+        assert _events(pool) == []
+
+        # Uncommitted rows are not read, and nothing is read twice
+        hub.record(('pool:2', _update('pool', 2, currentAmount=5)))
+        assert hub.poll() == 0
+        db.session.commit()
+        assert hub.poll() == 1
+        assert hub.poll() == 0
+        assert _events(pool) == [[_update('pool', 2, currentAmount=5)]]
+        assert hub.stats()['subscribers'] == 2
+
+
+def test_stream_starts_with_a_snapshot_and_drops_slow_clients(app):
+    hub = _hub(LIVE_MAX_PENDING=1)
+    with app.app_context():
+        subscription = hub.subscribe('pool:1')
+        body = hub.stream(subscription, [{'kind': 'pool', 'id': 1}])
+        assert next(body) == 'retry: 3000\nevent: snapshot\ndata: [{"kind":"pool","id":1}]\n\n'
+
+        hub.record(('pool:1', _update('pool', 1, currentAmount=5)))
+        db.session.commit()
+        hub.poll()
+        assert next(body) == 'event: progress\ndata: [{"kind":"pool","id":1,"currentAmount":5}]\n\n'
+
+        # The client stops reading and a second batch overflows its queue
+        for amount in (6, 7):
+            hub.record(('pool:1', _update('pool', 1, currentAmount=amount)))
+            db.session.commit()
+            hub.poll()
+        assert list(body) == []
+        assert hub.stats()['dropped'] == 1
+        assert hub.stats()['subscribers'] == 0
+
+
+def test_rows_that_commit_out_of_id_order_are_still_sent(app):
+    hub = _hub()
+    with app.app_context():
+        _log(4)
+        # Row 3 is still uncommitted when the poller starts
+        subscription = hub.subscribe('pool:1')
+        _log(3)
+        assert hub.poll() == 1
+
+        _log(5, 8)
+        assert hub.poll() == 2
+        _log(7)
+        assert hub.poll() == 1
+        _log(6)
+        assert hub.poll() == 1
+        assert [[update['id'] for update in batch] for batch in _events(subscription)] == [[3], [5, 8], [7], [6]]
+
+
+def test_gaps_are_given_up_after_a_while(app):
+    hub = _hub(LIVE_GAP_SECONDS=0)
+    with app.app_context():
+        subscription = hub.subscribe('pool:1')
+        _log(1, 3)
+        assert hub.poll() == 2
+        # Row 2 was rolled back, or committed too late to be looked for
+        _log(2)
+        assert hub.poll() == 0
+        assert len(_events(subscription)) == 1
+
+
+def test_live_route_opens_with_a_snapshot(app):
+    client = app.test_client()
+    with app.app_context():
+        pool = MicroDonationPool(name='Pool', description='Pool', target_amount=100, current_amount=40,
+                                 participants=3, end_date=datetime.utcnow() + timedelta(days=7))
+        db.session.add(pool)
+        db.session.commit()
+        pool_id, expected = pool.id, pool_update(pool)[1]
+
+    assert client.get('/api/live').status_code == 400
+    assert client.get('/api/live?pool=abc').status_code == 400
+    response = client.get(f'/api/live?pool={pool_id}', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    first = next(response.response).decode()
+    response.close()
+    assert json.loads(first.split('data: ', 1)[1]) == [expected]
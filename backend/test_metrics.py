@@ -0,0 +1,29 @@
+"""
+test_metrics.py - Tests for the per-request SQL instrumentation
+Checks that statement timing survives statements that raise and that requests
+are counted in the /metrics output.
+"""
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+
+def test_failed_statements_leave_nothing_on_the_connection(app):
+    with app.app_context(), db.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            conn.rollback()
+        assert not conn.info.get('metrics_started')
+        assert conn.exec_driver_sql('SELECT 1').scalar() == 1
+
+
+def test_requests_and_their_statements_are_exported(app):
+    client = app.test_client()
+    assert client.get('/api/impact').status_code == 200
+
+    body = client.get('/metrics').get_data(as_text=True)
+    counted = [line for line in body.splitlines()
+               if line.startswith('equilearn_db_statements_total{') and 'get_impact_stats' in line]
+    assert counted and float(counted[0].rsplit(' ', 1)[1]) >= 1
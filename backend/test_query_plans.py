@@ -0,0 +1,162 @@
+"""
+test_query_plans.py - EXPLAIN QUERY PLAN regression checks for the hot routes
+Calls each route against a seeded database, records the SQL it runs, and fails
+when SQLite plans any of those statements as a full table scan.
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from conftest import login_as
+from extensions import db, response_cache
+from models import (User, School, Need, Donation, FeaturedSchool, FeaturedSchoolNeed, FeaturedSchoolKeyword,
+                    FeaturedSchoolDonation, MicroDonationPool, MicroDonationPoolJoin)
+from aggregates import rebuild_impact_stats
+
+SCHOOLS = 400
+NEEDS_PER_SCHOOL = 5
+DONORS = 50
+DONATIONS = 4000
+CITIES = ('Springfield', 'Shelbyville', 'Ogdenville', 'Capital City')
+
+ADMIN_ID = 1
+DONOR_ID = 2
+
+# "SCAN need" is a full scan; "SCAN need USING [COVERING] INDEX ..." walks an index
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+# (method, path, logged-in user, body, tables the route may scan in full); str bodies are sent raw
+ROUTES = [
+    # Keyset pages walk the primary key in order and stop after one page
+    ('GET', '/api/schools', None, None, {'school'}),
+    ('GET', '/api/schools?city=Springfield&category=Books', None, None, {'school'}),
+    ('GET', '/api/impact', None, None, set()),
+    ('GET', '/api/featured-schools?city=Springfield', None, None, set()),
+    ('GET', '/api/featured-schools?city=Springfield&user_id=2', None, None, set()),
+    ('GET', '/api/featured-schools/search?need=stem', None, None, set()),
+    ('GET', '/api/featured-schools/search?need=kits', None, None, set()),
+    ('GET', '/api/micro-pools', None, None, set()),
+    # Search reads the FTS5 indexes; the rows shown are looked up by primary key
+    ('GET', '/api/search?q=scho', None, None, set()),
+    ('GET', '/api/search?q=need&type=needs&page=2&limit=20', None, None, set()),
+    ('GET', '/api/donations', DONOR_ID, None, set()),
+    ('GET', '/api/donations?type=need,pool', DONOR_ID, None, set()),
+    ('GET', '/api/donors/me/totals', DONOR_ID, None, set()),
+    ('GET', '/api/admin/needs/pending', ADMIN_ID, None, set()),
+    ('GET', '/api/admin/needs/pending?category=Books&school_id=7', ADMIN_ID, None, set()),
+    # The admin listing sorts every school; the need counts must come from an index
+    ('GET', '/api/admin/schools?sort=needs_count&order=desc', ADMIN_ID, None, {'school'}),
+    ('POST', '/api/donations', DONOR_ID, {'amount': 5, 'donation_type': 'direct', 'need_id': 3}, set()),
+    ('POST', '/api/donations', None, {'amount': 5, 'donation_type': 'general', 'donor_name': 'Guest'}, set()),
+    ('POST', '/api/featured-schools/donate', DONOR_ID, {'school_id': 1, 'amount': 5}, set()),
+    ('POST', '/api/micro-pools/join', DONOR_ID, {'pool_id': 1, 'amount': 5}, set()),
+    ('POST', '/api/admin/needs/4/approve', ADMIN_ID, None, set()),
+    ('POST', '/api/admin/needs/bulk', ADMIN_ID, {'action': 'reject', 'ids': [5, 10, 15]}, set()),
+    ('POST', '/api/admin/schools/verify', ADMIN_ID, {'ids': [2, 4, 6]}, set()),
+    ('POST', '/api/admin/schools/bulk?dry_run=1', ADMIN_ID,
+     '{"name": "School 8", "location": "urban", "city": "Springfield", "state": "IL"}\n', set()),
+    ('POST', '/login', None, {'email': 'donor@equilearn.org', 'password': 'wrong'}, set()),
+]
+
+
+def _seed():
+    now = datetime.utcnow()
+    db.session.execute(insert(User.__table__), [
+        {'id': ADMIN_ID, 'email': 'admin@equilearn.org', 'password_hash': 'x', 'name': 'Admin', 'role': 'admin'},
+        {'id': DONOR_ID, 'email': 'donor@equilearn.org', 'password_hash': 'x', 'name': 'Donor', 'role': 'donor'},
+    ] + [{'id': 10 + i, 'email': f'donor{i}@equilearn.org', 'password_hash': 'x', 'name': f'Donor {i}',
+          'role': 'donor'} for i in range(DONORS)])
+    db.session.execute(insert(School.__table__), [
+        {'id': i, 'name': f'School {i}', 'location': 'urban', 'city': CITIES[i % len(CITIES)], 'state': 'IL',
+         'description': '', 'verified': i % 3 != 0, 'created_at': now} for i in range(1, SCHOOLS + 1)])
+    db.session.execute(insert(Need.__table__), [
+        {'id': i, 'school_id': (i - 1) // NEEDS_PER_SCHOOL + 1, 'title': f'Need {i}', 'description': '',
+         'category': ('Books', 'Supplies', 'Technology')[i % 3], 'urgency': ('low', 'medium', 'high')[i % 3],
+         'total_needed': 100, 'current_donations': 0, 'cost_per_item': 1.0,
+         'status': ('pending', 'approved', 'approved', 'rejected')[i % 4], 'created_at': now}
+        for i in range(1, SCHOOLS * NEEDS_PER_SCHOOL + 1)])
+    db.session.execute(insert(Donation.__table__), [
+        {'donor_id': (DONOR_ID, 10 + i % DONORS)[i % 2], 'need_id': i % (SCHOOLS * NEEDS_PER_SCHOOL) + 1,
+         'amount': 5.0, 'donation_type': 'direct', 'message': '', 'created_at': now - timedelta(minutes=i)}
+        for i in range(DONATIONS)])
+    db.session.execute(insert(FeaturedSchool.__table__), [
+        {'id': i, 'user_id': (None, DONOR_ID, 10 + i % DONORS)[i % 3], 'city': CITIES[i % len(CITIES)],
+         'name': f'Featured {i}', 'funding_goal': 1000.0, 'current_funding': 0.0} for i in range(1, SCHOOLS + 1)])
+    db.session.execute(insert(FeaturedSchoolNeed.__table__), [
+        {'school_id': i, 'position': p, 'name': name}
+        for i in range(1, SCHOOLS + 1) for p, name in enumerate(('STEM kits', 'Tablets', 'Books'))])
+    db.session.execute(insert(FeaturedSchoolKeyword.__table__), [
+        {'school_id': i, 'keyword': keyword}
+        for i in range(1, SCHOOLS + 1) for keyword in ('stem kits', 'kits', 'tablets', 'books')])
+    db.session.execute(insert(FeaturedSchoolDonation.__table__), [
+        {'user_id': 10 + i % DONORS, 'school_id': i % SCHOOLS + 1, 'amount': 5.0, 'created_at': now}
+        for i in range(DONATIONS)])
+    db.session.execute(insert(MicroDonationPool.__table__), [
+        {'id': i, 'name': f'Pool {i}', 'description': '', 'target_amount': 1000.0, 'current_amount': 0.0,
+         'participants': 0, 'end_date': now + timedelta(days=30)} for i in range(1, 11)])
+    db.session.execute(insert(MicroDonationPoolJoin.__table__), [
+        {'user_id': 10 + i % DONORS, 'pool_id': i % 10 + 1, 'amount': 1.0, 'joined_at': now}
+        for i in range(DONATIONS)])
+    rebuild_impact_stats()
+    db.session.commit()
+
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        _seed()
+    response_cache.enabled = False
+    yield app
+    response_cache.enabled = True
+
+
+@contextmanager
+def recorded_statements():
+    """Collect the single-row statements every engine runs (bulk inserts can't scan)."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and not statement.lstrip().upper().startswith(('INSERT', 'PRAGMA')):
+            statements.append((statement, parameters))
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+
+
+def full_scans(statement, parameters):
+    """Return the tables SQLite would scan in full to run ``statement``."""
+    with db.engine.connect() as conn:
+        plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    tables = set(db.metadata.tables)
+    return {match.group(1) for match in map(FULL_SCAN.match, (row[3] for row in plan))
+            if match and match.group(1) in tables}
+
+
+@pytest.mark.parametrize('method,path,user_id,body,allowed', ROUTES,
+                         ids=[f'{method} {path}' for method, path, *_ in ROUTES])
+def test_route_queries_use_indexes(seeded, method, path, user_id, body, allowed):
+    client = seeded.test_client()
+    if user_id is not None:
+        login_as(client, user_id)
+    with seeded.app_context(), recorded_statements() as statements:
+        if isinstance(body, str):
+            response = client.open(path, method=method, data=body, content_type='application/x-ndjson')
+        else:
+            response = client.open(path, method=method, json=body)
+    assert response.status_code < 500, response.get_data(as_text=True)
+    assert statements, 'route ran no SQL to check'
+
+    with seeded.app_context():
+        regressions = [(sorted(scans - allowed), statement) for statement, parameters in statements
+                       if (scans := full_scans(statement, parameters)) - allowed]
+    assert not regressions, 'full table scans:\n' + '\n\n'.join(
+        f'{tables}: {statement}' for tables, statement in regressions)
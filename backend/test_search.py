@@ -0,0 +1,104 @@
+"""
+test_search.py - Tests for full-text search over schools and needs
+Seeds schools and needs through the ORM, so the FTS5 triggers index them, and
+checks what /api/search returns and in which order.
+"""
+from sqlalchemy import insert
+
+from extensions import db
+from models import Need, School
+
+
+def _seed(app):
+    with app.app_context():
+        school = School(name='Hillside Academy', location='rural', city='Springfield', state='IL', verified=True,
+                        description='A small school with a telescope club')
+        hidden = School(name='Telescope Prep', location='urban', city='Springfield', state='IL', verified=False)
+        db.session.add_all([school, hidden])
+        db.session.flush()
+        need = Need(school_id=school.id, title='Telescope', description='For the astronomy club',
+                    category='Science', urgency='high', total_needed=1, current_donations=0, cost_per_item=300,
+                    status='approved')
+        db.session.add(need)
+        db.session.flush()
+        # Many newer needs that only mention the word in passing
+        db.session.execute(insert(Need.__table__), [
+            {'school_id': school.id, 'title': f'Kit {i}', 'description': 'Parts for the telescope workshop',
+             'category': 'Science', 'urgency': 'low', 'total_needed': 5, 'current_donations': 0,
+             'cost_per_item': 10, 'status': 'approved'} for i in range(600)])
+        db.session.add(Need(school_id=hidden.id, title='Telescope', description='', category='Science',
+                            urgency='high', total_needed=1, current_donations=0, cost_per_item=300,
+                            status='approved'))
+        db.session.commit()
+        return school.id, need.id
+
+
+def _search(client, query):
+    response = client.get('/api/search?' + query)
+    assert response.status_code == 200
+    return response.get_json(), response.headers.get('X-Next-Page')
+
+
+def test_best_match_ranks_first_among_all_matches(app):
+    school_id, need_id = _seed(app)
+    client = app.test_client()
+
+    needs, _ = _search(client, 'q=telescope&type=needs&limit=5')
+    assert needs[0]['id'] == need_id
+
+    # Schools and needs merge by rank; the unverified school and its need never show
+    results, _ = _search(client, 'q=telescope&limit=3')
+    assert [(result['type'], result['id']) for result in results[:1]] == [('need', need_id)]
+    schools, _ = _search(client, 'q=telescope&type=schools')
+    assert [school['id'] for school in schools] == [school_id]
+
+
+def test_last_term_matches_as_a_prefix(app):
+    _, need_id = _seed(app)
+    client = app.test_client()
+
+    assert _search(client, 'q=astronomy+tele&type=needs')[0][0]['id'] == need_id
+    assert _search(client, 'q=tele+astronomy&type=needs')[0] == []
+    assert _search(client, 'q=hill+academy')[0] == []
+    assert len(_search(client, 'q=academy+hill&type=schools')[0]) == 1
+
+
+def test_pages_reach_every_match_once(app):
+    _seed(app)
+    client = app.test_client()
+
+    seen, page = [], '1'
+    while page:
+        results, page = _search(client, f'q=telescope&type=needs&limit=100&page={page}')
+        seen += [result['id'] for result in results]
+    assert len(seen) == len(set(seen)) == 601
+
+    results, next_page = _search(client, 'q=telescope&type=needs&limit=100&page=7')
+    assert (len(results), next_page) == (1, None)
+    assert _search(client, 'q=telescope&type=needs&limit=100&page=6')[1] == '7'
+
+
+def test_index_follows_updates_and_deletes(app):
+    school_id, need_id = _seed(app)
+    client = app.test_client()
+    with app.app_context():
+        db.session.get(Need, need_id).title = 'Microscope'
+        db.session.get(School, school_id).name = 'Lakeside Academy'
+        db.session.commit()
+
+    assert _search(client, 'q=microscope&type=needs')[0][0]['id'] == need_id
+    assert need_id not in [need['id'] for need in _search(client, 'q=telescope&type=needs&limit=100')[0]]
+    assert _search(client, 'q=lakeside&type=schools')[0][0]['id'] == school_id
+    assert _search(client, 'q=hillside')[0] == []
+
+    with app.app_context():
+        db.session.delete(db.session.get(Need, need_id))
+        db.session.commit()
+    assert _search(client, 'q=microscope')[0] == []
+
+
+def test_rejects_bad_parameters(app):
+    client = app.test_client()
+    assert client.get('/api/search').status_code == 400
+    assert client.get('/api/search?q=telescope&type=pools').status_code == 400
+    assert _search(client, 'q=%2B%2B%2B')[0] == []
@@ -0,0 +1,90 @@
+"""
+test_settlement.py - Tests for settling expired micro donation pools
+Checks the totals settlement records and that a pool's own counters are only
+overwritten when asked to.
+"""
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import MicroDonationPool, MicroDonationPoolJoin, MicroDonationPoolSettlement
+from settlement import settle_pools
+
+
+def _pool(amount, participants, days=-1, target=1000):
+    pool = MicroDonationPool(name='Pool', description='Pool', target_amount=target, current_amount=amount,
+                             participants=participants, end_date=datetime.utcnow() + timedelta(days=days))
+    db.session.add(pool)
+    db.session.flush()
+    return pool
+
+
+def _join(pool, *amounts_by_user):
+    db.session.add_all([MicroDonationPoolJoin(pool_id=pool.id, user_id=user_id, amount=amount)
+                        for user_id, amount in amounts_by_user])
+
+
+def _settled(pool_id):
+    pool = db.session.get(MicroDonationPool, pool_id)
+    record = MicroDonationPoolSettlement.query.filter_by(pool_id=pool_id).one_or_none()
+    return pool, record
+
+
+def test_settles_expired_pools_from_their_joins(app):
+    with app.app_context():
+        expired = _pool(amount=35, participants=2)
+        _join(expired, (1, 10), (2, 5), (1, 20))
+        open_pool = _pool(amount=5, participants=1, days=7)
+        _join(open_pool, (3, 5))
+        db.session.commit()
+        expired_id, open_id = expired.id, open_pool.id
+
+        # A tiny chunk size makes the tally page through the joins
+        report = settle_pools(chunk_size=1, batch_size=1)
+
+        assert (report.closed, report.settled, report.joins, report.drifted) == (1, 1, 3, [])
+        pool, record = _settled(expired_id)
+        assert pool.status == 'settled'
+        assert (record.total_amount, record.joins, record.participants, record.target_reached) == (35, 3, 2, False)
+        pool, record = _settled(open_id)
+        assert pool.status == 'active' and record is None
+
+        # Settled pools are not settled twice
+        assert settle_pools().settled == 0
+
+
+def test_pool_without_joins_keeps_its_totals(app):
+    with app.app_context():
+        # Like the init-db samples: counters but no join rows behind them
+        pool_id = _pool(amount=18200, participants=120, target=15000).id
+        db.session.commit()
+
+        report = settle_pools()
+
+        assert report.drifted == []
+        pool, record = _settled(pool_id)
+        assert (pool.status, pool.current_amount, pool.participants) == ('settled', 18200, 120)
+        assert (record.total_amount, record.joins, record.participants, record.target_reached) == (18200, 0, 120, True)
+
+
+def test_drift_is_reported_and_only_fixed_when_asked(app):
+    with app.app_context():
+        kept = _pool(amount=50, participants=3)
+        _join(kept, (1, 10), (2, 15))
+        fixed = _pool(amount=50, participants=3)
+        _join(fixed, (1, 10), (2, 15))
+        db.session.commit()
+        kept_id, fixed_id = kept.id, fixed.id
+
+        # Settle the first pool on its own, then the second with --fix
+        fixed.end_date = datetime.utcnow() + timedelta(days=1)
+        db.session.commit()
+        report = settle_pools()
+        assert report.drifted == [(kept_id, 50, 25)]
+        pool, record = _settled(kept_id)
+        assert (pool.current_amount, pool.participants) == (50, 3)
+        assert (record.total_amount, record.participants) == (25, 2)
+
+        report = settle_pools(now=datetime.utcnow() + timedelta(days=2), fix=True)
+        assert report.drifted == [(fixed_id, 50, 25)]
+        pool, record = _settled(fixed_id)
+        assert (pool.status, pool.current_amount, pool.participants) == ('settled', 25, 2)
@@ -0,0 +1,66 @@
+"""
+test_users.py - Tests for the cached session users behind current_user
+A role or password change must reach the next request instead of the cached
+record; other edits may wait for the cache TTL.
+"""
+from conftest import login_as
+from extensions import db, user_cache
+from models import User
+
+
+def _seed(app, role='admin'):
+    with app.app_context():
+        user = User(email='cached@equilearn.org', password_hash='x', name='Cached User', role=role)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def _update(app, user_id, **fields):
+    """Change a user the way an admin script would: through the ORM, then commit."""
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        for name, value in fields.items():
+            setattr(user, name, value)
+        db.session.commit()
+
+
+def test_role_change_reaches_the_next_request(app):
+    user_id = _seed(app)
+    client = app.test_client()
+    login_as(client, user_id)
+    assert client.get('/api/admin/cache/stats').status_code == 200
+    assert user_cache.get(user_id).role == 'admin'
+
+    _update(app, user_id, role='donor')
+    assert client.get('/api/admin/cache/stats').status_code == 403
+
+    _update(app, user_id, role='admin')
+    assert client.get('/api/admin/cache/stats').status_code == 200
+
+
+def test_password_change_evicts_and_other_edits_do_not(app):
+    user_id = _seed(app)
+    client = app.test_client()
+    login_as(client, user_id)
+    client.get('/api/admin/cache/stats')
+
+    _update(app, user_id, name='Renamed')
+    assert user_cache.get(user_id).name == 'Cached User'
+
+    _update(app, user_id, password_hash='y')
+    assert user_cache.get(user_id) is None
+
+
+def test_rolled_back_change_keeps_the_cached_record(app):
+    user_id = _seed(app)
+    client = app.test_client()
+    login_as(client, user_id)
+    client.get('/api/admin/cache/stats')
+
+    with app.app_context():
+        db.session.get(User, user_id).role = 'donor'
+        db.session.flush()
+        db.session.rollback()
+    assert user_cache.get(user_id).role == 'admin'
+    assert client.get('/api/admin/cache/stats').status_code == 200
@@ -0,0 +1,69 @@
+"""
+users.py - Cached user records for Flask-Login sessions
+Authenticated requests resolve current_user from an in-process TTL cache of
+lightweight records instead of querying the user table every time. A role or
+password change clears the whole cache in the other workers.
+"""
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+
+from extensions import db, cache_sync, user_cache
+from models import User
+
+
+class SessionUser(UserMixin):
+    """Read-only snapshot of the User fields a request needs (no password hash)."""
+
+    __slots__ = ('id', 'email', 'name', 'role')
+
+    def __init__(self, id, email, name, role):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role = role
+
+
+def load_session_user(user_id):
+    """Return the SessionUser for ``user_id``, hitting the database only on a cache miss."""
+    user = user_cache.get(user_id)
+    if user is None:
+        row = db.session.query(User.id, User.email, User.name, User.role).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        user = SessionUser(row.id, row.email, row.name, row.role)
+        user_cache.set(user_id, user)
+    return user
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    # Role and password changes must drop the cached record, but only once they commit
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.password_hash.history.has_changes():
+        state.session.info.setdefault('stale_user_ids', set()).add(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    inspect(target).session.info.setdefault('stale_user_ids', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed(session):
+    stale = session.info.pop('stale_user_ids', None)
+    if stale:
+        cache_sync.publish('users')
+        user_cache.invalidate(*stale)
+
+
+def _drop_invalidated_users(tags):
+    if 'users' in tags:
+        user_cache.clear()
+
+
+cache_sync.subscribe(_drop_invalidated_users)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('stale_user_ids', None)
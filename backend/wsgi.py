@@ -0,0 +1,9 @@
+"""
+wsgi.py - WSGI entry point for EquiLearn
+Serve with gunicorn in production:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()